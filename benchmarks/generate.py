@@ -0,0 +1,165 @@
+"""Synthetic inputs resembling the Google Cloud Storage and DynamoDB exports, for benchmarking."""
+import gzip
+import json
+import random
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from util import DataType
+
+# Source filename prefixes as configured in src/main.py
+PREFIXES = {
+    DataType.P4_QUARTER_2024: "p4_hour_data_2024",
+    DataType.P4_QUARTER_2025: "p4_hour_data__migration_2025",
+    DataType.P4_HOUR_2025: "p4_hour_data_2025",
+    DataType.DAILY_USAGE: "daily_usage_data",
+}
+
+START = date(2024, 1, 1)
+
+
+def _household_ids(rng: random.Random, count: int) -> list[str]:
+    return [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(count)]
+
+
+def p4_quarter_2024_records(rng: random.Random, day: date, households: list[str]) -> list[dict]:
+    records = []
+    for i, household in enumerate(households):
+        # older households were identified by a legacy house id instead of a UUID
+        houseid = household if i % 4 else f"house-{household[:8]}"
+        meter = rng.uniform(1000, 50000)
+        for quarter in range(96):
+            moment = datetime.combine(day, datetime.min.time()) + timedelta(minutes=15 * quarter)
+            meter += rng.uniform(0, 0.5)
+            record = {
+                "datetime": moment.isoformat() + "+01:00",
+                "houseID": houseid,
+                "electricityMeasurement": {"meter": round(meter, 3), "unit": "WH"},
+                "gasMeasurement": {"meter": round(meter / 10, 3), "unit": "MTQ"},
+            }
+            if quarter % 3 == 0:
+                record["backfeedMeasurement"] = {"meter": round(meter / 4, 3), "unit": "WH"}
+            records.append(record)
+    return records
+
+
+def p4_quarter_2025_records(rng: random.Random, day: date, households: list[str]) -> list[dict]:
+    records = []
+    for household in households:
+        meter = rng.uniform(1000, 50000)
+        for quarter in range(96):
+            moment = datetime.combine(day, datetime.min.time()) + timedelta(minutes=15 * quarter)
+            meter += rng.uniform(0, 0.5)
+            unit = rng.choice(["WH", "MTQ"])
+            record = {
+                "datetime": moment.isoformat() + "+01:00",
+                "houseID": household,
+                "electricityMeasurement": {"meter": round(meter, 3), "unit": unit},
+            }
+            if unit == "WH" and quarter % 2:
+                record["backfeedMeasurement"] = {"meter": round(meter / 4, 3), "unit": "WH"}
+            records.append(record)
+    return records
+
+
+def p4_hour_2025_records(rng: random.Random, day: date, households: list[str]) -> list[dict]:
+    records = []
+    for household in households:
+        for type_ in ("gas", "electricity"):
+            meter_ean = f"8716{rng.randrange(10 ** 14):014d}"
+            meter = rng.uniform(1000, 50000)
+            readings = {}
+            for hour in range(25):
+                readings[f"measurement_h_{hour}"] = round(meter, 3)
+                meter += rng.uniform(0, 1)
+            records.append({
+                "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                "created_at": f"{day.isoformat()}T22:27:02.101249+00:00",
+                "updated_at": f"{day.isoformat()}T22:27:02.101249+00:00",
+                "meter_ean": meter_ean,
+                "query_date": day.isoformat(),
+                "measurement_total": round(meter, 3),
+                "type": type_,
+                "status": "success",
+                "meter_ean_date_type": f"{meter_ean}_{day.isoformat()}_{type_}",
+            } | readings)
+    return records
+
+
+def daily_usage_records(rng: random.Random, day: date, households: list[str]) -> list[dict]:
+    return [
+        {
+            "household_id": household,
+            "household_activation_code": household[:6].upper(),
+            "date": day.isoformat(),
+            "type": type_,
+            "usage": round(rng.uniform(0, 30), 3),
+        }
+        for household in households
+        for type_ in ("gas", "electricity", "backfeed")
+    ]
+
+
+GENERATORS = {
+    DataType.P4_QUARTER_2024: p4_quarter_2024_records,
+    DataType.P4_QUARTER_2025: p4_quarter_2025_records,
+    DataType.P4_HOUR_2025: p4_hour_2025_records,
+    DataType.DAILY_USAGE: daily_usage_records,
+}
+
+
+def generate_source_files(data_type: DataType, folder: Path, files: int, households: int, seed: int = 0) -> list[Path]:
+    """Write one JSON array file per day, `files` days of data for `households` households"""
+    rng = random.Random(seed)
+    ids = _household_ids(rng, households)
+    folder.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for i in range(files):
+        day = START + timedelta(days=i)
+        path = folder / f"{PREFIXES[data_type]}_{day.isoformat()}.json"
+        with open(path, "w") as f:
+            json.dump(GENERATORS[data_type](rng, day, ids), f)
+        paths.append(path)
+    return paths
+
+
+def _dynamo_value(value) -> dict:
+    if value is None:
+        return {"NULL": True}
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, (int, float)):
+        return {"N": str(value)}
+    if isinstance(value, list):
+        return {"L": [_dynamo_value(item) for item in value]}
+    if isinstance(value, dict):
+        return {"M": {k: _dynamo_value(v) for k, v in value.items()}}
+    return {"S": str(value)}
+
+
+def generate_dynamodb_export(root: Path, tables: list[str], files: int, items: int, seed: int = 0) -> Path:
+    """Write DynamoDB exports in the layout of the S3 backup, one folder per table"""
+    rng = random.Random(seed)
+    for t, table in enumerate(tables):
+        export = root / f"{1739284656378 + t:014d}-{rng.getrandbits(32):08x}"
+        (export / "data").mkdir(parents=True, exist_ok=True)
+        arn = f"arn:aws:dynamodb:eu-west-1:000000000000:table/{table}-{rng.getrandbits(32):08x}/export/01739284656378"
+        with open(export / "manifest-summary.json", "w") as f:
+            json.dump({"version": "2020-06-30", "tableArn": arn, "itemCount": files * items}, f)
+
+        for i in range(files):
+            with gzip.open(export / "data" / f"{uuid.UUID(int=rng.getrandbits(128)).hex}.json.gz", "wt") as f:
+                for _ in range(items):
+                    item = {
+                        "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                        "createdAt": rng.randrange(1_600_000_000, 1_740_000_000),
+                        "value": round(rng.uniform(0, 1000), 3),
+                        "active": rng.random() < 0.5,
+                        "note": None,
+                        "tags": ["p4", table.lower()],
+                        "details": {"meter": rng.randrange(10 ** 6), "unit": "WH"},
+                    }
+                    f.write(json.dumps({"Item": {k: _dynamo_value(v) for k, v in item.items()}}) + "\n")
+    return root
@@ -0,0 +1,181 @@
+"""Benchmark the ETL stages on synthetic data.
+
+Run from the repository root with the sources on the path, for example:
+
+    PYTHONPATH=src:. python -m benchmarks.run --files 20 --households 50
+
+Every stage runs in a fresh process so its peak memory can be measured on its own. The results
+are written as JSON, pass an earlier result file with --compare to see the relative change.
+"""
+import argparse
+import json
+import platform
+import resource
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+import transform.google
+from benchmarks.generate import PREFIXES, generate_dynamodb_export, generate_source_files
+from load.local import LocalS3Client
+from load.s3 import S3Loader
+from scripts.unpack_dynamodb_backup import unpack
+from util import DataType, ETLConfig
+
+TRANSFORMERS = {
+    DataType.P4_QUARTER_2024: "P4QuarterData2024Transformer",
+    DataType.P4_QUARTER_2025: "P4QuarterData2025Transformer",
+    DataType.P4_HOUR_2025: "P4HourData2025Transformer",
+    DataType.DAILY_USAGE: "DailyUsageDataTransformer",
+}
+DYNAMODB_TABLES = ["Woning", "P4Day", "UsageAggregations"]
+
+
+def _config(data_type: DataType, workdir: Path, **kwargs) -> ETLConfig:
+    transformer = getattr(transform.google, TRANSFORMERS[data_type])
+    return ETLConfig(
+        data_type,
+        PREFIXES[data_type],
+        transformer,
+        root_extraction_folder=workdir / "extracted",
+        root_transformation_folder=workdir / "transformed",
+        resume=False,
+        **kwargs,
+    )
+
+
+def transform_stage(data_type: DataType, workdir: Path, options: dict) -> dict:
+    config = _config(data_type, workdir, **options)
+    results = config.transformer(config).transform_all()
+    return {
+        "files": len(results),
+        "records": sum(result.records for result in results),
+        "bytes": sum(result.bytes for result in results),
+    }
+
+
+def unpack_stage(workdir: Path) -> dict:
+    root = workdir / "aws"
+    sources = list(root.glob("*/data/*.gz"))
+    unpack(str(root))
+    records = 0
+    for output in (root / "parsed").rglob("*"):
+        if output.is_file():
+            with open(output, "rb") as f:
+                records += sum(1 for _ in f)
+    return {
+        "files": len(sources),
+        "records": records,
+        "bytes": sum(source.stat().st_size for source in sources),
+    }
+
+
+def load_stage(data_type: DataType, workdir: Path, upload_workers: int) -> dict:
+    config = _config(data_type, workdir, upload_workers=upload_workers)
+    files = [f for f in config.transformation_folder.rglob("*") if f.is_file()]
+    loader = S3Loader(None, "benchmark", config, s3_client=LocalS3Client(workdir / "s3"))
+    loader.load_all()
+    return {
+        "files": len(files),
+        "records": len(files),
+        "bytes": sum(f.stat().st_size for f in files),
+    }
+
+
+def _measure(stage, *args) -> dict:
+    """Runs inside the child process"""
+    wall, cpu = time.perf_counter(), time.process_time()
+    stats = stage(*args)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return stats | {
+        "wall_seconds": round(wall, 3),
+        "cpu_seconds": round(cpu, 3),
+        "records_per_second": round(stats["records"] / wall, 1),
+        "mb_per_second": round(stats["bytes"] / 1e6 / wall, 2),
+        # ru_maxrss is in kilobytes on Linux, transform workers are included through the children
+        "peak_rss_mb": round(max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        ) / 1024, 1),
+    }
+
+
+def run_stage(name: str, stage, *args) -> dict:
+    print(f"\n=== {name} ===")
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        result = executor.submit(_measure, stage, *args).result()
+    print(f"{name}: {result['records_per_second']} records/s, {result['mb_per_second']} MB/s, "
+          f"peak {result['peak_rss_mb']} MB")
+    return {"stage": name} | result
+
+
+def generate(workdir: Path, args: argparse.Namespace):
+    print(f"Generating synthetic data in {workdir}")
+    for data_type in TRANSFORMERS:
+        generate_source_files(data_type, workdir / "extracted" / data_type.value, args.files, args.households, args.seed)
+    generate_dynamodb_export(workdir / "aws", DYNAMODB_TABLES, args.files, args.households * 100, args.seed)
+
+
+def compare(results: dict, previous_file: Path):
+    previous = {stage["stage"]: stage for stage in json.loads(previous_file.read_text())["stages"]}
+    print(f"\nCompared to {previous_file}:")
+    for stage in results["stages"]:
+        before = previous.get(stage["stage"])
+        if before is None or not before["records_per_second"]:
+            continue
+        speedup = stage["records_per_second"] / before["records_per_second"]
+        memory = stage["peak_rss_mb"] / before["peak_rss_mb"]
+        print(f"\t{stage['stage']}: {speedup:.2f}x throughput, {memory:.2f}x peak memory")
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ETL stages on synthetic data.")
+    parser.add_argument("--workdir", type=Path, default=Path("benchmark_data"))
+    parser.add_argument("--files", type=int, default=10, help="Number of source files (days) per data type")
+    parser.add_argument("--households", type=int, default=20, help="Number of households per source file")
+    parser.add_argument("--workers", type=int, default=1, help="Transformer worker processes")
+    parser.add_argument("--upload-workers", type=int, default=8, help="Concurrent uploads of the loader")
+    parser.add_argument("--output-format", default="jsonl", choices=["jsonl", "parquet"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="Result file, defaults to a timestamped file next to the workdir")
+    parser.add_argument("--compare", type=Path, default=None, help="Earlier result file to compare with")
+    args = parser.parse_args()
+
+    shutil.rmtree(args.workdir, ignore_errors=True)
+    generate(args.workdir, args)
+
+    options = {"streaming": True, "workers": args.workers, "output_format": args.output_format}
+    stages = [run_stage(f"transform_{data_type.value}", transform_stage, data_type, args.workdir, options)
+              for data_type in TRANSFORMERS]
+    stages.append(run_stage("unpack_dynamodb", unpack_stage, args.workdir))
+    stages.append(run_stage("load_daily_usage", load_stage, DataType.DAILY_USAGE, args.workdir, args.upload_workers))
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "parameters": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        "stages": stages,
+    }
+    output = args.output or args.workdir.parent / f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
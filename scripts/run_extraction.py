@@ -1,6 +1,7 @@
-from datetime import date
+from datetime import date, datetime
 from src.extract.supabase import HouseholdDataExtractor, DailyUsageDataExtractor
 from settings import SupabaseSettings
+from src.metrics import metrics
 from src.supabase import SupabaseClient
 import argparse
 
@@ -18,15 +19,43 @@ if __name__ == "__main__":
         default=None,
         help="Date (YYYY-MM-DD) to start extracting daily usage data (only for daily_usage)",
     )
+    parser.add_argument(
+        "--until-date",
+        type=lambda s: date.fromisoformat(s),
+        default=None,
+        help="Date (YYYY-MM-DD) up to which daily usage data is extracted, exclusive (only for --ranged)",
+    )
+    parser.add_argument(
+        "--ranged",
+        action="store_true",
+        help="Extract daily usage data with streamed range queries over concurrent date shards",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only fetch households changed since the previous extraction (only for household)",
+    )
+    parser.add_argument("--shard-days", type=int, default=7, help="Days per shard (only for --ranged)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent shards (only for --ranged)")
+    parser.add_argument("--report", default=None, help="Path of the JSON run report")
     args = parser.parse_args()
+    report = args.report or f"reports/extraction_{args.extractor}_{datetime.now():%Y%m%d_%H%M%S}.json"
 
     settings = SupabaseSettings()
-    client = SupabaseClient(settings)
+    client = SupabaseClient(settings, pool_size=args.workers)
 
-    if args.extractor == "household":
-        extractor = HouseholdDataExtractor(client, path="extracted")
-        extractor.extract()
-    elif args.extractor == "daily_usage":
-        extractor = DailyUsageDataExtractor(client, path="extracted")
-        since_date = args.since_date or date.today()
-        extractor.extract(since_date)
+    try:
+        with metrics.stage("extract"):
+            if args.extractor == "household":
+                extractor = HouseholdDataExtractor(client, path="extracted")
+                extractor.extract(incremental=args.incremental)
+            elif args.extractor == "daily_usage":
+                extractor = DailyUsageDataExtractor(client, path="extracted")
+                since_date = args.since_date or date.today()
+                if args.ranged:
+                    extractor.extract_ranged(since_date, args.until_date, args.shard_days, args.workers)
+                else:
+                    extractor.extract(since_date)
+    finally:
+        # the extractors record into src.metrics, the same module instance as imported here
+        metrics.write_report(report)
@@ -1,9 +1,21 @@
+import argparse
 import json
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
 from pathlib import Path
 import gzip
 import shutil
-import sys
 import os
+import time
+from typing import Iterator
+
+from tqdm import tqdm
+
+from src.compression import EXTENSIONS, add_suffix, open_output
+from src.jsoncodec import get_codec
+
+codec = get_codec()
 
 
 tables = {
@@ -95,43 +107,165 @@ def parse_dynamo_data(data):
     return value
 
 
+def convert(line: bytes) -> dict:
+    """Native record of one line of an export, with its attributes sorted by name"""
+    read = codec.loads(line)["Item"]
+    converted = {k: parse_dynamo_data(v) for k, v in read.items()}
+    return dict(sorted(converted.items()))
+
+
 def parse(file_name: str, out_path: str):
     output_path = Path(out_path)
     output_path.mkdir(parents=True, exist_ok=True)
     output_file = output_path / file_name.name
 
-    lines = open(file_name, "r").readlines()
+    lines = open(file_name, "rb").readlines()
     output = []
     for line in lines:
-        read = json.loads(line)["Item"]
-        converted = {k: parse_dynamo_data(v) for k, v in read.items()}
-        converted = dict(sorted(converted.items()))
-        output.append(json.dumps(converted))
+        output.append(convert(line))
+
+    with open(output_file, "wb") as out_file:
+        with codec.line_writer(out_file) as writer:
+            for record in output:
+                writer.write(record)
+
+
+def stream_parse(file_name: str, out_path: str, compression: str | None = None) -> Path | None:
+    """
+    Decompress, parse and write an export file line by line in one pass, without an unpacked copy.
+    The output is the same as unzip followed by parse, compressed with `compression` when set.
+    It is written to a temporary file first, so an interrupted run does not leave a partial output.
+    """
+    gz_path = Path(file_name)
+    output_path = Path(out_path)
+    output_path.mkdir(parents=True, exist_ok=True)
+    output_file = output_path / add_suffix(gz_path.stem, compression)
 
-    with open(output_file, "w") as out_file:
-        for line in output:
-            out_file.write(f"{line}\n")
+    if os.path.isfile(output_file):
+        print(f"file {output_file} exists, skipping...")
+        return None
 
+    tmp_file = output_path / f".{output_file.name}.tmp"
+    with gzip.open(gz_path, "rb") as gz_file:
+        with open_output(tmp_file, compression) as out_file:
+            with codec.line_writer(out_file) as writer:
+                for line in gz_file:
+                    writer.write(convert(line))
+    os.replace(tmp_file, output_file)
+    return output_file
 
-def unpack(root_path: str):
-    root = Path(root_path)
 
-    for folder_path in root.iterdir():
+def exports(root_path: str) -> Iterator[tuple[Path, str]]:
+    """Export folders below the root with the name of their table"""
+    for folder_path in Path(root_path).iterdir():
         if folder_path.is_dir() and not folder_path.name in ["unpacked", "parsed"]:
             summary_file = folder_path / "manifest-summary.json"
             summary = json.load(open(summary_file, "r"))
             table = summary["tableArn"].split(":")[-1].split("/")[1].split("-")[0]
-            print(f"Unpacking and parsing folder {folder_path.name} - table {table}")
+            yield folder_path, table
+
+
+def unpack_file(file: Path, root_path: str, table: str, streaming: bool = False, compression: str | None = None) -> bool:
+    """Unpack and parse one export file, returns False when it was already done"""
+    if streaming:
+        return stream_parse(file, f"{root_path}/parsed/{table}", compression) is not None
+    unpacked = unzip(file, f"{root_path}/unpacked/{table}")
+    if unpacked is None:
+        return False
+    parse(unpacked, f"{root_path}/parsed/{table}")
+    return True
+
+
+def unpack(root_path: str, streaming: bool = False, compression: str | None = None, workers: int = 1):
+    """
+    :param streaming: Parse the export files straight from the gzip files, instead of unpacking them to disk first.
+    :param compression: Codec of the parsed files in streaming mode.
+    :param workers: Number of processes, more than one unpacks the files of all tables in parallel.
+    """
+    if workers > 1:
+        return unpack_parallel(root_path, workers, streaming, compression)
+
+    for folder_path, table in exports(root_path):
+        print(f"Unpacking and parsing folder {folder_path.name} - table {table}")
+
+        data_path = folder_path / "data"
+        for file in data_path.glob("*.gz"):
+            unpack_file(file, root_path, table, streaming, compression)
+
+
+@dataclass
+class TableSummary:
+    files: int = 0
+    bytes: int = 0
+    done: int = 0
+    skipped: int = 0
+    failed: int = 0
+
+
+def unpack_parallel(root_path: str, workers: int, streaming: bool = False,
+                    compression: str | None = None) -> dict[str, TableSummary]:
+    """
+    Unpack and parse the files of all tables with a pool of processes. The largest files are
+    scheduled first, so a large file started last does not keep the other workers waiting.
+    :return: Summary per table.
+    """
+    files = [(file, table) for folder_path, table in exports(root_path) for file in (folder_path / "data").glob("*.gz")]
+    files.sort(key=lambda item: item[0].stat().st_size, reverse=True)
+
+    summaries = defaultdict(TableSummary)
+    for file, table in files:
+        summaries[table].files += 1
+        summaries[table].bytes += file.stat().st_size
+    tables = sorted(summaries)
+    print(f"Unpacking {len(files)} files of {len(tables)} tables with {workers} workers")
+
+    bars = {
+        table: tqdm(total=summaries[table].files, desc=table, unit="file", position=i, leave=True)
+        for i, table in enumerate(tables)
+    }
+    total = tqdm(total=sum(summary.bytes for summary in summaries.values()), desc="Total", unit="B",
+                 unit_scale=True, position=len(tables))
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(unpack_file, file, root_path, table, streaming, compression): (file, table)
+                for file, table in files
+            }
+            for future in as_completed(futures):
+                file, table = futures[future]
+                try:
+                    if future.result():
+                        summaries[table].done += 1
+                    else:
+                        summaries[table].skipped += 1
+                except Exception as e:
+                    tqdm.write(f"Error unpacking {file}: {e!r}")
+                    summaries[table].failed += 1
+                bars[table].update()
+                total.update(file.stat().st_size)
+    finally:
+        for bar in [*bars.values(), total]:
+            bar.close()
 
-            data_path = folder_path / "data"
-            for file in data_path.glob("*.gz"):
-                unpacked = unzip(file, f"{root_path}/unpacked/{table}")
-                if unpacked is not None:
-                    parse(unpacked, f"{root_path}/parsed/{table}")
+    seconds = time.perf_counter() - start
+    print(f"\nUnpacked {total.n / 1e9:.2f} GB in {seconds:.0f} s")
+    print(f"{'table':<32} {'files':>6} {'done':>6} {'skipped':>8} {'failed':>7} {'GB':>8}")
+    for table in tables:
+        summary = summaries[table]
+        print(
+            f"{table:<32} {summary.files:>6} {summary.done:>6} {summary.skipped:>8} {summary.failed:>7} "
+            f"{summary.bytes / 1e9:>8.2f}"
+        )
+    return dict(summaries)
 
 
 if __name__ == "__main__":
-    root = "./aws"
-    if len(sys.argv) > 1:
-        root = sys.argv[1]
-    unpack(root)
+    parser = argparse.ArgumentParser(description="Unpack and parse a DynamoDB export.")
+    parser.add_argument("root", nargs="?", default="./aws", help="Folder with an export folder per table")
+    parser.add_argument("--streaming", action="store_true", help="Parse straight from the gzip files, without unpacking to disk")
+    parser.add_argument("--compression", choices=list(EXTENSIONS.values()), default=None,
+                        help="Compress the parsed files, streaming mode only")
+    parser.add_argument("--workers", type=int, default=1, help="Processes unpacking files in parallel")
+    args = parser.parse_args()
+    unpack(args.root, args.streaming, args.compression, args.workers)
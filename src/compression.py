@@ -0,0 +1,104 @@
+import gzip
+from pathlib import Path
+from typing import IO
+
+# Compression codec by file extension, also used as the S3 Content-Encoding
+EXTENSIONS = {
+    ".gz": "gzip",
+    ".zst": "zstd",
+}
+SUFFIXES = {codec: suffix for suffix, codec in EXTENSIONS.items()}
+
+
+def codec_for(filename: str | Path) -> str | None:
+    return EXTENSIONS.get(Path(filename).suffix)
+
+
+def strip_suffix(filename: str) -> str:
+    """Filename without its compression extension, `data.json.gz` becomes `data.json`"""
+    if codec_for(filename) is None:
+        return filename
+    return str(Path(filename).with_suffix(""))
+
+
+def source_name(output_name: str) -> str:
+    """Uncompressed name of the JSON source a loaded output was made of, `data.parquet` becomes `data.json`"""
+    name = strip_suffix(output_name)
+    if name.endswith('.parquet'):
+        return name.removesuffix('.parquet') + '.json'
+    return name
+
+
+def add_suffix(filename: str, codec: str | None) -> str:
+    if codec is None:
+        return filename
+    return filename + SUFFIXES[codec]
+
+
+def decompress(raw: IO[bytes], codec: str | None) -> IO[bytes]:
+    """Wrap a binary stream so it is decompressed while reading"""
+    match codec:
+        case None:
+            return raw
+        case "gzip":
+            return gzip.GzipFile(fileobj=raw, mode="rb")
+        case "zstd":
+            return _zstandard().ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        case _:
+            raise ValueError(f"Unknown compression codec {codec}")
+
+
+def compress(raw: IO[bytes], codec: str | None, level: int | None = None) -> IO[bytes]:
+    """Wrap a binary stream so everything written is compressed, closing the wrapper keeps `raw` open"""
+    match codec:
+        case None:
+            return _Unclosed(raw)
+        case "gzip":
+            return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6 if level is None else level)
+        case "zstd":
+            compressor = _zstandard().ZstdCompressor(level=3 if level is None else level)
+            return compressor.stream_writer(raw, closefd=False)
+        case _:
+            raise ValueError(f"Unknown compression codec {codec}")
+
+
+class _Unclosed:
+    """Passes writes through but leaves the stream open, like the compressing wrappers do"""
+
+    def __init__(self, raw: IO[bytes]):
+        self.raw = raw
+
+    def write(self, data) -> int:
+        return self.raw.write(data)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def open_output(path: str | Path, codec: str | None, level: int | None = None) -> IO[bytes]:
+    """Open a binary file for writing, compressing everything written to it"""
+    match codec:
+        case None:
+            return open(path, "wb")
+        case "gzip":
+            return gzip.open(path, "wb", compresslevel=6 if level is None else level)
+        case "zstd":
+            zstandard = _zstandard()
+            compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+            return compressor.stream_writer(open(path, "wb"), closefd=True)
+        case _:
+            raise ValueError(f"Unknown compression codec {codec}")
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd compression requires the zstandard package, install it with `pipenv install zstandard`")
+    return zstandard
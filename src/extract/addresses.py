@@ -0,0 +1,106 @@
+import os
+import sqlite3
+from contextlib import closing
+from typing import Iterable
+
+import pandas as pd
+
+ADDRESSES_CSV = "data/alle_adressen.csv"
+DRENTHE_CSV = "data/adresgegevens-provincie-drenthe-2024.csv"
+ADDRESS_INDEX = "data/addresses.sqlite"
+
+# SQLite limits the number of parameters in one query
+LOOKUP_BATCH_SIZE = 500
+
+
+class AddressIndex:
+    """SQLite index of the address files, so enrichment only reads the addresses of the households.
+
+    The index is built once from the CSV files and rebuilt when one of them is newer, an index shipped
+    without the CSV files is used as is. It stores the
+    same keys the enrichment used to build in memory, first occurrence of every key wins:
+    * coordinates by `postcode#house number`
+    * energy labels by `postcode#house number + letter` (Drenthe only)
+    * neighbourhoods by postcode (Drenthe only)
+    """
+
+    def __init__(self, path: str = ADDRESS_INDEX, addresses_csv: str = ADDRESSES_CSV, drenthe_csv: str = DRENTHE_CSV):
+        self.path = path
+        self.addresses_csv = addresses_csv
+        self.drenthe_csv = drenthe_csv
+        if self._is_stale():
+            self.build()
+
+    def _is_stale(self) -> bool:
+        if not os.path.exists(self.path):
+            return True
+        built = os.path.getmtime(self.path)
+        return any(
+            os.path.exists(csv) and os.path.getmtime(csv) > built for csv in (self.addresses_csv, self.drenthe_csv)
+        )
+
+    def build(self):
+        print(f"Building address index {self.path}...")
+        alle_adressen = pd.read_csv(
+            self.addresses_csv, sep=";", low_memory=False, encoding="utf-8",
+            usecols=["Postcode", "Huisnummer", "lon", "lat"],
+        )
+        alle_adressen["address"] = (
+            alle_adressen["Postcode"].astype(str)
+            + "#"
+            + alle_adressen["Huisnummer"].astype(str)
+        )
+        coordinates = alle_adressen.drop_duplicates(subset="address")[["address", "lon", "lat"]]
+        del alle_adressen
+
+        drenthe = pd.read_csv(
+            self.drenthe_csv, sep=",", low_memory=False, encoding="utf-8",
+            usecols=["Postcode", "Huisnummer", "Huisletter", "Pand energielabel", "Buurtnaam", "Wijknaam"],
+        )
+        drenthe["address"] = (
+            drenthe["Postcode"].astype(str)
+            + "#"
+            + drenthe["Huisnummer"].astype(str)
+            + drenthe["Huisletter"].fillna("").astype(str)
+        )
+        energy_labels = drenthe.drop_duplicates(subset="address")[["address", "Pand energielabel"]]
+        neighbourhoods = drenthe.drop_duplicates(subset="Postcode")[["Postcode", "Buurtnaam", "Wijknaam"]]
+
+        tmp_path = f"{self.path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        with closing(sqlite3.connect(tmp_path)) as db:
+            coordinates.to_sql("coordinates", db, index=False)
+            energy_labels.to_sql("energy_labels", db, index=False)
+            neighbourhoods.to_sql("neighbourhoods", db, index=False)
+            db.execute("CREATE UNIQUE INDEX coordinates_address ON coordinates (address)")
+            db.execute("CREATE UNIQUE INDEX energy_labels_address ON energy_labels (address)")
+            db.execute("CREATE UNIQUE INDEX neighbourhoods_postcode ON neighbourhoods (Postcode)")
+            db.commit()
+        os.replace(tmp_path, self.path)
+
+    def _lookup(self, table: str, key: str, values: Iterable) -> pd.DataFrame:
+        values = list(dict.fromkeys(str(value) for value in values if pd.notna(value)))
+        with closing(sqlite3.connect(self.path)) as db:
+            if not values:
+                return pd.read_sql(f"SELECT * FROM {table} LIMIT 0", db)
+            frames = []
+            for i in range(0, len(values), LOOKUP_BATCH_SIZE):
+                batch = values[i:i + LOOKUP_BATCH_SIZE]
+                placeholders = ", ".join("?" * len(batch))
+                frames.append(
+                    pd.read_sql(f'SELECT * FROM {table} WHERE "{key}" IN ({placeholders})', db, params=batch)
+                )
+        return pd.concat(frames, ignore_index=True)
+
+    def coordinates(self, addresses: Iterable[str]) -> pd.DataFrame:
+        """Columns address, lon and lat for the known `postcode#house number` addresses"""
+        return self._lookup("coordinates", "address", addresses)
+
+    def energy_labels(self, addresses: Iterable[str]) -> pd.DataFrame:
+        """Columns address and 'Pand energielabel' for the known `postcode#house number + letter` addresses"""
+        return self._lookup("energy_labels", "address", addresses)
+
+    def neighbourhoods(self, postcodes: Iterable[str]) -> pd.DataFrame:
+        """Columns Postcode, Buurtnaam and Wijknaam for the known postcodes"""
+        return self._lookup("neighbourhoods", "Postcode", postcodes)
@@ -0,0 +1,82 @@
+import json
+import subprocess
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from typing import Callable, Iterable
+
+from compression import source_name, strip_suffix
+
+
+@dataclass
+class DeltaPlan:
+    files: list[str] = field(default_factory=list)
+    bytes: int = 0
+    up_to_date: int = 0
+    already_loaded: int = 0
+
+    def report(self):
+        print(
+            f"Planned {len(self.files)} files ({self.bytes / 1e9:.2f} GB) to copy, "
+            f"{self.up_to_date} up to date locally, {self.already_loaded} already in S3"
+        )
+
+    def write(self, path: str | Path) -> str:
+        """Write the plan as an rclone --files-from list"""
+        with open(path, "w") as f:
+            for file in self.files:
+                f.write(f"{file}\n")
+        print(f"Files-from list saved to: {path}")
+        return str(path)
+
+
+def rclone_lsjson(remote: str | Path, include: str | None = None) -> dict[str, dict]:
+    """List all files below `remote` with rclone, by path relative to the remote"""
+    command = ["rclone", "lsjson", str(remote), "--recursive", "--files-only", "--no-mimetype"]
+    if include:
+        command += ["--include", include]
+    result = subprocess.run(command, check=True, capture_output=True, text=True)
+    return {entry["Path"]: entry for entry in json.loads(result.stdout)}
+
+
+class DeltaPlanner:
+    """Plans which source files have to be copied, instead of letting rclone filter all of them.
+
+    A source file is copied unless an output of it is already loaded to S3, or the
+    destination has a copy with the same size that is not older than the source.
+    """
+
+    def __init__(self, source: str, dest: str | Path, filename_prefix: str, loaded: Iterable[str] = (),
+                 lister: Callable[[str | Path, str | None], dict[str, dict]] = rclone_lsjson):
+        self.source = source
+        self.dest = dest
+        self.filename_prefix = filename_prefix
+        self.loaded = {source_name(filename) for filename in loaded}
+        self.lister = lister
+
+    def plan(self) -> DeltaPlan:
+        include = f"{self.filename_prefix}*"
+        source = self.lister(self.source, include)
+        dest = self.lister(self.dest, include) if Path(self.dest).exists() else {}
+        return self.diff(source, dest)
+
+    def diff(self, source: dict[str, dict], dest: dict[str, dict]) -> DeltaPlan:
+        plan = DeltaPlan()
+        for path, entry in sorted(source.items()):
+            name = PurePosixPath(path).name
+            if not name.startswith(self.filename_prefix):
+                continue
+            if strip_suffix(name) in self.loaded:
+                plan.already_loaded += 1
+            elif path in dest and not _changed(entry, dest[path]):
+                plan.up_to_date += 1
+            else:
+                plan.files.append(path)
+                plan.bytes += entry["Size"]
+        return plan
+
+
+def _changed(source: dict, dest: dict) -> bool:
+    if source["Size"] != dest["Size"]:
+        return True
+    return datetime.fromisoformat(source["ModTime"]) > datetime.fromisoformat(dest["ModTime"])
@@ -1,5 +1,7 @@
 import subprocess
 
+from metrics import metrics
+
 
 class GoogleExtractor:
 
@@ -24,7 +26,34 @@ class GoogleExtractor:
             print("\nRclone sync completed successfully!")
             
         except subprocess.CalledProcessError as e:
+            metrics.record_failure('extract')
             print(f"\nRclone sync failed with error code {e.returncode}")
             print(f"Error output:\n{e.stderr}")
         except FileNotFoundError:
+            metrics.record_failure('extract')
+            print("\nError: rclone command not found. Make sure rclone is installed and in your PATH.")
+
+    def rclone_copy(self, source: str, dest: str, files_from: str):
+        """Copy only the files listed in `files_from`, as planned by the DeltaPlanner"""
+        try:
+            subprocess.run(
+                [
+                    'rclone', 'copy',
+                    source,
+                    dest,
+                    '--files-from', files_from,
+                    '--no-traverse',
+                    '--progress',
+                ],
+                check=True,
+                text=True
+            )
+            print("\nRclone copy completed successfully!")
+
+        except subprocess.CalledProcessError as e:
+            metrics.record_failure('extract')
+            print(f"\nRclone copy failed with error code {e.returncode}")
+            print(f"Error output:\n{e.stderr}")
+        except FileNotFoundError:
+            metrics.record_failure('extract')
             print("\nError: rclone command not found. Make sure rclone is installed and in your PATH.")
@@ -0,0 +1,178 @@
+import re
+import sqlite3
+import string
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from pathlib import Path
+
+from metrics import metrics
+
+INVENTORY_FILE = Path("inventory.sqlite")
+_DATE = re.compile(r"(\d{4})-(\d{2})-\d{2}")
+# Characters names usually start with, in S3 listing order
+_NAME_CHARACTERS = sorted(string.digits + string.ascii_letters)
+
+
+class S3Inventory:
+    """Local SQLite cache of S3 listings, keyed by bucket and prefix.
+
+    `refresh` only lists the keys after the last key seen before (S3 lists keys in UTF-8 binary
+    order), which is cheap for prefixes where new objects sort last, like the dated source files.
+    Objects that were added before the last key, changed or deleted are only picked up by `rebuild`,
+    which lists the prefix again, optionally split over key ranges listed concurrently.
+    """
+
+    def __init__(self, s3_client, path: str | Path = INVENTORY_FILE):
+        self.s3_client = s3_client
+        self.path = Path(path)
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS objects (
+                bucket TEXT NOT NULL,
+                prefix TEXT NOT NULL,
+                key TEXT NOT NULL,
+                size INTEGER,
+                etag TEXT,
+                last_modified TEXT,
+                PRIMARY KEY (bucket, prefix, key)
+            );
+            CREATE TABLE IF NOT EXISTS listings (
+                bucket TEXT NOT NULL,
+                prefix TEXT NOT NULL,
+                last_key TEXT,
+                refreshed_at TEXT,
+                PRIMARY KEY (bucket, prefix)
+            );
+        """)
+
+    def close(self):
+        self.db.close()
+
+    def last_key(self, bucket: str, prefix: str) -> str | None:
+        row = self.db.execute(
+            "SELECT last_key FROM listings WHERE bucket = ? AND prefix = ?", (bucket, prefix)
+        ).fetchone()
+        return row[0] if row else None
+
+    def objects(self, bucket: str, prefix: str) -> list[dict]:
+        rows = self.db.execute(
+            "SELECT key, size, etag, last_modified FROM objects WHERE bucket = ? AND prefix = ? ORDER BY key",
+            (bucket, prefix),
+        )
+        return [dict(zip(("Key", "Size", "ETag", "LastModified"), row)) for row in rows]
+
+    def keys(self, bucket: str, prefix: str) -> list[str]:
+        rows = self.db.execute(
+            "SELECT key FROM objects WHERE bucket = ? AND prefix = ? ORDER BY key", (bucket, prefix)
+        )
+        return [row[0] for row in rows]
+
+    def refresh(self, bucket: str, prefix: str) -> int:
+        """List the keys after the last known key and add them, returns the number of new objects"""
+        last_key = self.last_key(bucket, prefix)
+        if last_key is None:
+            return self.rebuild(bucket, prefix)
+
+        objects = self._list_range(bucket, prefix, last_key, None)
+        self._store(bucket, prefix, objects)
+        return len(objects)
+
+    def rebuild(self, bucket: str, prefix: str, boundaries: list[str] | None = None, workers: int = 8) -> int:
+        """Replace the inventory of a prefix by a full listing, returns the number of objects.
+
+        The listing is split at the sorted `boundaries` into the key ranges
+        (-inf, b0], (b0, b1], ..., (bn, inf), which are listed concurrently. Without boundaries
+        the ranges are derived from the structure of the keys, refined by the previous inventory
+        of the prefix, if any.
+        """
+        if boundaries is None:
+            boundaries = self._boundaries(bucket, prefix, workers)
+        bounds = [None, *sorted(boundaries), None]
+        ranges = list(zip(bounds[:-1], bounds[1:]))
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(ranges)))) as executor:
+            shards = executor.map(lambda r: self._list_range(bucket, prefix, *r), ranges)
+            objects = [obj for shard in shards for obj in shard]
+
+        with self.db:
+            self.db.execute("DELETE FROM objects WHERE bucket = ? AND prefix = ?", (bucket, prefix))
+            self.db.execute("DELETE FROM listings WHERE bucket = ? AND prefix = ?", (bucket, prefix))
+        self._store(bucket, prefix, objects)
+        return len(objects)
+
+    def _boundaries(self, bucket: str, prefix: str, shards: int) -> list[str]:
+        """Keys that split the prefix into ranges, from the key structure and the previously known keys"""
+        if shards <= 1:
+            return []
+        return sorted(set(self._structural_boundaries(bucket, prefix)) | set(self._known_boundaries(bucket, prefix, shards)))
+
+    def _structural_boundaries(self, bucket: str, prefix: str) -> list[str]:
+        """Boundaries derived from the first key, so a cold rebuild is sharded too.
+
+        Dated keys, like the source files, are split per month from the date of the first key up to
+        now. Other keys are split on the first name character after the part they share with it.
+        """
+        response = self.s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix, MaxKeys=1)
+        metrics.count("extract", "list_requests")
+        if not response.get("Contents"):
+            return []
+        first_key = response["Contents"][0]["Key"]
+
+        match = _DATE.search(first_key, len(prefix))
+        if match is not None:
+            stem = first_key[:match.start()]
+            year, month = int(match[1]), int(match[2])
+            boundaries = []
+            while (year, month) <= (date.today().year, date.today().month):
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+                # every key dated before this month sorts before it, e.g. `..._2024-01-31.json` < `..._2024-02`
+                boundaries.append(f"{stem}{year:04d}-{month:02d}")
+            return boundaries
+
+        position = next((i for i in range(len(prefix), len(first_key)) if first_key[i].isalnum()), None)
+        if position is None:
+            return []
+        stem = first_key[:position]
+        return [stem + character for character in _NAME_CHARACTERS if stem + character > first_key]
+
+    def _known_boundaries(self, bucket: str, prefix: str, shards: int) -> list[str]:
+        """Keys that split the previously known keys into `shards` ranges of about equal size"""
+        keys = self.keys(bucket, prefix)
+        step = len(keys) // shards
+        if step == 0:
+            return []
+        return [keys[i * step] for i in range(1, shards)]
+
+    def _list_range(self, bucket: str, prefix: str, after: str | None, until: str | None) -> list[dict]:
+        """List the objects with `after` < key <= `until`, either bound may be None"""
+        kwargs = {"Bucket": bucket, "Prefix": prefix}
+        if after is not None:
+            kwargs["StartAfter"] = after
+
+        objects = []
+        for page in self.s3_client.get_paginator("list_objects_v2").paginate(**kwargs):
+            metrics.count("extract", "list_requests")
+            for obj in page.get("Contents", []):
+                if until is not None and obj["Key"] > until:
+                    return objects
+                objects.append(obj)
+        return objects
+
+    def _store(self, bucket: str, prefix: str, objects: list[dict]):
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (bucket, prefix, obj["Key"], obj.get("Size"), obj.get("ETag"), _isoformat(obj.get("LastModified")))
+                    for obj in objects
+                ],
+            )
+            last_key = max((obj["Key"] for obj in objects), default=self.last_key(bucket, prefix))
+            self.db.execute(
+                "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?)",
+                (bucket, prefix, last_key, datetime.now().isoformat(timespec="seconds")),
+            )
+
+
+def _isoformat(value) -> str | None:
+    return value.isoformat() if isinstance(value, datetime) else value
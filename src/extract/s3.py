@@ -1,20 +1,28 @@
 import boto3
 
+from compression import SUFFIXES, source_name
+from extract.inventory import S3Inventory
+from metrics import metrics
 from util import ETLConfig
 
 
 class S3Extractor:
-    def __init__(self, aws_profile: str, bucket_name: str, config: ETLConfig):
+    def __init__(self, aws_profile: str, bucket_name: str, config: ETLConfig, s3_client=None,
+                 inventory: S3Inventory | None = None):
         self.bucket_name = bucket_name
         self.config = config
-        self.s3_client = boto3.session.Session(profile_name=aws_profile).client('s3')
+        self.s3_client = s3_client or boto3.session.Session(profile_name=aws_profile).client('s3')
+        self.inventory = inventory
         self.filenames = []
 
     @property
     def output_file(self) -> str:
         return f'{self.config.type.value}.txt'
 
-    def collect_filenames(self):
+    def collect_filenames(self, rebuild: bool = False):
+        if self.inventory is not None:
+            return self._collect_from_inventory(rebuild)
+
         paginator = self.s3_client.get_paginator('list_objects_v2')
         page_iterator = paginator.paginate(
             Bucket=self.bucket_name,
@@ -27,6 +35,7 @@ class S3Extractor:
         print(f"Collecting files from s3://{self.bucket_name}/{self.config.s3_prefix}")
 
         for page in page_iterator:
+            metrics.count('extract', 'list_requests')
             if 'Contents' in page:
                 for obj in page['Contents']:
                     key = obj['Key']
@@ -37,12 +46,30 @@ class S3Extractor:
                         total_count += 1
 
         self.filenames = filenames
+        metrics.count('extract', 'listed_objects', total_count)
         print(f'Collected {total_count} files')
 
+    def _collect_from_inventory(self, rebuild: bool):
+        prefix = self.config.s3_prefix
+        print(f"Collecting files from s3://{self.bucket_name}/{prefix} using inventory {self.inventory.path}")
+        if rebuild:
+            self.inventory.rebuild(self.bucket_name, prefix)
+        else:
+            new = self.inventory.refresh(self.bucket_name, prefix)
+            print(f'Found {new} new files since the last listing')
+
+        self.filenames = [key.split('/')[-1] for key in self.inventory.keys(self.bucket_name, prefix)]
+        self.filenames = [filename for filename in self.filenames if filename]
+        metrics.count('extract', 'listed_objects', len(self.filenames))
+        print(f'Collected {len(self.filenames)} files')
+
     def generate_rclone_filter_list(self) -> str:
         with open(self.output_file, 'w') as f:
-            for filename in self.filenames:
-                f.write(f"- {filename}\n")
+            # the source may be compressed differently than the transformed file in S3, and partitioned
+            # outputs appear once per partition
+            suffixes = ",".join(SUFFIXES.values())
+            for name in sorted({source_name(filename) for filename in self.filenames}):
+                f.write(f"- {name}{{,{suffixes}}}\n")
             f.write(f'+ {self.config.filename_prefix}*\n')
             f.write(f'- *')
 
@@ -1,10 +1,24 @@
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO
 
 import pandas as pd
-from src.supabase import SupabaseClient
-from datetime import date, timedelta
+from tqdm import tqdm
 
-from src.utils import categorise_build_years, categorise_square_meters
+from src.extract.addresses import ADDRESS_INDEX, ADDRESSES_CSV, DRENTHE_CSV, AddressIndex
+from src.metrics import metrics
+from src.supabase import CHUNK_SIZE, SupabaseClient
+from datetime import date, datetime, timedelta
+
+from src.utils import (
+    BUILD_YEAR_BINS,
+    ENERGY_LABEL_GROUPS,
+    RESIDENT_COUNT_BINS,
+    SQUARE_METER_BINS,
+    categorise,
+    categorise_groups,
+)
 
 
 class SupabaseExtractor:
@@ -39,31 +53,155 @@ class DailyUsageDataExtractor(SupabaseExtractor):
 
             report_date += timedelta(days=1)
 
+    def extract_ranged(self, start: date, end: date | None = None, shard_days: int = 7, workers: int = 4,
+                       chunk_size: int = CHUNK_SIZE):
+        """Extract daily usage data from `start` up until `end` (default today) with range queries.
+        The period is split into shards of `shard_days` days that are extracted concurrently, each
+        streaming its rows in chunks and writing a day file as soon as the day is complete.
+        """
+        output_path = os.path.join(self.path, "daily_usage_data")
+        os.makedirs(output_path, exist_ok=True)
+
+        end = end or date.today()
+        shards = []
+        while start < end:
+            shards.append((start, min(start + timedelta(days=shard_days), end)))
+            start += timedelta(days=shard_days)
+
+        print(f"Fetching data for {len(shards)} shards of {shard_days} days with {workers} workers")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._extract_shard, output_path, *shard, chunk_size) for shard in shards]
+            for future in tqdm(futures, desc="Extracting"):
+                future.result()
+
+    def _extract_shard(self, output_path: str, start: date, end: date, chunk_size: int):
+        writer = _DayFileWriter(output_path)
+        try:
+            for chunk in self.client.iter_daily_usage_data(start, end, chunk_size):
+                chunk["date"] = chunk["date"].astype(str)  # Ensure date is in string format
+                for date_str, day in chunk.groupby("date", sort=False):
+                    writer.write(date_str, day)
+        except BaseException:
+            writer.discard()
+            raise
+        writer.close()
+
+        day = start
+        while day < end:
+            # days without any usage still get an (empty) file, like the day by day extraction
+            date_str = day.strftime("%Y-%m-%d")
+            if date_str not in writer.written:
+                open(_day_file(output_path, date_str), "w").close()
+                writer.written[date_str] = 0
+            metrics.record_file("extract", os.path.basename(_day_file(output_path, date_str)), records=writer.written[date_str])
+            day += timedelta(days=1)
+
+
+def _day_file(output_path: str, date_str: str) -> str:
+    return f"{output_path}/supabase_{date_str}.json"
+
+
+class _DayFileWriter:
+    """Appends the rows of one day at a time, a day file is moved into place once the next day starts"""
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.written: dict[str, int] = {}
+        self.date_str: str | None = None
+        self.file: IO[str] | None = None
+
+    def write(self, date_str: str, rows: pd.DataFrame):
+        if date_str != self.date_str:
+            self.close()
+            self.date_str = date_str
+            self.file = open(self._tmp_path, "w")
+            self.written[date_str] = 0
+        rows.to_json(self.file, orient="records", lines=True, default_handler=str)
+        self.written[date_str] += len(rows)
+
+    @property
+    def _tmp_path(self) -> str:
+        return f"{self.output_path}/.supabase_{self.date_str}.json.tmp"
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            os.replace(self._tmp_path, _day_file(self.output_path, self.date_str))
+            self.file = None
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+            os.remove(self._tmp_path)
+            self.file = None
+
 
 class HouseholdDataExtractor(SupabaseExtractor):
-    def extract(self):
-        """Extract household data from Supabase and store it in a JSON file."""
+    addresses_csv = ADDRESSES_CSV
+    drenthe_csv = DRENTHE_CSV
+    address_index = ADDRESS_INDEX
+
+    def extract(self, incremental: bool = False):
+        """Extract household data from Supabase and store it in a JSON file.
+        With `incremental`, only households changed since the previous extraction are fetched
+        and enriched, and merged into the existing file by id.
+        """
         output_path = os.path.join(self.path, "supabase_households")
         os.makedirs(output_path, exist_ok=True)
+        output_file = f"{output_path}/households_for_analysis.json"
+        watermark_file = f"{output_path}/households_for_analysis.watermark.json"
+
+        # Taken before fetching, so updates during the extraction are fetched again next time
+        watermark = self.client.get_household_watermark()
+        previous = self._read_watermark(watermark_file)
+
+        if incremental and previous is not None and os.path.exists(output_file):
+            print(f"Fetching households changed since {previous} from Supabase...")
+            households = self._merge(
+                pd.read_json(output_file, orient="records", lines=True, dtype=False, convert_dates=False),
+                self.client.get_household_data(changed_since=previous),
+                self.client.get_household_ids(),
+            )
+        else:
+            print("Fetching household data from Supabase...")
+            households = self._enrich(self.client.get_household_data())
 
-        print("Fetching household data from Supabase...")
-        households = self.client.get_household_data()
-
-        households = self._enrich(households)
-
+        tmp_file = f"{output_path}/.households_for_analysis.json.tmp"
         households.to_json(
-            f"{output_path}/households_for_analysis.json",
+            tmp_file,
             orient="records",
             lines=True,
             default_handler=str,
         )
-        print(f"Household data saved to {output_path}/households_for_analysis.json")
+        os.replace(tmp_file, output_file)
+        with open(watermark_file, "w") as f:
+            json.dump({"watermark": watermark, "extracted_at": datetime.now().isoformat(timespec="seconds")}, f)
+        print(f"Household data saved to {output_file}")
+
+    @staticmethod
+    def _read_watermark(watermark_file: str) -> str | None:
+        if not os.path.exists(watermark_file):
+            return None
+        with open(watermark_file) as f:
+            return json.load(f)["watermark"]
+
+    def _merge(self, snapshot: pd.DataFrame, changed: pd.DataFrame, current_ids: set[str]) -> pd.DataFrame:
+        """Replace the changed households in the snapshot and drop the deleted ones"""
+        changed = self._enrich(changed) if len(changed) else changed
+        changed_ids = set(changed["id"].astype(str))
+        keep = ~snapshot["id"].astype(str).isin(changed_ids) & snapshot["id"].astype(str).isin(current_ids)
+        deleted = int((~snapshot["id"].astype(str).isin(current_ids)).sum())
+        print(f"\t> {len(changed_ids)} changed, {deleted} deleted, {int(keep.sum())} unchanged households")
+        if not len(changed):
+            return snapshot[keep]
+        return pd.concat([snapshot[keep], changed], ignore_index=True)
 
     def _enrich(self, households: pd.DataFrame) -> pd.DataFrame:
         print("Enriching household data...")
         print("\t> Updating existing columns...")
-        households = households.apply(categorise_build_years, axis=1)
-        households = households.apply(categorise_square_meters, axis=1)
+        households["build_year_cat"] = categorise(households["build_year"], BUILD_YEAR_BINS)
+        households["square_meters_cat"] = categorise(households["square_meters"], SQUARE_METER_BINS)
+        households["resident_count_cat"] = categorise(households["resident_count"], RESIDENT_COUNT_BINS)
 
         households["date_of_activation"] = households[
             "date_of_activation"
@@ -77,23 +215,15 @@ class HouseholdDataExtractor(SupabaseExtractor):
         households["house_number"] = households["house_number"].astype("int")
 
         print("\t> Adding coordinates...")
-        # Add longitude and latitude from alle_adressen.csv
+        # Add longitude and latitude from alle_adressen.csv, through the address index
+        addresses = AddressIndex(self.address_index, self.addresses_csv, self.drenthe_csv)
         households["address"] = (
             households["zipcode"].astype(str)
             + "#"
             + households["house_number"].astype(str)
         )
-        alle_adressen = pd.read_csv(
-            "data/alle_adressen.csv", sep=";", low_memory=False, encoding="utf-8"
-        )
-        alle_adressen["address"] = (
-            alle_adressen["Postcode"].astype(str)
-            + "#"
-            + alle_adressen["Huisnummer"].astype(str)
-        )
-        alle_adressen.drop_duplicates(subset="address", inplace=True)
         households = households.merge(
-            alle_adressen[["address", "lon", "lat"]], on="address", how="left"
+            addresses.coordinates(households["address"]), on="address", how="left"
         ).drop(columns="address")
 
         print("\t> Adding energielabel and buurtnaam (Drenthe only)...")
@@ -104,25 +234,15 @@ class HouseholdDataExtractor(SupabaseExtractor):
             + households["house_number"].astype(str)
             + households["house_number_addition"].fillna("").astype(str)
         )
-        drenthe = pd.read_csv(
-            "data/adresgegevens-provincie-drenthe-2024.csv", sep=",", low_memory=False, encoding="utf-8"
-        )
-        drenthe["address"] = (
-            drenthe["Postcode"].astype(str)
-            + "#"
-            + drenthe["Huisnummer"].astype(str)
-            + drenthe["Huisletter"].fillna("").astype(str)
-        )
-        drenthe.drop_duplicates(subset="address", inplace=True)
         households = households.merge(
-            drenthe[["address", "Pand energielabel"]],
+            addresses.energy_labels(households["address"]),
             on="address", how="left"
         ).drop(columns="address")  # Energylabel must be as exact as possible
-        drenthe.drop_duplicates(subset="Postcode", inplace=True)
         households = households.merge(
-            drenthe[["Postcode", "Buurtnaam", "Wijknaam"]],
+            addresses.neighbourhoods(households["zipcode"]),
             left_on="zipcode", right_on="Postcode", how="left"
         ).drop(columns="Postcode")  # Buurtnaam and Wijknaam can be on postcode level
         households.rename(columns={"Pand energielabel": "energy_label", "Buurtnaam": "buurt", "Wijknaam": "wijk"}, inplace=True)
+        households["energy_label_cat"] = categorise_groups(households["energy_label"], ENERGY_LABEL_GROUPS)
 
         return households
@@ -0,0 +1,311 @@
+import io
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Iterator
+
+from tqdm import tqdm
+
+from compression import add_suffix, codec_for, compress, decompress, strip_suffix
+from extract.delta import rclone_lsjson
+from metrics import metrics
+from transform.base import FileResult
+from transform.manifest import HashingReader
+from util import ETLConfig
+
+
+@dataclass
+class SourceObject:
+    name: str
+    size: int
+
+
+class Source:
+    """Objects to stream through the transformer, without storing them locally"""
+
+    def list(self) -> list[SourceObject]:
+        raise NotImplementedError
+
+    @contextmanager
+    def open(self, name: str) -> Iterator[IO[bytes]]:
+        raise NotImplementedError
+
+
+class LocalSource(Source):
+
+    def __init__(self, folder: str | Path):
+        self.folder = Path(folder)
+
+    def list(self) -> list[SourceObject]:
+        return [
+            SourceObject(path.relative_to(self.folder).as_posix(), path.stat().st_size)
+            for path in sorted(self.folder.rglob("*")) if path.is_file()
+        ]
+
+    @contextmanager
+    def open(self, name: str) -> Iterator[IO[bytes]]:
+        with open(self.folder / name, "rb") as f:
+            yield f
+
+
+class RcloneSource(Source):
+    """Streams objects from an rclone remote with `rclone cat`, like the Google Cloud Storage bucket"""
+
+    def __init__(self, remote: str, include: str | None = None):
+        self.remote = remote
+        self.include = include
+
+    def list(self) -> list[SourceObject]:
+        return [SourceObject(path, entry["Size"]) for path, entry in sorted(rclone_lsjson(self.remote, self.include).items())]
+
+    @contextmanager
+    def open(self, name: str) -> Iterator[IO[bytes]]:
+        process = subprocess.Popen(["rclone", "cat", self.remote + name], stdout=subprocess.PIPE)
+        try:
+            yield ProcessOutput(process, f"rclone cat {self.remote}{name}")
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            process.stdout.close()
+            process.wait()
+        if process.returncode != 0:
+            raise RuntimeError(f"rclone cat {self.remote}{name} failed with error code {process.returncode}")
+
+
+class ProcessOutput(io.RawIOBase):
+    """Stdout of a process that raises at the end of the output when the process failed.
+
+    A process that dies mid-stream may still cut its output at a line boundary, so the end of the
+    output is only reported once the process exited successfully, before anything is committed.
+    """
+
+    def __init__(self, process: subprocess.Popen, command: str):
+        self.process = process
+        self.command = command
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = self.process.stdout.readinto(buffer)
+        if not n and self.process.wait() != 0:
+            raise RuntimeError(f"{self.command} failed with error code {self.process.returncode}")
+        return n
+
+
+class Sink:
+    """Destination of the transformed objects, an object only appears once it is completely written"""
+
+    def keys(self, prefix: str) -> set[str]:
+        raise NotImplementedError
+
+    @contextmanager
+    def open(self, key: str, content_encoding: str | None = None) -> Iterator[IO[bytes]]:
+        raise NotImplementedError
+
+
+class S3MultipartSink(Sink):
+    """Uploads objects in parts while they are written.
+
+    At most `max_in_flight` parts per object are buffered or uploading at any time, so memory use
+    is bounded by about `(max_in_flight + 1) * part_size` per object being written. Parts are
+    uploaded by a thread pool of `max_concurrency` threads shared by all objects. S3 requires
+    parts of at least 5 MiB, except for the last one.
+    """
+
+    def __init__(self, s3_client, bucket_name: str, part_size: int = 8 * 1024 * 1024,
+                 max_in_flight: int = 4, max_concurrency: int = 8):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.part_size = part_size
+        self.max_in_flight = max_in_flight
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def keys(self, prefix: str) -> set[str]:
+        keys = set()
+        for page in self.s3_client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket_name, Prefix=prefix):
+            metrics.count("fused", "list_requests")
+            keys.update(obj["Key"] for obj in page.get("Contents", []))
+        return keys
+
+    @contextmanager
+    def open(self, key: str, content_encoding: str | None = None) -> Iterator["MultipartWriter"]:
+        extra = {"ContentEncoding": content_encoding} if content_encoding else {}
+        writer = MultipartWriter(self, key, extra)
+        try:
+            yield writer
+            writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+class MultipartWriter:
+    """Binary file-like object that uploads everything written to it as one S3 object"""
+
+    def __init__(self, sink: S3MultipartSink, key: str, extra: dict):
+        self.sink = sink
+        self.key = key
+        self.extra = extra
+        self.buffer = bytearray()
+        self.bytes = 0
+        self.upload_id: str | None = None
+        self.parts: list[Future] = []
+        self._in_flight = threading.BoundedSemaphore(sink.max_in_flight)
+
+    @property
+    def _client(self):
+        return self.sink.s3_client
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.bytes += len(data)
+        while len(self.buffer) >= self.sink.part_size:
+            part = bytes(self.buffer[:self.sink.part_size])
+            del self.buffer[:self.sink.part_size]
+            self._submit(part)
+        return len(data)
+
+    def _submit(self, part: bytes):
+        if self.upload_id is None:
+            response = self._client.create_multipart_upload(Bucket=self.sink.bucket_name, Key=self.key, **self.extra)
+            self.upload_id = response["UploadId"]
+
+        self._in_flight.acquire()  # blocks the writer while too many parts are pending
+        number = len(self.parts) + 1
+        future = self.sink.executor.submit(self._upload_part, number, part)
+        future.add_done_callback(lambda _: self._in_flight.release())
+        self.parts.append(future)
+
+    def _upload_part(self, number: int, part: bytes) -> dict:
+        response = self._client.upload_part(
+            Bucket=self.sink.bucket_name, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=part
+        )
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    def close(self):
+        if self.upload_id is None:
+            # small objects are uploaded in a single request
+            self._client.put_object(Bucket=self.sink.bucket_name, Key=self.key, Body=bytes(self.buffer), **self.extra)
+            return
+
+        if self.buffer:
+            self._submit(bytes(self.buffer))
+            self.buffer.clear()
+        parts = [future.result() for future in self.parts]
+        self._client.complete_multipart_upload(
+            Bucket=self.sink.bucket_name, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": parts}
+        )
+
+    def abort(self):
+        if self.upload_id is None:
+            return
+        for future in self.parts:
+            future.cancel()
+        for future in self.parts:
+            if not future.cancelled():
+                future.exception()  # wait for parts that are still uploading
+        self._client.abort_multipart_upload(Bucket=self.sink.bucket_name, Key=self.key, UploadId=self.upload_id)
+
+
+class FusedPipeline:
+    """Streams source objects through the transformer straight into the sink, skipping local disk.
+
+    Each object is downloaded, decompressed, transformed and uploaded in one pass, `concurrency`
+    objects at a time. Objects whose output already exists in the sink are skipped, so an
+    interrupted run can be resumed. Only JSON lines output is supported, Parquet outputs are
+    partitioned into several files per source and written by the regular transform step.
+    """
+
+    def __init__(self, config: ETLConfig, source: Source, sink: Sink, concurrency: int = 4):
+        if config.output_format != "jsonl":
+            raise ValueError(f"The fused mode writes JSON lines, not {config.output_format}")
+        if config.partitioning is not None:
+            raise ValueError("The fused mode writes one object per source file, it does not partition the outputs")
+        self.config = config
+        self.source = source
+        self.sink = sink
+        self.concurrency = concurrency
+        self.transformer = config.transformer(config)
+
+    def output_key(self, name: str) -> str:
+        filename = add_suffix(strip_suffix(Path(name).name), self.config.output_compression)
+        return self.config.s3_folder + filename
+
+    def run(self) -> list[FileResult]:
+        print(f"Streaming {self.config.type.value} files to {self.config.s3_folder}")
+        existing = self.sink.keys(self.config.s3_folder)
+        objects = []
+        for obj in self.source.list():
+            if not self.transformer.applies(Path(obj.name).name):
+                continue
+            if self.output_key(obj.name) in existing:
+                metrics.count("fused", "skipped_existing")
+                continue
+            objects.append(obj)
+
+        print(f"Found {len(objects)} files to stream ({sum(obj.size for obj in objects) / 1e9:.2f} GB), "
+              f"{len(existing)} outputs exist already")
+
+        results = []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self._stream_safe, obj) for obj in objects]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Streaming"):
+                result = future.result()
+                if result.error is not None:
+                    tqdm.write(f"[ERROR] Failed to stream {result.filename}: {result.error}")
+                metrics.record_file(
+                    "fused", result.filename, records=result.records, bytes=result.bytes,
+                    wall_seconds=result.seconds, error=result.error,
+                )
+                results.append(result)
+
+        failed = sum(result.error is not None for result in results)
+        print(f"\nStreamed {len(results) - failed} files" + (f", failed: {failed} files" if failed else ""))
+        return results
+
+    def _stream_safe(self, obj: SourceObject) -> FileResult:
+        try:
+            return self.stream(obj)
+        except Exception as e:
+            return FileResult(filename=obj.name, worker=os.getpid(), error=f"{type(e).__name__}: {e}")
+
+    def stream(self, obj: SourceObject) -> FileResult:
+        start = time.perf_counter()
+        key = self.output_key(obj.name)
+        compression = self.config.output_compression
+
+        with self.source.open(obj.name) as raw:
+            source = HashingReader(raw)
+            text = io.TextIOWrapper(decompress(io.BufferedReader(source), codec_for(obj.name)))
+            records = 0
+            with self.sink.open(key, compression) as output:
+                with compress(output, compression, self.config.compression_level) as compressed:
+                    with self.transformer.codec.line_writer(compressed) as writer:
+                        for record in self.transformer.iter_transform(text):
+                            writer.write(record)
+                            records += 1
+                # a source cut off at a record boundary still parses, the upload is only completed
+                # when the whole object was read
+                sha256 = source.hexdigest()
+                if source.bytes != obj.size:
+                    raise IOError(f"Read {source.bytes} of {obj.size} bytes of {obj.name}")
+
+        return FileResult(
+            filename=obj.name,
+            worker=os.getpid(),
+            records=records,
+            bytes=obj.size,
+            seconds=time.perf_counter() - start,
+            sha256=sha256,
+            outputs={key: {"size": output.bytes}},
+        )
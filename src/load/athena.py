@@ -0,0 +1,64 @@
+from datetime import date
+
+from partitioning import PARTITION_COLUMNS
+from util import ETLConfig
+
+FIRST_YEAR = 2020  # first year of the projected partitions
+
+
+def table_ddl(config: ETLConfig, schema: dict[str, str], bucket_name: str, table: str | None = None,
+              last_year: int | None = None) -> str:
+    """
+    CREATE TABLE statement for the loaded outputs of a data type, with partition projection so Athena
+    derives the partitions from the query filters instead of listing them or reading a catalog.
+    :param schema: Column names and Athena types of the records, the transformer's output schema.
+    :param table: Table name, defaults to `gcs_<type>`, or `gcs_<type>_compacted` for compacted outputs.
+    :param last_year: Last projected year of the "ymd" partitioning, defaults to next year.
+    """
+    location = f"s3://{bucket_name}/{config.load_s3_folder}"
+    partitioning = config.partition_layout
+    partitions = PARTITION_COLUMNS.get(partitioning, {})
+    columns = ",\n".join(f"  `{name}` {type_}" for name, type_ in schema.items() if name not in partitions)
+
+    table = table or config.load_s3_folder.rstrip('/').replace('/', '_')
+    lines = [f"CREATE EXTERNAL TABLE IF NOT EXISTS {table} (", columns, ")"]
+    if partitions:
+        lines.append("PARTITIONED BY (" + ", ".join(f"`{name}` {type_}" for name, type_ in partitions.items()) + ")")
+    if config.output_format == "parquet":
+        lines.append("STORED AS PARQUET")
+    else:
+        lines.append("ROW FORMAT SERDE 'org.openx.data.jsonserde.JsonSerDe'")
+    lines.append(f"LOCATION '{location}'")
+
+    properties = _projection(partitioning, location, last_year or date.today().year + 1)
+    if properties:
+        lines.append("TBLPROPERTIES (\n" + ",\n".join(f"  '{key}'='{value}'" for key, value in properties.items()) + "\n)")
+    return "\n".join(lines) + ";\n"
+
+
+def _projection(partitioning: str | None, location: str, last_year: int) -> dict[str, str]:
+    if partitioning is None:
+        return {}
+
+    properties = {"projection.enabled": "true"}
+    if partitioning == "date":
+        properties |= {
+            "projection.date.type": "date",
+            "projection.date.format": "yyyy-MM-dd",
+            "projection.date.range": f"{FIRST_YEAR}-01-01,NOW",
+            "projection.date.interval": "1",
+            "projection.date.interval.unit": "DAYS",
+        }
+    else:
+        ranges = {"year": (FIRST_YEAR, last_year), "month": (1, 12), "day": (1, 31)}
+        for name, (first, last) in ranges.items():
+            properties |= {
+                f"projection.{name}.type": "integer",
+                f"projection.{name}.range": f"{first},{last}",
+            }
+            if name != "year":
+                properties[f"projection.{name}.digits"] = "2"
+
+    template = "/".join(f"{name}=${{{name}}}" for name in PARTITION_COLUMNS[partitioning])
+    properties["storage.location.template"] = f"{location}{template}/"
+    return properties
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import shutil
+import threading
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from botocore.exceptions import ClientError
+
+LIST_PAGE_SIZE = 1000
+
+
+class LocalS3Client:
+    """Stand-in for a boto3 S3 client that stores objects in a local folder.
+
+    Implements the subset of the client used by the extractors and loaders, so they can be
+    tested and benchmarked without AWS. Objects are stored at `<root>/<bucket>/<key>` with
+    their metadata in a `.meta` sibling tree.
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self._uploads: dict[str, dict[int, bytes]] = {}
+        self._upload_args: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.requests: dict[str, int] = {}
+
+    def _count(self, operation: str):
+        with self._lock:
+            self.requests[operation] = self.requests.get(operation, 0) + 1
+
+    def _path(self, bucket: str, key: str) -> Path:
+        return self.root / bucket / key
+
+    def _meta_path(self, bucket: str, key: str) -> Path:
+        return self.root / ".meta" / bucket / f"{key}.json"
+
+    def _store(self, bucket: str, key: str, data: bytes, etag: str, extra: dict | None = None):
+        path = self._path(bucket, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+
+        meta_path = self._meta_path(bucket, key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        meta_path.write_text(json.dumps({"ETag": etag} | (extra or {})))
+
+    def _object(self, bucket: str, key: str) -> dict:
+        path = self._path(bucket, key)
+        if not path.is_file():
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        meta = json.loads(self._meta_path(bucket, key).read_text())
+        stat = path.stat()
+        return meta | {
+            "Key": key,
+            "ContentLength": stat.st_size,
+            "Size": stat.st_size,
+            "LastModified": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        }
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        self._count("HeadObject")
+        return self._object(Bucket, Key)
+
+    def get_object(self, Bucket: str, Key: str) -> dict:
+        self._count("GetObject")
+        return self._object(Bucket, Key) | {"Body": open(self._path(Bucket, Key), "rb")}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes = b"", **kwargs) -> dict:
+        self._count("PutObject")
+        data = Body if isinstance(Body, bytes) else Body.read()
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        self._store(Bucket, Key, data, etag, kwargs)
+        return {"ETag": etag}
+
+    def delete_objects(self, Bucket: str, Delete: dict, **kwargs) -> dict:
+        self._count("DeleteObjects")
+        for obj in Delete["Objects"]:
+            self._path(Bucket, obj["Key"]).unlink(missing_ok=True)
+            self._meta_path(Bucket, obj["Key"]).unlink(missing_ok=True)
+        return {} if Delete.get("Quiet") else {"Deleted": [{"Key": obj["Key"]} for obj in Delete["Objects"]]}
+
+    def upload_file(self, Filename: str, Bucket: str, Key: str, ExtraArgs: dict | None = None,
+                    Callback=None, Config=None):
+        self._count("UploadFile")
+        data = Path(Filename).read_bytes()
+        if Config is not None and len(data) >= Config.multipart_threshold:
+            # the ETag of a multipart upload, like boto3 would do with this transfer config
+            chunks = [data[i:i + Config.multipart_chunksize] for i in range(0, len(data), Config.multipart_chunksize)]
+            digests = b"".join(hashlib.md5(chunk).digest() for chunk in chunks)
+            etag = f'"{hashlib.md5(digests).hexdigest()}-{len(chunks)}"'
+        else:
+            etag = f'"{hashlib.md5(data).hexdigest()}"'
+        self._store(Bucket, Key, data, etag, ExtraArgs)
+        if Callback is not None:
+            Callback(len(data))
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", StartAfter: str = "",
+                        ContinuationToken: str | None = None, MaxKeys: int = LIST_PAGE_SIZE, **kwargs) -> dict:
+        self._count("ListObjectsV2")
+        bucket_root = self.root / Bucket
+        keys = sorted(
+            path.relative_to(bucket_root).as_posix()
+            for path in bucket_root.rglob("*")
+            if path.is_file() and not path.name.startswith(".")
+        ) if bucket_root.exists() else []
+
+        after = ContinuationToken or StartAfter
+        keys = [key for key in keys if key.startswith(Prefix) and key > after]
+        page = keys[:MaxKeys]
+        response = {"KeyCount": len(page), "IsTruncated": len(keys) > MaxKeys}
+        if page:
+            response["Contents"] = [self._listing(Bucket, key) for key in page]
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = page[-1]
+        return response
+
+    def _listing(self, bucket: str, key: str) -> dict:
+        obj = self._object(bucket, key)
+        return {name: obj[name] for name in ("Key", "Size", "ETag", "LastModified")}
+
+    def get_paginator(self, operation: str) -> "LocalPaginator":
+        assert operation == "list_objects_v2", f"{operation} is not supported by the local S3 client"
+        return LocalPaginator(self)
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **kwargs) -> dict:
+        self._count("CreateMultipartUpload")
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = {}
+            self._upload_args[upload_id] = kwargs
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes, **kwargs) -> dict:
+        self._count("UploadPart")
+        data = Body if isinstance(Body, (bytes, bytearray)) else Body.read()
+        with self._lock:
+            self._uploads[UploadId][PartNumber] = bytes(data)
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict, **kwargs) -> dict:
+        self._count("CompleteMultipartUpload")
+        with self._lock:
+            parts = self._uploads.pop(UploadId)
+            extra = self._upload_args.pop(UploadId) | kwargs
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        data = b"".join(parts[number] for number in numbers)
+        digests = b"".join(hashlib.md5(parts[number]).digest() for number in numbers)
+        etag = f'"{hashlib.md5(digests).hexdigest()}-{len(numbers)}"'
+        self._store(Bucket, Key, data, etag, extra)
+        return {"ETag": etag}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str) -> dict:
+        self._count("AbortMultipartUpload")
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+            self._upload_args.pop(UploadId, None)
+        return {}
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class LocalPaginator:
+
+    def __init__(self, client: LocalS3Client):
+        self.client = client
+
+    def paginate(self, **kwargs):
+        token = None
+        while True:
+            page = self.client.list_objects_v2(**kwargs, **({"ContinuationToken": token} if token else {}))
+            yield page
+            if not page["IsTruncated"]:
+                return
+            token = page["NextContinuationToken"]
@@ -1,70 +1,260 @@
+import hashlib
+import math
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from tqdm import tqdm
-from botocore.exceptions import ClientError
 
+from compression import codec_for
+from metrics import metrics
 from util import ETLConfig
 
+MAX_FAILURES = 10
+MB = 1024 * 1024
+HASH_CHUNK_SIZE = 1 << 20
+DELETE_BATCH_SIZE = 1000  # the most keys DeleteObjects accepts
+
+
+@dataclass
+class Upload:
+    path: Path
+    key: str
+    size: int
+    reason: str  # 'new' or 'changed'
+
+
+@dataclass
+class UploadPlan:
+    uploads: list[Upload] = field(default_factory=list)
+    unchanged: int = 0
+    deletes: list[str] = field(default_factory=list)
+
+    @property
+    def bytes(self) -> int:
+        return sum(upload.size for upload in self.uploads)
+
+    def count(self, reason: str) -> int:
+        return sum(upload.reason == reason for upload in self.uploads)
+
+    def report(self):
+        print(
+            f"Upload plan: {self.count('new')} new and {self.count('changed')} changed files "
+            f"({self.bytes / 1e9:.2f} GB), {self.unchanged} unchanged files are skipped"
+            + (f", {len(self.deletes)} stale objects are deleted" if self.deletes else "")
+        )
+
+
+def md5_etag(path: Path, part_size: int | None = None) -> str:
+    """The S3 ETag of a file uploaded in one request, or in parts of `part_size` bytes"""
+    if part_size is None:
+        md5 = hashlib.md5()
+        with open(path, 'rb') as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                md5.update(chunk)
+        return f'"{md5.hexdigest()}"'
+
+    digests = []
+    with open(path, 'rb') as f:
+        while part := f.read(part_size):
+            digests.append(hashlib.md5(part).digest())
+    return f'"{hashlib.md5(b"".join(digests)).hexdigest()}-{len(digests)}"'
+
 
 class S3Loader:
+    # Files above the threshold are uploaded in parts, several parts of a file at a time
+    transfer_config = TransferConfig(
+        multipart_threshold=16 * MB,
+        multipart_chunksize=16 * MB,
+        max_concurrency=4,
+        use_threads=True,
+    )
+    retries = 3
+    retry_base_delay = 1.0  # seconds, doubled on every retry
 
-    def __init__(self, aws_profile: str, bucket_name: str, config: ETLConfig):
+    def __init__(self, aws_profile: str, bucket_name: str, config: ETLConfig, s3_client=None):
         self.bucket_name = bucket_name
         self.config = config
-        self.s3_client = boto3.session.Session(profile_name=aws_profile).client('s3')
+        # One client is shared by all upload threads, its connection pool is sized to match
+        self.s3_client = s3_client or boto3.session.Session(profile_name=aws_profile).client(
+            's3',
+            config=Config(
+                max_pool_connections=config.upload_workers * self.transfer_config.max_concurrency,
+                retries={'max_attempts': 5, 'mode': 'adaptive'},
+            ),
+        )
 
-    def _upload_file(self, local_path: str, s3_key: str):
-        """Upload a single file to S3 with progress bar, only if it doesn't exist"""
+    def _upload_file(self, local_path: str, s3_key: str, progress: tqdm | None = None):
+        """Upload a single file to S3, returns whether it succeeded"""
+        start = time.perf_counter()
         try:
-            try:
-                self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
-                return True
-            except ClientError as e:
-                if e.response['Error']['Code'] == '404':
-                    pass
-                else:
-                    print(f"\nError checking existence of {s3_key}: {e}")
-                    return False
-
-            self.s3_client.upload_file(
-                local_path,
-                self.bucket_name,
-                s3_key,
+            self._upload_with_retries(local_path, s3_key, progress)
+            metrics.record_file(
+                'load', s3_key, bytes=os.path.getsize(local_path), wall_seconds=time.perf_counter() - start
             )
             return True
         except Exception as e:
-            print(f"\nError uploading {local_path}: {e}")
+            tqdm.write(f"\nError uploading {local_path}: {e}")
+            metrics.record_file('load', s3_key, error=str(e))
             return False
-    
-    def load_all(self):
-        """Upload all files from local folder to S3"""
-        print(f'Loading all transformed files from {self.config.transformation_folder}')
-        
-        if not self.config.transformation_folder.exists():
-            print(f"Error: Local folder '{self.config.transformation_folder}' does not exist")
+
+    def _upload_with_retries(self, local_path: str, s3_key: str, progress: tqdm | None):
+        for attempt in range(self.retries + 1):
+            uploaded = 0
+
+            def callback(n: int):
+                nonlocal uploaded
+                uploaded += n
+                if progress is not None:
+                    progress.update(n)
+
+            try:
+                self.s3_client.upload_file(
+                    local_path,
+                    self.bucket_name,
+                    s3_key,
+                    ExtraArgs=self._extra_args(s3_key),
+                    Callback=callback,
+                    Config=self.transfer_config,
+                )
+                return
+            except Exception:
+                if progress is not None:
+                    progress.update(-uploaded)  # the file is uploaded again from the start
+                if attempt == self.retries:
+                    raise
+                metrics.record_retry('load')
+                # exponential backoff with jitter, so concurrent uploads do not retry in lockstep
+                time.sleep(self.retry_base_delay * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    @staticmethod
+    def _extra_args(s3_key: str) -> dict:
+        """Compressed outputs keep their extension, which Athena uses to pick the codec"""
+        codec = codec_for(s3_key)
+        if codec is None:
+            return {}
+        return {'ContentEncoding': codec}
+
+    def list_destination(self) -> dict[str, dict]:
+        """Size, ETag and upload time of every object below `config.load_s3_folder`, listed in bulk"""
+        objects = {}
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self.config.load_s3_folder):
+            metrics.count('load', 'list_requests')
+            for obj in page.get('Contents', []):
+                objects[obj['Key']] = {'Size': obj['Size'], 'ETag': obj['ETag'], 'LastModified': obj['LastModified']}
+        return objects
+
+    def plan(self, files: list[Path]) -> UploadPlan:
+        """
+        Compare local files with the destination listing, files that are missing or differ are uploaded.
+        A file of the same size that was last written before its object was uploaded is unchanged, only
+        files written since are hashed and compared by ETag, so a rerun does not read the whole output tree.
+        The compacted prefix mirrors the compacted folder, so objects the compactor no longer plans are
+        deleted, otherwise Athena would read their rows next to the objects that replaced them.
+        """
+        destination = self.list_destination()
+        plan = UploadPlan()
+        for file_path in files:
+            key = self._s3_key(file_path)
+            stat = file_path.stat()
+            size = stat.st_size
+            remote = destination.get(key)
+            if remote is None:
+                plan.uploads.append(Upload(file_path, key, size, 'new'))
+            elif remote['Size'] != size or (
+                    stat.st_mtime >= remote['LastModified'].timestamp()
+                    and not self._same_etag(file_path, size, remote['ETag'])
+            ):
+                plan.uploads.append(Upload(file_path, key, size, 'changed'))
+            else:
+                plan.unchanged += 1
+        if self.config.compaction_target_mb is not None:
+            keys = {self._s3_key(file_path) for file_path in files}
+            plan.deletes = sorted(key for key in destination if key not in keys)
+        return plan
+
+    def _same_etag(self, file_path: Path, size: int, etag: str) -> bool:
+        if '-' not in etag:
+            return md5_etag(file_path) == etag
+        # Multipart ETags depend on the part size, which is ours unless another tool uploaded the
+        # object, then the most common choice is the size rounded up to whole MBs
+        parts = int(etag.strip('"').rsplit('-', 1)[1])
+        part_sizes = {self.transfer_config.multipart_chunksize, math.ceil(size / parts / MB) * MB}
+        return any(md5_etag(file_path, part_size) == etag for part_size in part_sizes)
+
+    def load_all(self, dry_run: bool = False) -> UploadPlan | None:
+        """Upload the new and changed files from local folder to S3, `config.upload_workers` files at a time"""
+        print(f'Loading all transformed files from {self.config.load_folder}')
+
+        if not self.config.load_folder.exists():
+            print(f"Error: Local folder '{self.config.load_folder}' does not exist")
             return
-        
-        files_to_upload = [f for f in self.config.transformation_folder.rglob('*') if f.is_file()]
-        
+
+        files = [
+            f for f in self.config.load_folder.rglob('*')
+            if f.is_file() and not f.name.endswith('.tmp')  # skip outputs that are still being written
+        ]
+        print(f"Found {len(files)} local files, comparing with s3://{self.bucket_name}/{self.config.load_s3_folder}")
+        plan = self.plan(files)
+        plan.report()
+        metrics.count('load', 'skipped_existing', plan.unchanged)
+        if dry_run:
+            return plan
+        if plan.uploads and not self._upload(plan):
+            return plan
+        if plan.deletes:
+            self._delete(plan.deletes)
+        return plan
+
+    def _upload(self, plan: UploadPlan) -> bool:
+        """Upload the planned files, returns whether all of them were uploaded"""
         uploaded_count = 0
         failed_count = 0
-        
-        print(f"Found {len(files_to_upload)} files to upload")
-        print(f"Uploading to s3://{self.bucket_name}/{self.config.s3_folder}\n")
-        
-        for file_path in tqdm(files_to_upload, desc='Loading:'):
-            relative_path = file_path.relative_to(self.config.transformation_folder)
-            s3_key = self.config.s3_folder + str(relative_path).replace('\\', '/')
-            
-            if self._upload_file(str(file_path), s3_key):
-                uploaded_count += 1
-            else:
-                failed_count += 1
 
-            if failed_count > 10:
-                print(f"Stopping after 10 failed uploads")
-                return
-        
+        print(f"Uploading with {self.config.upload_workers} workers\n")
+        with tqdm(total=plan.bytes, desc='Loading:', unit='B', unit_scale=True) as progress, \
+                ThreadPoolExecutor(max_workers=self.config.upload_workers) as executor:
+            futures = [
+                executor.submit(self._upload_file, str(upload.path), upload.key, progress)
+                for upload in plan.uploads
+            ]
+            for future in as_completed(futures):
+                if future.result():
+                    uploaded_count += 1
+                else:
+                    failed_count += 1
+
+                if failed_count > MAX_FAILURES:
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    print(f"Stopping after {MAX_FAILURES} failed uploads")
+                    return False
+
         print(f"\nUpload complete!")
         print(f"Successfully uploaded: {uploaded_count} files")
         if failed_count > 0:
             print(f"Failed: {failed_count} files")
+        return failed_count == 0
+
+    def _delete(self, keys: list[str]):
+        """Delete stale objects, only after their replacements are uploaded so no rows go missing meanwhile"""
+        for i in range(0, len(keys), DELETE_BATCH_SIZE):
+            batch = keys[i:i + DELETE_BATCH_SIZE]
+            response = self.s3_client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True},
+            )
+            for error in response.get('Errors', []):
+                print(f"Error deleting {error['Key']}: {error.get('Message')}")
+            metrics.count('load', 'deleted', len(batch) - len(response.get('Errors', [])))
+        print(f"Deleted {len(keys)} stale objects")
+
+    def _s3_key(self, file_path: Path) -> str:
+        relative_path = file_path.relative_to(self.config.load_folder)
+        return self.config.load_s3_folder + str(relative_path).replace('\\', '/')
@@ -1,9 +1,19 @@
+from datetime import datetime
+from pathlib import Path
+
+import boto3
 import typer
+from fused import FusedPipeline, RcloneSource, S3MultipartSink
+from load.athena import table_ddl
 from load.s3 import S3Loader
 from src.extract.google import GoogleExtractor
+from extract.delta import DeltaPlanner
+from extract.inventory import INVENTORY_FILE, S3Inventory
 from src.extract.s3 import S3Extractor
 
-from transform.google import DailyUsageDataTransformer, P4HourData2025Transformer, P4QuarterData2024Transformer, P4QuarterData2025Transformer
+from transform.compaction import Compactor
+from transform.google import DailyUsageDataTransformer, P4HourConsumption2025Transformer, P4HourData2025Transformer, P4QuarterData2024Transformer, P4QuarterData2025Transformer
+from metrics import metrics, profiled
 from util import DataType, ETLConfig
 
 from typing_extensions import Annotated
@@ -12,17 +22,75 @@ from typing_extensions import Annotated
 daily_usage_config = ETLConfig(DataType.DAILY_USAGE, 'daily_usage_data', transformer=DailyUsageDataTransformer)
 p4_quarter_2024 = ETLConfig(DataType.P4_QUARTER_2024, 'p4_hour_data_2024', P4QuarterData2024Transformer)
 p4_hour_2025 = ETLConfig(DataType.P4_HOUR_2025, 'p4_hour_data_2025', P4HourData2025Transformer)
+p4_hour_consumption_2025 = ETLConfig(DataType.P4_HOUR_CONSUMPTION_2025, 'p4_hour_data_2025', P4HourConsumption2025Transformer, eligible_steps="TL", source_type=DataType.P4_HOUR_2025)
 p4_quarter_2025 = ETLConfig(DataType.P4_QUARTER_2025, 'p4_hour_data__migration_2025', P4QuarterData2025Transformer)
 household_exceptions = ETLConfig(DataType.HOUSEHOLD_EXCEPTIONS, 'household_exceptions', eligible_steps="L")
 
 BUCKET = 'slimwonen-analysis-data'
 PROFILE = 'SA'
+GCS_SOURCE = 'google:inactive-usage-data/'
 
 
 config = household_exceptions
 
 
-def main(extract: bool = False, transform: bool = False, load: bool = False):
+def main(
+    extract: bool = False,
+    transform: bool = False,
+    load: bool = False,
+    fused: Annotated[bool, typer.Option(help="Stream from Google Cloud Storage through the transformer to S3, without local files")] = False,
+    workers: int = 1,
+    upload_workers: Annotated[int, typer.Option(help="Concurrent S3 uploads when loading")] = 8,
+    resume: bool = True,
+    dry_run: Annotated[bool, typer.Option(help="Only report which files the load step would upload")] = False,
+    inventory: Annotated[bool, typer.Option(help="Cache the S3 listing in a local inventory")] = True,
+    rebuild_inventory: Annotated[bool, typer.Option(help="Rebuild the inventory by a full, sharded listing")] = False,
+    delta: Annotated[bool, typer.Option(help="Copy only the files missing from S3 instead of syncing, which mirrors upstream deletions")] = False,
+    compact: Annotated[int, typer.Option(help="Compact the outputs into objects of this many MB before loading")] = None,
+    partitioning: Annotated[str, typer.Option(help="Partition the outputs into 'date' or 'ymd' (year/month/day) folders")] = None,
+    ddl: Annotated[bool, typer.Option(help="Print the Athena table DDL with partition projection and exit")] = False,
+    profile: Annotated[str, typer.Option(help="Profile the run with 'cprofile' or 'sample'")] = None,
+    report: Annotated[str, typer.Option(help="Path of the JSON run report")] = None,
+):
+    config.upload_workers = upload_workers
+    config.compaction_target_mb = compact
+    config.partitioning = partitioning
+    if ddl:
+        schema = config.transformer(config).output_schema if config.transformer else None
+        if schema is None:
+            print(f"The output schema of data type {config.type} is unknown")
+        else:
+            print(table_ddl(config, schema, BUCKET))
+        return
+
+    report = Path(report or f"reports/run_{config.type.value}_{datetime.now():%Y%m%d_%H%M%S}.json")
+    try:
+        with profiled(profile, report):
+            if fused:
+                run_fused(workers)
+            else:
+                run(extract, transform, load, workers, resume, dry_run, inventory, rebuild_inventory, delta)
+    finally:
+        metrics.write_report(report)
+
+
+def run_fused(concurrency: int):
+    if config.eligible_steps != "ETL":
+        print(f"Fused mode requires all ETL steps to be eligible for data type {config.type}")
+        return
+
+    s3_client = boto3.session.Session(profile_name=PROFILE).client('s3')
+    source = RcloneSource(GCS_SOURCE, include=f'{config.filename_prefix}*')
+    sink = S3MultipartSink(s3_client, BUCKET)
+    try:
+        with metrics.stage("fused"):
+            FusedPipeline(config, source, sink, concurrency).run()
+    finally:
+        sink.shutdown()
+
+
+def run(extract: bool, transform: bool, load: bool, workers: int, resume: bool, dry_run: bool, inventory: bool,
+        rebuild_inventory: bool, delta: bool):
 
     if extract:
         if "E" not in config.eligible_steps:
@@ -34,31 +102,55 @@ def main(extract: bool = False, transform: bool = False, load: bool = False):
             bucket_name=BUCKET,
             config=config,
         )
-        s3.collect_filenames()
-        rclone_filter_file = s3.generate_rclone_filter_list()
-
-        google = GoogleExtractor()
-        google.rclone_sync('google:inactive-usage-data/', config.extraction_folder, rclone_filter_file)
+        if inventory:
+            s3.inventory = S3Inventory(s3.s3_client, INVENTORY_FILE)
+        with metrics.stage("extract"):
+            s3.collect_filenames(rebuild=rebuild_inventory)
+            google = GoogleExtractor()
+
+            if delta:
+                loaded = set(s3.filenames)
+                if config.compaction_target_mb is not None:
+                    # compacted objects are named by month, their sources are in the compaction manifest
+                    loaded |= Compactor(config).compacted_sources()
+                planner = DeltaPlanner(GCS_SOURCE, config.extraction_folder, config.filename_prefix, loaded)
+                plan = planner.plan()
+                plan.report()
+                metrics.count("extract", "planned_files", len(plan.files))
+                metrics.count("extract", "planned_bytes", plan.bytes)
+                if plan.files:
+                    google.rclone_copy(GCS_SOURCE, config.extraction_folder, plan.write(f'{config.type.value}.files.txt'))
+            else:
+                rclone_filter_file = s3.generate_rclone_filter_list()
+                google.rclone_sync(GCS_SOURCE, config.extraction_folder, rclone_filter_file)
 
     if transform:
         if "T" not in config.eligible_steps:
             print(f"Transformation step is not eligible for data type {config.type}")
             return
 
+        config.workers = workers
+        config.resume = resume
         transformer = config.transformer(config)
-        transformer.transform_all()
+        with metrics.stage("transform"):
+            transformer.transform_all()
 
     if load:
         if "L" not in config.eligible_steps:
             print(f"Loading step is not eligible for data type {config.type}")
             return
 
+        if config.compaction_target_mb is not None:
+            with metrics.stage("compact"):
+                Compactor(config).compact_all()
+
         loader = S3Loader(
             aws_profile=PROFILE,
             bucket_name=BUCKET,
             config=config,
         )
-        loader.load_all()
+        with metrics.stage("load"):
+            loader.load_all(dry_run=dry_run)
 
 
 if __name__ == '__main__':
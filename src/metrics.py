@@ -0,0 +1,258 @@
+import cProfile
+import io
+import json
+import platform
+import pstats
+import resource
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+
+@dataclass
+class FileMetrics:
+    name: str
+    records: int = 0
+    bytes: int = 0
+    wall_seconds: float = 0.0
+    cpu_seconds: float | None = None
+    error: str | None = None
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    records: int = 0
+    bytes: int = 0
+    failures: int = 0
+    retries: int = 0
+    rss_start_mb: float | None = None
+    rss_end_mb: float | None = None
+    peak_rss_mb: float | None = None  # highest resident memory sampled during the stage
+    counters: dict[str, int] = field(default_factory=dict)
+    files: list[FileMetrics] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        wall = self.wall_seconds or float("nan")
+        return {
+            "records_per_second": round(self.records / wall, 1),
+            "mb_per_second": round(self.bytes / 1e6 / wall, 2),
+            "file_count": len(self.files),
+        }
+
+
+class Metrics:
+    """Collects timings, volumes and failures of the ETL stages for a run report.
+
+    Extractors, transformers and loaders record into the module level `metrics` instance, so
+    nothing has to be passed around. Stage timing is done by `main.py` with `metrics.stage`.
+    """
+
+    def __init__(self):
+        self.started = datetime.now()
+        self.stages: dict[str, StageMetrics] = {}
+        self._lock = threading.Lock()
+
+    def _stage(self, name: str) -> StageMetrics:
+        if name not in self.stages:
+            self.stages[name] = StageMetrics(name)
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name: str):
+        stage = self._stage(name)
+        wall, cpu = time.perf_counter(), _cpu_time()
+        children_peak = _children_peak_rss_mb()
+        sampler = RssSampler()
+        sampler.start()
+        try:
+            yield stage
+        finally:
+            sampler.stop()
+            stage.wall_seconds += time.perf_counter() - wall
+            stage.cpu_seconds += _cpu_time() - cpu
+            if stage.rss_start_mb is None:
+                stage.rss_start_mb = sampler.start_mb
+            stage.rss_end_mb = sampler.end_mb
+            peak = sampler.peak_mb
+            if _children_peak_rss_mb() > children_peak:
+                # a worker process that finished during this stage used more memory than any before it
+                peak = max(peak or 0.0, _children_peak_rss_mb())
+            if peak is not None:
+                stage.peak_rss_mb = max(stage.peak_rss_mb or 0.0, peak)
+
+    def record_file(self, stage: str, name: str, records: int = 0, bytes: int = 0,
+                    wall_seconds: float = 0.0, cpu_seconds: float | None = None, error: str | None = None):
+        with self._lock:
+            metrics = self._stage(stage)
+            metrics.files.append(FileMetrics(name, records, bytes, round(wall_seconds, 4), cpu_seconds, error))
+            metrics.records += records
+            metrics.bytes += bytes
+            if error is not None:
+                metrics.failures += 1
+
+    def record_retry(self, stage: str):
+        with self._lock:
+            self._stage(stage).retries += 1
+
+    def record_failure(self, stage: str):
+        with self._lock:
+            self._stage(stage).failures += 1
+
+    def count(self, stage: str, counter: str, value: int = 1):
+        with self._lock:
+            counters = self._stage(stage).counters
+            counters[counter] = counters.get(counter, 0) + value
+
+    def report(self) -> dict:
+        return {
+            "started": self.started.isoformat(timespec="seconds"),
+            "finished": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": {name: asdict(stage) | stage.summary() for name, stage in self.stages.items()},
+        }
+
+    def write_report(self, path: str | Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.report(), indent=2))
+        print(f"Run report saved to {path}")
+
+
+def _cpu_time() -> float:
+    """CPU time of this process and of its finished children, like transformer workers"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def current_rss_mb() -> float | None:
+    """Resident memory of this process now in MB, None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * resource.getpagesize() / 2 ** 20, 1)
+    except OSError:
+        return None
+
+
+def _children_peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+
+
+class RssSampler:
+    """Samples the resident memory of this process in a thread, to find the peak of one stage.
+
+    ru_maxrss cannot be used for that, it is the peak of the whole process so far.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.start_mb = self.end_mb = self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> float | None:
+        rss = current_rss_mb()
+        if rss is not None:
+            self.peak_mb = max(self.peak_mb or 0.0, rss)
+        return rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self.start_mb = self._sample()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.end_mb = self._sample()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process or its largest child in MB, ru_maxrss is in KB on Linux"""
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return round(peak / 1024, 1)
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads at a fixed interval, with little overhead.
+
+    The result is written in the collapsed stack format read by flamegraph.pl and speedscope.
+    Worker processes are not sampled.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = ";".join(
+                    f"{summary.name} ({Path(summary.filename).name}:{summary.lineno})"
+                    for summary in traceback.extract_stack(frame)
+                )
+                self.samples[stack] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, output: Path):
+        self._stop.set()
+        self._thread.join()
+        with open(output, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        print(f"Sampled {sum(self.samples.values())} stacks, saved to {output}")
+
+
+@contextmanager
+def profiled(profiler: str | None, output: Path):
+    """Run the block under cProfile or the sampling profiler, `profiler` None disables profiling"""
+    match profiler:
+        case None:
+            yield
+        case "cprofile":
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                profile.dump_stats(output.with_suffix(".prof"))
+                summary = io.StringIO()
+                pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(25)
+                print(summary.getvalue())
+                print(f"Profile saved to {output.with_suffix('.prof')}")
+        case "sample":
+            sampler = SamplingProfiler()
+            sampler.start()
+            try:
+                yield
+            finally:
+                sampler.stop(output.with_suffix(".stacks.txt"))
+        case _:
+            raise ValueError(f"Unknown profiler {profiler}, choose cprofile or sample")
+
+
+metrics = Metrics()
@@ -0,0 +1,28 @@
+import re
+
+PARTITION_KEY = "date"  # record field the partitions are derived from
+DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# Partition columns and their Athena types per partitioning
+PARTITION_COLUMNS = {
+    "date": {"date": "string"},
+    "ymd": {"year": "int", "month": "int", "day": "int"},
+}
+
+_DATE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+
+
+def validate_partitioning(partitioning: str | None):
+    if partitioning is not None and partitioning not in PARTITION_COLUMNS:
+        raise ValueError(f"Unknown partitioning {partitioning}, choose from {', '.join(PARTITION_COLUMNS)}")
+
+
+def partition_folder(value, partitioning: str) -> str:
+    """Hive-style folder of the partition of a record date, records without a valid date end up in the default partition"""
+    if partitioning == "date":
+        return f"date={value or DEFAULT_PARTITION}"
+
+    match = _DATE.match(str(value)) if value else None
+    if match is None:
+        return "/".join(f"{column}={DEFAULT_PARTITION}" for column in PARTITION_COLUMNS[partitioning])
+    return "/".join(f"{column}={part}" for column, part in zip(PARTITION_COLUMNS[partitioning], match.groups()))
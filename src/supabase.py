@@ -1,13 +1,178 @@
+import os
+import tempfile
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date
+from typing import IO, Iterator
+
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import Dialect, Engine, create_engine, text
 
 from settings import SupabaseSettings
 
+CHUNK_SIZE = 50_000
+# COPY output is buffered in memory up to this size before it spills to a temporary file
+SPOOL_SIZE = 64 * 1024 * 1024
+
+DAILY_USAGE_SQL = (
+    "SELECT household_id, household_activation_code as activation_code, date, type, usage "
+    "FROM public.daily_usage_data"
+)
+DAILY_USAGE_DTYPES = {
+    "household_id": "string",
+    "activation_code": "string",
+    "date": "string",
+    "type": "string",
+    "usage": "float64",
+}
+HOUSEHOLD_SQL = """
+    SELECT
+        ph.id, ph.activation_code, ph.account_status, ph.client_id, c.title as client_title, cg.name as client_group,
+        ph.date_of_activation, ph.gas_ean, ph.electricity_ean,
+        phd.build_year, phd.square_meters, phd.house_type, phd.heating_type, phd.gas_connection,
+        phd.gas_or_induction, phd.water_heating_type, phd.resident_count,
+        hd.zipcode, hd.house_number, hd.house_number_addition, hd.housing_corporation
+    FROM public.households ph
+    LEFT JOIN public.clients c ON c.id = ph.client_id
+    LEFT JOIN public.household_house_details phd ON phd.household_id = ph.id
+    LEFT JOIN public.household_details hd ON hd.household_id = ph.id
+    LEFT JOIN public.client_groups cg ON cg.id = ph.client_group_id
+"""
+# Tables joined into the household data, a change to any of them changes the household
+HOUSEHOLD_TABLES = {
+    "ph": "public.households",
+    "c": "public.clients",
+    "phd": "public.household_house_details",
+    "hd": "public.household_details",
+    "cg": "public.client_groups",
+}
+# Numeric columns are nullable, so they are read as floats like pd.read_sql does. Other columns
+# are text, identifiers such as EANs and activation codes must not be parsed as numbers.
+HOUSEHOLD_DTYPES = {
+    "build_year": "float64",
+    "square_meters": "float64",
+    "resident_count": "float64",
+    "house_number": "float64",
+    "gas_connection": "boolean",
+}
+
+
+def copy_sql(query: str, params: dict | None, dialect: Dialect) -> str:
+    """The query with its parameters rendered as literals, COPY does not accept bind parameters"""
+    statement = text(query).bindparams(**(params or {}))
+    return str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+
+def read_copy_csv(f: IO[bytes], dtypes: dict[str, str], parse_dates: list[str] | None = None,
+                  chunksize: int | None = None) -> pd.DataFrame | Iterator[pd.DataFrame]:
+    """
+    Parse CSV COPY output, columns without an explicit type are strings and only empty fields are missing.
+    :param chunksize: Yield DataFrames of at most this many rows instead of returning one.
+    """
+    reader = pd.read_csv(
+        f,
+        dtype=defaultdict(lambda: "string", dtypes | {column: "object" for column in parse_dates or []}),
+        true_values=["t"],
+        false_values=["f"],
+        keep_default_na=False,
+        na_values=[""],
+        chunksize=chunksize,
+    )
+    if chunksize is None:
+        return _parse_dates(reader, parse_dates)
+    return (_parse_dates(chunk, parse_dates) for chunk in reader)
+
+
+def _parse_dates(df: pd.DataFrame, parse_dates: list[str] | None) -> pd.DataFrame:
+    for column in parse_dates or []:
+        df[column] = pd.to_datetime(df[column], format="ISO8601")
+    return df
+
 
 class SupabaseClient:
-    def __init__(self, settings: SupabaseSettings):
-        self.url = f"postgresql://postgres:{settings.pwd}@{settings.url}:5432/postgres"
-        self.engine = create_engine(self.url)
+    def __init__(self, settings: SupabaseSettings | None, engine: Engine | None = None, pool_size: int = 8):
+        """
+        :param engine: Engine to use instead of connecting to Supabase, for example a local database in tests.
+        :param pool_size: Number of pooled connections, concurrent extractions share the pool.
+        """
+        if engine is None:
+            self.url = f"postgresql://postgres:{settings.pwd}@{settings.url}:5432/postgres"
+            engine = create_engine(self.url, pool_size=pool_size, max_overflow=0, pool_pre_ping=True)
+        self.engine = engine
+
+    @property
+    def supports_copy(self) -> bool:
+        return self.engine.dialect.name == "postgresql"
+
+    def export(self, query: str, f: IO[bytes], format: str = "csv", params: dict | None = None):
+        """
+        Stream the result of a query into a binary file with `COPY (query) TO STDOUT`.
+        Other databases than Postgres fall back to pd.read_sql, for CSV only.
+        :param format: 'csv' (with header) or 'binary', the Postgres binary COPY format.
+        :param params: Values for the `:name` parameters in the query.
+        """
+        if format not in ("csv", "binary"):
+            raise ValueError(f"Unknown export format {format}, choose csv or binary")
+
+        if not self.supports_copy:
+            if format == "binary":
+                raise ValueError(f"Binary export requires Postgres, not {self.engine.dialect.name}")
+            pd.read_sql(text(query), self.engine, params=params).to_csv(f, index=False)
+            return
+
+        options = "FORMAT csv, HEADER true" if format == "csv" else "FORMAT binary"
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.copy_expert(f"COPY ({copy_sql(query, params, self.engine.dialect)}) TO STDOUT WITH ({options})", f)
+        finally:
+            connection.close()
+
+    @contextmanager
+    def export_stream(self, query: str, params: dict | None = None) -> Iterator[IO[bytes]]:
+        """
+        CSV export of a query as a stream to read from while the export is running. COPY writes
+        into a pipe from a thread, so at most the pipe and read buffers are held in memory.
+        """
+        read_fd, write_fd = os.pipe()
+        errors = []
+
+        def copy():
+            try:
+                with open(write_fd, "wb") as f:
+                    self.export(query, f, "csv", params)
+            except BaseException as e:  # reported by the reading side
+                errors.append(e)
+
+        thread = threading.Thread(target=copy, daemon=True)
+        with open(read_fd, "rb") as f:
+            thread.start()
+            try:
+                yield f
+            finally:
+                f.close()  # a reader that stops early breaks the pipe, which ends the export
+                thread.join()
+        if errors:
+            raise errors[0]
+
+    def export_dataframe(self, query: str, dtypes: dict[str, str] | None = None, parse_dates: list[str] | None = None,
+                         params: dict | None = None) -> pd.DataFrame:
+        """
+        Fetch the result of a query as a DataFrame through a CSV COPY, which is much faster than pd.read_sql.
+        :param dtypes: Explicit column types, other columns are read as strings.
+        :param parse_dates: Columns to parse as datetimes.
+        """
+        dtypes = dtypes or {}
+        if not self.supports_copy:
+            df = pd.read_sql(text(query), self.engine, params=params, parse_dates=parse_dates)
+            text_columns = [column for column in df.columns if column not in dtypes and column not in (parse_dates or [])]
+            return df.astype(dtypes | {column: "string" for column in text_columns})
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as buffer:
+            self.export(query, buffer, "csv", params)
+            buffer.seek(0)
+            return read_copy_csv(buffer, dtypes, parse_dates)
 
     def get_daily_usage_data_for_date(self, date: str) -> pd.DataFrame:
         """
@@ -15,25 +180,53 @@ class SupabaseClient:
         :param date: Date in 'YYYY-MM-DD' format.
         :return: List of daily usage records.
         """
-        sql = f"SELECT household_id, household_activation_code as activation_code, date, type, usage FROM public.daily_usage_data WHERE date = '{date}'"
-        return pd.read_sql(sql, self.engine)
+        return self.export_dataframe(f"{DAILY_USAGE_SQL} WHERE date = :date", DAILY_USAGE_DTYPES, params={"date": date})
+
+    def iter_daily_usage_data(self, start: date, end: date, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        """
+        Stream daily usage data from `start` up to but not including `end`, ordered by date.
+        On Postgres the rows are exported with COPY and parsed in chunks while they arrive,
+        otherwise they are fetched through a server-side cursor, so only one chunk is held in memory.
+        :return: DataFrames of at most `chunk_size` records.
+        """
+        sql = f"{DAILY_USAGE_SQL} WHERE date >= :start AND date < :end ORDER BY date"
+        params = {"start": start.isoformat(), "end": end.isoformat()}
+
+        if self.supports_copy:
+            with self.export_stream(sql, params) as f:
+                yield from read_copy_csv(f, DAILY_USAGE_DTYPES, chunksize=chunk_size)
+            return
 
-    def get_household_data(self) -> pd.DataFrame:
+        with self.engine.connect().execution_options(stream_results=True, yield_per=chunk_size) as connection:
+            yield from pd.read_sql(text(sql), connection, params=params, chunksize=chunk_size)
+
+    def get_household_data(self, changed_since: str | None = None) -> pd.DataFrame:
         """
         Fetch household data.
+        :param changed_since: Only fetch households of which a joined row was updated after this timestamp.
         :return: DataFrame containing household records.
         """
-        sql = """
-        SELECT 
-            ph.id, ph.activation_code, ph.account_status, ph.client_id, c.title as client_title, cg.name as client_group, 
-            ph.date_of_activation, ph.gas_ean, ph.electricity_ean, 
-            phd.build_year, phd.square_meters, phd.house_type, phd.heating_type, phd.gas_connection, 
-            phd.gas_or_induction, phd.water_heating_type, phd.resident_count,
-            hd.zipcode, hd.house_number, hd.house_number_addition, hd.housing_corporation
-        FROM public.households ph 
-        LEFT JOIN public.clients c ON c.id = ph.client_id
-        LEFT JOIN public.household_house_details phd ON phd.household_id = ph.id 
-        LEFT JOIN public.household_details hd ON hd.household_id = ph.id 
-        LEFT JOIN public.client_groups cg ON cg.id = ph.client_group_id
-        """
-        return pd.read_sql(sql, self.engine)
+        if changed_since is None:
+            return self.export_dataframe(HOUSEHOLD_SQL, HOUSEHOLD_DTYPES, parse_dates=["date_of_activation"])
+
+        changed = " OR ".join(f"{alias}.updated_at > :since" for alias in HOUSEHOLD_TABLES)
+        return self.export_dataframe(
+            f"{HOUSEHOLD_SQL} WHERE {changed}", HOUSEHOLD_DTYPES, parse_dates=["date_of_activation"],
+            params={"since": changed_since},
+        )
+
+    def get_household_ids(self) -> set[str]:
+        with self.engine.connect() as connection:
+            return {str(row[0]) for row in connection.execute(text("SELECT id FROM public.households"))}
+
+    def get_household_watermark(self) -> str | None:
+        """
+        The latest update of any row joined into the household data.
+        :return: Timestamp as string, None when no row has an update time.
+        """
+        union = " UNION ALL ".join(f"SELECT MAX(updated_at) AS updated_at FROM {table}" for table in HOUSEHOLD_TABLES.values())
+        with self.engine.connect() as connection:
+            watermark = connection.execute(text(f"SELECT MAX(updated_at) FROM ({union}) AS updates")).scalar()
+        if watermark is None:
+            return None
+        return watermark.isoformat() if hasattr(watermark, "isoformat") else str(watermark)
@@ -1,47 +1,212 @@
-import json
+import io
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from itertools import batched
+from pathlib import Path
+from typing import IO, Iterable, Iterator
 from uuid import UUID
 
 from tqdm import tqdm
 
+from compression import codec_for, decompress, strip_suffix
+from jsoncodec import get_codec
+from metrics import metrics
+from transform.manifest import HashingReader, Manifest, sha256_file
+from transform.reader import iter_records
+from transform.writer import WriteResult, get_writer
 from util import ETLConfig
 
 
+@dataclass
+class FileResult:
+    filename: str
+    worker: int
+    records: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    sha256: str | None = None
+    outputs: dict[str, dict] = field(default_factory=dict)
+    error: str | None = None
+
+
 class Transformer:
+    # Column names and Athena types of the transformed records, used for typed output formats
+    output_schema: dict[str, str] | None = None
 
     def __init__(self, config: ETLConfig):
         self.config = config
         self.config.transformation_folder.mkdir(parents=True, exist_ok=True)
+        self.codec = get_codec(config.json_codec)
+        self.writer = get_writer(config, self.output_schema)
+
+    @property
+    def output_kind(self) -> str:
+        """Output format and compression, outputs of a different kind are not reused by a resumed run"""
+        if self.config.output_compression is None:
+            return self.config.output_format
+        return f"{self.config.output_format}+{self.config.output_compression}"
 
     def applies(self, filename: str) -> bool:
         return filename.startswith(self.config.filename_prefix)
 
-    def transform(self, filename: str) -> list[dict]:
-        records = json.load(open(filename, "r"))
-        return [self._transform(record) for record in records]
-    
-    def transform_all(self):
+    def transform(self, filename: str | IO[str]) -> list[dict]:
+        if isinstance(filename, (str, Path)):
+            with open(filename, "r") as f:
+                return self.transform(f)
+        records = self.codec.load(filename)
+        return self._transform_batch(records)
+
+    def iter_transform(self, filename: str | IO[str]) -> Iterator[dict]:
+        """Parse and transform records in batches, without loading the whole file"""
+        for batch in batched(iter_records(filename, codec=self.codec), self.config.batch_size):
+            yield from self._transform_batch(list(batch))
+
+    def transform_file(self, file: Path) -> FileResult:
+        """Transform and store a single file, returning its throughput and checksums"""
+        start, cpu = time.perf_counter(), time.process_time()
+        with open(file, "rb") as raw:
+            source = HashingReader(raw)
+            text = io.TextIOWrapper(decompress(io.BufferedReader(source), codec_for(file.name)))
+            if self.config.streaming:
+                transformed = self.iter_transform(text)
+            else:
+                transformed = self.transform(text)
+            written = self.store(transformed, strip_suffix(file.name))
+            sha256 = source.hexdigest()
+
+        outputs = {
+            str(output.relative_to(self.config.transformation_folder)): {
+                "size": output.stat().st_size,
+                "sha256": sha256_file(output),
+            }
+            for output in written.outputs
+        }
+        return FileResult(
+            filename=file.name,
+            worker=os.getpid(),
+            records=written.records,
+            bytes=file.stat().st_size,
+            seconds=time.perf_counter() - start,
+            cpu_seconds=time.process_time() - cpu,
+            sha256=sha256,
+            outputs=outputs,
+        )
+
+    def transform_all(self) -> list[FileResult]:
         print(f'Transforming files in {self.config.extraction_folder}')
-        for file in tqdm(self.config.extraction_folder.iterdir(), desc="Transforming"):
+        for tmp_file in self.config.transformation_folder.rglob('.*.tmp'):
+            tmp_file.unlink()  # left behind by an interrupted run
+
+        manifest = Manifest(self.config.manifest_file)
+        files = []
+        skipped = 0
+        for file in self.config.extraction_folder.iterdir():
             if file.is_file():
                 if not self.applies(file.name):
                     print(f'[ERROR] Transformer is not fit for {file}')
                     continue
-                transformed = self.transform(file)
-                self.store(transformed, file.name)
-    
-    def store(self, records: list[dict], filename: str) -> None:
-        output_path = self.config.transformation_folder / filename
-        with open(output_path, 'w') as f:
-            for record in records:
-                f.write(json.dumps(record) + '\n')
+                if self.config.resume and manifest.is_complete(
+                    file, self.config.transformation_folder, self.output_kind
+                ):
+                    skipped += 1
+                    continue
+                for output in manifest.outputs(file):
+                    # outputs of an earlier version of this file, they may not all be rewritten
+                    (self.config.transformation_folder / output).unlink(missing_ok=True)
+                files.append(file)
+
+        if skipped:
+            print(f'Skipping {skipped} files that were already transformed')
+
+        if self.config.workers > 1:
+            return self._transform_parallel(files, manifest)
+
+        results = []
+        for file in tqdm(files, desc="Transforming"):
+            result = self.transform_file(file)
+            manifest.record(file, result.sha256, result.outputs, self.output_kind)
+            self._record_metrics(result)
+            results.append(result)
+        return results
+
+    def _transform_parallel(self, files: list[Path], manifest: Manifest) -> list[FileResult]:
+        print(f'Transforming {len(files)} files with {self.config.workers} workers')
+        results = []
+        with ProcessPoolExecutor(max_workers=self.config.workers) as executor:
+            futures = {executor.submit(_transform_file_safe, self, file): file for file in files}
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Transforming"):
+                result = future.result()
+                if result.error is not None:
+                    tqdm.write(f'[ERROR] Failed to transform {result.filename}: {result.error}')
+                else:
+                    manifest.record(futures[future], result.sha256, result.outputs, self.output_kind)
+                self._record_metrics(result)
+                results.append(result)
+
+        self._report(results)
+        return results
+
+    @staticmethod
+    def _record_metrics(result: FileResult):
+        metrics.record_file(
+            "transform",
+            result.filename,
+            records=result.records,
+            bytes=result.bytes,
+            wall_seconds=result.seconds,
+            cpu_seconds=result.cpu_seconds,
+            error=result.error,
+        )
+
+    @staticmethod
+    def _report(results: list[FileResult]):
+        per_worker = defaultdict(list)
+        for result in results:
+            if result.error is None:
+                per_worker[result.worker].append(result)
+
+        print(f'\nTransformation complete!')
+        for worker, worker_results in sorted(per_worker.items()):
+            seconds = sum(r.seconds for r in worker_results) or float('nan')
+            records = sum(r.records for r in worker_results)
+            megabytes = sum(r.bytes for r in worker_results) / 1e6
+            print(
+                f'Worker {worker}: {len(worker_results)} files, {records} records, '
+                f'{records / seconds:.0f} records/s, {megabytes / seconds:.1f} MB/s'
+            )
+
+        failed = [r.filename for r in results if r.error is not None]
+        if failed:
+            print(f'Failed: {len(failed)} files')
+            for filename in failed:
+                print(f'\t{filename}')
+
+    def store(self, records: Iterable[dict], filename: str) -> WriteResult:
+        return self.writer.write(records, filename)
 
     def _transform(self, record: dict) -> dict:
         raise NotImplementedError
 
+    def _transform_batch(self, records: list[dict]) -> list[dict]:
+        """Transform a chunk of records, subclasses may override this with a columnar implementation"""
+        return [self._transform(record) for record in records]
+
     @staticmethod
     def is_valid_uuid(uuid_to_test):
         try:
             uuid_obj = UUID(uuid_to_test)
         except ValueError:
             return False
-        return str(uuid_obj) == uuid_to_test
\ No newline at end of file
+        return str(uuid_obj) == uuid_to_test
+
+
+def _transform_file_safe(transformer: Transformer, file: Path) -> FileResult:
+    """Process pool entry point, a failing file is reported instead of raised"""
+    try:
+        return transformer.transform_file(file)
+    except Exception as e:
+        return FileResult(filename=file.name, worker=os.getpid(), error=repr(e))
@@ -0,0 +1,179 @@
+import json
+import os
+import re
+import shutil
+from collections import defaultdict
+from pathlib import Path, PurePosixPath
+
+from tqdm import tqdm
+
+from compression import SUFFIXES, codec_for, strip_suffix
+from transform.manifest import temporary_path
+from util import ETLConfig
+
+MB = 1024 * 1024
+_DATE = re.compile(r"(\d{4})-(\d{2})-\d{2}")
+
+
+class Compactor:
+    """Merges the many small transformation outputs into objects of about `config.compaction_target_mb`.
+
+    Outputs are grouped by folder (partition), month of the date in their name and file kind, and
+    each group is split into objects of the target size in name order. JSON lines outputs are
+    concatenated byte for byte, which is valid for gzip members and zstd frames as well, so they
+    are never decompressed. Parquet outputs are copied row group by row group.
+
+    The compaction manifest maps every compacted object to the outputs it holds, with their size
+    and mtime. A rerun only rewrites the objects whose outputs changed, and removes compacted
+    objects that are no longer planned; the loader then deletes them from S3 as well.
+    """
+
+    def __init__(self, config: ETLConfig):
+        self.config = config
+        self.target_bytes = (config.compaction_target_mb or 256) * MB
+        self.manifest_file = config.compaction_manifest_file
+        self.manifest: dict[str, dict] = {}
+        if self.manifest_file.exists():
+            self.manifest = json.loads(self.manifest_file.read_text())
+
+    def _inputs(self) -> list[Path]:
+        return sorted(
+            f for f in self.config.transformation_folder.rglob('*')
+            if f.is_file() and not f.name.endswith('.tmp')
+        )
+
+    def plan(self) -> dict[str, list[Path]]:
+        """Relative path of every compacted object with the outputs it is made of"""
+        groups = defaultdict(list)
+        for file in self._inputs():
+            relative = PurePosixPath(file.relative_to(self.config.transformation_folder).as_posix())
+            date = _DATE.search(str(relative))
+            month = f"{date[1]}-{date[2]}" if date else "undated"
+            groups[(str(relative.parent), month, self._extension(file.name))].append(file)
+
+        plan = {}
+        for (parent, month, extension), files in sorted(groups.items()):
+            chunks, size = [[]], 0
+            for file in files:
+                file_size = file.stat().st_size
+                if chunks[-1] and size + file_size > self.target_bytes:
+                    chunks.append([])
+                    size = 0
+                chunks[-1].append(file)
+                size += file_size
+            for i, chunk in enumerate(chunks):
+                name = f"{self.config.type.value}_{month}_{i:04d}{extension}"
+                plan[str(PurePosixPath(parent) / name)] = chunk
+        return plan
+
+    @staticmethod
+    def _extension(filename: str) -> str:
+        if strip_suffix(filename).endswith('.parquet'):
+            return '.parquet'
+        codec = codec_for(filename)
+        return '.json' + (SUFFIXES[codec] if codec else '')
+
+    def _sources(self, files: list[Path]) -> list[list]:
+        return [
+            [file.relative_to(self.config.transformation_folder).as_posix(), file.stat().st_size, file.stat().st_mtime]
+            for file in files
+        ]
+
+    def _is_current(self, output: str, files: list[Path]) -> bool:
+        entry = self.manifest.get(output)
+        path = self.config.compacted_folder / output
+        return (
+            entry is not None
+            and entry['sources'] == self._sources(files)
+            and path.is_file()
+            and path.stat().st_size == entry['size']
+        )
+
+    def compact_all(self) -> list[Path]:
+        """Write the compacted objects that are missing or out of date, returns the written paths"""
+        print(f'Compacting files in {self.config.transformation_folder} into {self.config.compacted_folder}')
+        plan = self.plan()
+
+        for output in set(self.manifest) - set(plan):
+            (self.config.compacted_folder / output).unlink(missing_ok=True)
+            del self.manifest[output]
+        self._save_manifest()
+
+        todo = {output: files for output, files in plan.items() if not self._is_current(output, files)}
+        print(f'{len(plan)} compacted objects planned, {len(plan) - len(todo)} up to date')
+
+        written = []
+        for output, files in tqdm(todo.items(), desc='Compacting'):
+            path = self.config.compacted_folder / output
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = temporary_path(path)
+            if output.endswith('.parquet'):
+                self._merge_parquet(files, tmp_path)
+            else:
+                self._concatenate(files, tmp_path)
+            os.replace(tmp_path, path)
+
+            self.manifest[output] = {'sources': self._sources(files), 'size': path.stat().st_size}
+            self._save_manifest()
+            written.append(path)
+        return written
+
+    @staticmethod
+    def _concatenate(files: list[Path], tmp_path: Path):
+        with open(tmp_path, 'wb') as out:
+            for file in files:
+                with open(file, 'rb') as f:
+                    shutil.copyfileobj(f, out, 1 << 20)
+                if codec_for(file.name) is None and file.stat().st_size and not _ends_with_newline(file):
+                    out.write(b'\n')
+
+    def _merge_parquet(self, files: list[Path], tmp_path: Path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer, buffer, rows = None, [], 0
+        try:
+            for file in files:
+                parquet_file = pq.ParquetFile(file)
+                for i in range(parquet_file.num_row_groups):
+                    table = parquet_file.read_row_group(i)
+                    buffer.append(table)
+                    rows += table.num_rows
+                    if rows >= self.config.row_group_size:
+                        # small row groups of the outputs are combined into full sized ones
+                        writer = self._write_row_group(pa.concat_tables(buffer), writer, tmp_path)
+                        buffer, rows = [], 0
+            if buffer or writer is None:
+                tables = buffer or [pq.ParquetFile(files[0]).schema_arrow.empty_table()]
+                writer = self._write_row_group(pa.concat_tables(tables), writer, tmp_path)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def _write_row_group(self, table, writer, tmp_path: Path):
+        import pyarrow.parquet as pq
+
+        if writer is None:
+            writer = pq.ParquetWriter(str(tmp_path), table.schema, compression=self.config.parquet_compression)
+        writer.write_table(table, row_group_size=self.config.row_group_size)
+        return writer
+
+    def _save_manifest(self):
+        tmp_path = temporary_path(self.manifest_file)
+        tmp_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(json.dumps(self.manifest, indent=1))
+        os.replace(tmp_path, self.manifest_file)
+
+    def compacted_sources(self) -> set[str]:
+        """Names of the outputs in the compacted objects, which are named after their source files"""
+        return {
+            PurePosixPath(source).name
+            for entry in self.manifest.values()
+            for source, _, _ in entry['sources']
+        }
+
+
+def _ends_with_newline(file: Path) -> bool:
+    with open(file, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
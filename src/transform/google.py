@@ -1,19 +1,97 @@
 from datetime import datetime
 
+import numpy as np
+
 from transform.base import Transformer
+from transform.hourly import HOURS, flagged_hours, hourly_consumption, readings_from_records, to_nullable
+from transform.mapping import Field, MappedTransformer
+from transform.vectorized import column, split_iso_datetimes, struct_field, struct_field_where, to_records, valid_uuids
+
+
+class P4HourData2025Transformer(MappedTransformer):
+    fields = [
+        Field("date", source="query_date", type="string"),
+        Field("type", type="string"),
+        Field("meter_ean", type="string"),
+    ] + [Field(f"measurement_h_{i}", type="double") for i in range(25)]
+
+
+class P4HourConsumption2025Transformer(P4HourData2025Transformer):
+    """Turns the cumulative hourly readings into 24 hourly consumption values per meter-day.
+
+    The wide layout writes one record per meter-day with `consumption_h_0` to `consumption_h_23`
+    and the flagged hours, the long layout writes one record per meter-hour.
+    """
+    layout = "wide"
+    decimals = 3
+    output_schema = {
+        "date": "string",
+        "type": "string",
+        "meter_ean": "string",
+    } | {f"consumption_h_{i}": "double" for i in range(HOURS)} | {
+        "negative_hours": "array<int>",
+        "reset_hours": "array<int>",
+        "missing_hours": "array<int>",
+    }
 
+    def _transform(self, record: dict) -> dict:
+        return self._transform_batch([record])[0]
 
-class P4HourData2025Transformer(Transformer):
+    def _transform_batch(self, records: list[dict]) -> list[dict]:
+        if not records:
+            return []
 
-    def _transform(self, record: dict) -> dict:
-        return {
-            "date": record.get("query_date"),
-            "type": record.get("type"),
-            "meter_ean": record.get("meter_ean"),
-        } | {f"measurement_h_{i}": record.get(f"measurement_h_{i}") for i in range(25)}
+        consumption = hourly_consumption(readings_from_records(records))
+        keys = {
+            "date": column(records, "query_date"),
+            "type": column(records, "type"),
+            "meter_ean": column(records, "meter_ean"),
+        }
+        deltas = to_nullable(consumption.deltas, self.decimals)
+
+        if self.layout == "long":
+            return to_records(
+                {key: np.repeat(values, HOURS) for key, values in keys.items()} | {
+                    "hour": np.tile(np.arange(HOURS), len(records)),
+                    "consumption": deltas.ravel(),
+                    "flag": consumption.flags.ravel(),
+                }
+            )
+
+        return to_records(
+            keys
+            | {f"consumption_h_{i}": deltas[:, i] for i in range(HOURS)}
+            | {
+                "negative_hours": flagged_hours(consumption.negative),
+                "reset_hours": flagged_hours(consumption.reset),
+                "missing_hours": flagged_hours(consumption.missing),
+            }
+        )
+
+
+class P4HourConsumptionLong2025Transformer(P4HourConsumption2025Transformer):
+    layout = "long"
+    output_schema = {
+        "date": "string",
+        "type": "string",
+        "meter_ean": "string",
+        "hour": "int",
+        "consumption": "double",
+        "flag": "string",
+    }
 
 
 class P4QuarterData2024Transformer(Transformer):
+    output_schema = {
+        "household_id": "string",
+        "house_id": "string",
+        "datetime": "string",
+        "date": "string",
+        "time": "string",
+        "backfeed": "double",
+        "electricity": "double",
+        "gas": "double",
+    }
 
     def _transform(self, record: dict) -> dict:
         if "datetime" not in record:
@@ -44,8 +122,37 @@ class P4QuarterData2024Transformer(Transformer):
             else None,
         }
 
+    def _transform_batch(self, records: list[dict]) -> list[dict]:
+        if not all("datetime" in record for record in records):
+            return super()._transform_batch(records)
+
+        datetimes = column(records, "datetime")
+        dates, times = split_iso_datetimes(datetimes)
+        houseids = np.fromiter((record["houseID"] for record in records), dtype=object, count=len(records))
+        valid = valid_uuids(houseids, Transformer.is_valid_uuid)
+
+        return to_records({
+            "household_id": np.where(valid, houseids, None),
+            "house_id": np.where(valid, None, houseids),
+            "datetime": datetimes,
+            "date": dates,
+            "time": times,
+            "backfeed": struct_field(records, "backfeedMeasurement", "meter"),
+            "electricity": struct_field(records, "electricityMeasurement", "meter"),
+            "gas": struct_field(records, "gasMeasurement", "meter"),
+        })
+
 
 class P4QuarterData2025Transformer(Transformer):
+    output_schema = {
+        "household_id": "string",
+        "datetime": "string",
+        "date": "string",
+        "time": "string",
+        "backfeed": "double",
+        "electricity": "double",
+        "gas": "double",
+    }
 
     def _transform(self, record: dict) -> dict:
         if "datetime" not in record:
@@ -68,6 +175,36 @@ class P4QuarterData2025Transformer(Transformer):
             "gas": gas,
         }
 
+    def _transform_batch(self, records: list[dict]) -> list[dict]:
+        if not all("datetime" in record for record in records):
+            return super()._transform_batch(records)
+
+        datetimes = column(records, "datetime")
+        dates, times = split_iso_datetimes(datetimes)
+        houseids = column(records, "houseID")
+        assert valid_uuids(houseids, self.is_valid_uuid).all()
+
+        backfeed = struct_field(records, "backfeedMeasurement", "meter")
+        measurements = column(records, "electricityMeasurement")
+        present = np.fromiter((m is not None for m in measurements), dtype=bool, count=len(measurements))
+        units = struct_field_where(measurements, present, "unit")
+        is_electricity = present & (units == "WH")
+        is_gas = present & (units == "MTQ")
+        unknown = present & ~is_electricity & ~is_gas
+        if unknown.any():
+            raise RuntimeError(f"Unknown unit for electricityMeasurement: {units[unknown][0]}")
+        meters = struct_field_where(measurements, present, "meter")
+
+        return to_records({
+            "household_id": houseids,
+            "datetime": datetimes,
+            "date": dates,
+            "time": times,
+            "backfeed": np.where(is_gas, None, backfeed),
+            "electricity": np.where(is_electricity, meters, None),
+            "gas": np.where(is_gas, meters, None),
+        })
+
     @staticmethod
     def _parse_measurements(record: dict) -> tuple:
         backfeed = record["backfeedMeasurement"]["meter"] if "backfeedMeasurement" in record else None
@@ -85,13 +222,11 @@ class P4QuarterData2025Transformer(Transformer):
                 raise RuntimeError(f"Unknown unit for electricityMeasurement: {electricity['unit']}")
 
 
-class DailyUsageDataTransformer(Transformer):
-
-    def _transform(self, record: dict) -> dict:
-        return {
-            "household_id": record["household_id"],
-            "activation_code": record["household_activation_code"],
-            "date": record["date"],
-            "type": record["type"],
-            "usage": record["usage"],
-        }
+class DailyUsageDataTransformer(MappedTransformer):
+    fields = [
+        Field("household_id", type="string", required=True),
+        Field("activation_code", source="household_activation_code", type="string", required=True),
+        Field("date", type="string", required=True),
+        Field("type", type="string", required=True),
+        Field("usage", type="double", required=True),
+    ]
@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from operator import itemgetter
+
+import numpy as np
+
+HOURS = 24
+READINGS = [f"measurement_h_{i}" for i in range(HOURS + 1)]
+
+NEGATIVE = "negative"
+RESET = "reset"
+MISSING = "missing"
+
+
+@dataclass
+class HourlyConsumption:
+    """Consumption per hour for a set of meter-days, all arrays have shape (meter-days, 24)"""
+    deltas: np.ndarray
+    negative: np.ndarray
+    reset: np.ndarray
+    missing: np.ndarray
+
+    @property
+    def flags(self) -> np.ndarray:
+        """Flag per hour as a string, None when the hour is fine"""
+        flags = np.full(self.deltas.shape, None, dtype=object)
+        flags[self.negative] = NEGATIVE
+        flags[self.reset] = RESET
+        flags[self.missing] = MISSING
+        return flags
+
+
+def hourly_consumption(readings: np.ndarray, reset_ratio: float = 0.5) -> HourlyConsumption:
+    """Derive hourly consumption from the 25 cumulative meter readings of each meter-day.
+
+    The consumption of a reset hour is unknown and NaN, the drop of the reading is not consumption.
+
+    :param readings: array of shape (meter-days, 25), missing readings are NaN.
+    :param reset_ratio: a drop to below this fraction of the previous reading counts as a meter
+        reset, smaller drops are flagged as negative consumption.
+    """
+    readings = np.asarray(readings, dtype=float)
+    deltas = np.diff(readings, axis=1)
+    missing = np.isnan(deltas)
+    drop = deltas < 0
+    reset = drop & (readings[:, 1:] < readings[:, :-1] * reset_ratio)
+    deltas[reset] = np.nan
+    return HourlyConsumption(deltas=deltas, negative=drop & ~reset, reset=reset, missing=missing)
+
+
+_readings = itemgetter(*READINGS)
+
+
+def readings_from_records(records: list[dict]) -> np.ndarray:
+    try:
+        return np.array([_readings(record) for record in records], dtype=float)
+    except KeyError:
+        return np.array([[record.get(key) for key in READINGS] for record in records], dtype=float)
+
+
+def flagged_hours(mask: np.ndarray) -> list[list[int]]:
+    """List of the flagged hours for every row of a (meter-days, 24) mask"""
+    hours = [[] for _ in range(len(mask))]
+    rows, columns = np.nonzero(mask)
+    for row, column in zip(rows.tolist(), columns.tolist()):
+        hours[row].append(column)
+    return hours
+
+
+def to_nullable(values: np.ndarray, decimals: int) -> np.ndarray:
+    """Rounded object array with None instead of NaN, ready to be written as JSON"""
+    rounded = np.round(values, decimals).astype(object)
+    rounded[np.isnan(values)] = None
+    return rounded
@@ -0,0 +1,104 @@
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+class Manifest:
+    """Append-only record of the source files that were transformed completely.
+
+    Every line holds the size, mtime and sha256 of a source file together with the size and
+    sha256 of each output it produced. Lines are only appended after all outputs were moved
+    into place, so a file that was interrupted halfway never appears in the manifest. When a
+    source is transformed again the last line for it wins.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        if path.exists():
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut off by an interrupted run
+                    self.entries[entry['source']] = entry
+
+    def is_complete(self, file: Path, output_folder: Path, output_format: str) -> bool:
+        entry = self.entries.get(file.name)
+        if entry is None or entry['format'] != output_format:
+            return False
+
+        stat = file.stat()
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime != entry['mtime'] and sha256_file(file) != entry['sha256']:
+            return False
+
+        for output, properties in entry['outputs'].items():
+            output_path = output_folder / output
+            if not output_path.is_file() or output_path.stat().st_size != properties['size']:
+                return False
+        return True
+
+    def outputs(self, file: Path) -> list[str]:
+        entry = self.entries.get(file.name)
+        return list(entry['outputs']) if entry else []
+
+    def record(self, file: Path, sha256: str, outputs: dict[str, dict], output_format: str):
+        stat = file.stat()
+        entry = {
+            'source': file.name,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha256': sha256,
+            'format': output_format,
+            'outputs': outputs,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries[file.name] = entry
+
+
+class HashingReader(io.RawIOBase):
+    """Binary stream wrapper computing the sha256 and size of everything read through it"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.hash = hashlib.sha256()
+        self.bytes = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.raw.read(len(buffer))
+        buffer[:len(data)] = data
+        self.hash.update(data)
+        self.bytes += len(data)
+        return len(data)
+
+    def hexdigest(self) -> str:
+        while self.readinto(bytearray(HASH_CHUNK_SIZE)):
+            pass  # hash whatever the parser did not consume
+        return self.hash.hexdigest()
+
+
+def sha256_file(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def temporary_path(path: Path) -> Path:
+    """Sibling path to write to before atomically renaming to `path`"""
+    return path.with_name(f'.{path.name}.tmp')
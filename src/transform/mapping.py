@@ -0,0 +1,100 @@
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from transform.base import Transformer
+from util import ETLConfig
+
+CASTS = {
+    "string": str,
+    "double": float,
+    "bigint": int,
+    "int": int,
+    "boolean": bool,
+}
+
+
+@dataclass(frozen=True)
+class Field:
+    """Declarative mapping of one output field.
+
+    :param name: name of the output field.
+    :param source: dotted path into the source record, defaults to the name.
+    :param type: Athena type of the output column, used for typed output formats.
+    :param fallback: value used when the source path is missing or null.
+    :param required: raise a KeyError when the source field is missing instead of using the fallback.
+    :param cast: convert the value to `type`, by default values are passed through unchanged.
+    """
+    name: str
+    source: str | None = None
+    type: str | None = None
+    fallback: Any = None
+    required: bool = False
+    cast: bool = False
+
+    @property
+    def path(self) -> list[str]:
+        return (self.source or self.name).split(".")
+
+
+def compile_fields(fields: list[Field]) -> Callable[[dict], dict]:
+    """Compile field mappings into a single function building the output record.
+
+    The generated function is a single dict display with constant keys, avoiding the per-field
+    loops and lookups a generic interpreter of the mapping would do for every record.
+    """
+    namespace = {}
+    items = []
+    for i, field in enumerate(fields):
+        expression = _path_expression(field)
+        if field.cast:
+            namespace[f"_cast{i}"] = CASTS[field.type]
+            expression = f"(_cast{i}(_v) if (_v := {expression}) is not None else None)"
+        if field.fallback is not None:
+            namespace[f"_fallback{i}"] = field.fallback
+            expression = f"(_v if (_v := {expression}) is not None else _fallback{i})"
+        items.append(f"        {field.name!r}: {expression},")
+
+    source = "\n".join(["def extract(record):", "    return {", *items, "    }"])
+    exec(compile(source, "<field mapping>", "exec"), namespace)
+    return namespace["extract"]
+
+
+def _path_expression(field: Field) -> str:
+    first, *rest = field.path
+    expression = f"record[{first!r}]" if field.required else f"record.get({first!r})"
+    for key in rest:
+        if field.required:
+            expression = f"{expression}[{key!r}]"
+        else:
+            expression = f"(_p.get({key!r}) if (_p := {expression}) is not None else None)"
+    return expression
+
+
+class MappedTransformer(Transformer):
+    """Transformer driven by a list of `Field` mappings, from `config.fields` or the class attribute"""
+    fields: list[Field] | None = None
+
+    def __init__(self, config: ETLConfig):
+        self.fields = config.fields or self.fields
+        if self.fields is None:
+            raise ValueError(f"No fields defined for {config.type.value}")
+        if self.output_schema is None and all(field.type for field in self.fields):
+            self.output_schema = {field.name: field.type for field in self.fields}
+        super().__init__(config)
+        self._extract = compile_fields(self.fields)
+
+    def __getstate__(self) -> dict:
+        # compiled functions cannot be pickled, worker processes compile their own
+        state = self.__dict__.copy()
+        del state["_extract"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._extract = compile_fields(self.fields)
+
+    def _transform(self, record: dict) -> dict:
+        return self._extract(record)
+
+    def _transform_batch(self, records: list[dict]) -> list[dict]:
+        return list(map(self._extract, records))
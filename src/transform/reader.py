@@ -0,0 +1,116 @@
+import json
+import re
+from pathlib import Path
+from typing import IO, Iterator
+
+from jsoncodec import JsonCodec, get_codec
+
+CHUNK_SIZE = 1 << 20
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"\s*")
+
+
+def iter_records(
+    source: str | Path | IO[str], chunk_size: int = CHUNK_SIZE, codec: JsonCodec | None = None
+) -> Iterator[dict]:
+    """Yield records one by one from a JSON array or JSON lines input.
+
+    The input is read in chunks of `chunk_size` characters, so memory use is bounded by
+    the size of the largest record instead of the size of the file. JSON lines are decoded
+    with `codec`, arrays always with the standard library decoder.
+    """
+    if isinstance(source, (str, Path)):
+        with open(source, "r") as f:
+            yield from iter_records(f, chunk_size, codec)
+        return
+
+    buffer, pos = "", 0
+    while pos == len(buffer):
+        buffer = source.read(chunk_size)
+        if not buffer:
+            return
+        pos = _whitespace.match(buffer).end()
+
+    if buffer[pos] == "[":
+        yield from _iter_values(source, buffer, pos + 1, chunk_size)
+    else:
+        yield from _iter_lines(source, buffer[pos:], chunk_size, codec or get_codec())
+
+
+def _iter_lines(source: IO[str], buffer: str, chunk_size: int, codec: JsonCodec) -> Iterator[dict]:
+    while True:
+        lines = buffer.split("\n")
+        buffer = lines.pop()  # the last line may continue in the next chunk
+        for line in lines:
+            if line.strip():
+                yield codec.loads(line)
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+
+    if buffer.strip():
+        yield codec.loads(buffer)
+
+
+def _iter_values(source: IO[str], buffer: str, pos: int, chunk_size: int) -> Iterator[dict]:
+    """Decode the values of a JSON array, `pos` is just after its opening bracket.
+
+    Values must be separated by exactly one comma. A value that fails to decode is retried with
+    more input only while the failure is within the last chunk, where it may be caused by the
+    value continuing in the next chunk, so malformed input does not buffer the rest of the file.
+    """
+    eof = False
+    expecting = "first"  # "first" value or closing bracket, a "value" after a comma, or a "separator"
+    while True:
+        pos = _whitespace.match(buffer, pos).end()
+        if pos == len(buffer):
+            if eof:
+                raise json.JSONDecodeError("Unterminated array", buffer, pos)
+            buffer, pos, eof = _refill(source, buffer, pos, chunk_size)
+            continue
+
+        if expecting == "separator" or (expecting == "first" and buffer[pos] == "]"):
+            if buffer[pos] == "]":
+                _expect_end(source, buffer, pos + 1, chunk_size)
+                return
+            if buffer[pos] != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+            pos += 1
+            expecting = "value"
+            continue
+
+        try:
+            record, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            truncated = e.pos >= len(buffer) - chunk_size or e.msg.startswith("Unterminated string")
+            if eof or not truncated:
+                raise
+            buffer, pos, eof = _refill(source, buffer, pos, chunk_size)
+            continue
+
+        if end == len(buffer) and not eof:
+            # A number at the very end of the buffer may continue in the next chunk
+            buffer, pos, eof = _refill(source, buffer, pos, chunk_size)
+            continue
+
+        yield record
+        pos = end
+        expecting = "separator"
+
+
+def _expect_end(source: IO[str], buffer: str, pos: int, chunk_size: int):
+    """Only whitespace may follow the closing bracket of the array"""
+    while True:
+        pos = _whitespace.match(buffer, pos).end()
+        if pos < len(buffer):
+            raise json.JSONDecodeError("Extra data", buffer, pos)
+        buffer, pos = source.read(chunk_size), 0
+        if not buffer:
+            return
+
+
+def _refill(source: IO[str], buffer: str, pos: int, chunk_size: int) -> tuple[str, int, bool]:
+    chunk = source.read(chunk_size)
+    return buffer[pos:] + chunk, 0, not chunk
@@ -0,0 +1,69 @@
+from datetime import datetime
+from importlib.util import find_spec
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+# Arrow backed strings run the regular expressions in native code
+STRING_DTYPE = "string[pyarrow]" if find_spec("pyarrow") else object
+
+# Datetimes in the canonical ISO format can be split into their local date and time by
+# position, anything else (fractional seconds, basic format, ...) goes through fromisoformat.
+ISO_DATETIME = r"\d{4}-\d{2}-\d{2}[T ](?:[01]\d|2[0-3]):[0-5]\d:[0-5]\d(?:Z|[+-]\d{2}:\d{2})?"
+CANONICAL_UUID = r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+
+
+def column(records: list[dict], key: str, default=None) -> np.ndarray:
+    """Collect the values of `key` of all records into an object array"""
+    return np.fromiter((record.get(key, default) for record in records), dtype=object, count=len(records))
+
+
+def struct_field(records: list[dict], key: str, field: str) -> np.ndarray:
+    """Equivalent of `record[key][field] if key in record else None` for all records"""
+    present = np.fromiter((key in record for record in records), dtype=bool, count=len(records))
+    return struct_field_where(column(records, key), present, field)
+
+
+def struct_field_where(structs: np.ndarray, present: np.ndarray, field: str) -> np.ndarray:
+    result = np.full(len(structs), None, dtype=object)
+    if present.any():
+        result[present] = np.frompyfunc(itemgetter(field), 1, 1)(structs[present])
+    return result
+
+
+def split_iso_datetimes(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Local date and time in ISO format, as `datetime.fromisoformat(value).date()/.time()` would give"""
+    strings = _is_string(values)
+    series = pd.Series(np.where(strings, values, ""), dtype=STRING_DTYPE)
+    dates = series.str.slice(0, 10)
+    canonical = (
+        strings
+        & series.str.fullmatch(ISO_DATETIME).to_numpy(dtype=bool)
+        & pd.to_datetime(dates, format="%Y-%m-%d", errors="coerce").notna().to_numpy()
+    )
+
+    dates = dates.to_numpy(dtype=object)
+    times = series.str.slice(11, 19).to_numpy(dtype=object)
+    for i in np.flatnonzero(~canonical):
+        local_time = datetime.fromisoformat(values[i])
+        dates[i] = local_time.date().isoformat()
+        times[i] = local_time.time().isoformat()
+    return dates, times
+
+
+def valid_uuids(values: np.ndarray, is_valid_uuid) -> np.ndarray:
+    """Boolean mask equivalent to calling `is_valid_uuid` on every value"""
+    if not _is_string(values).all():
+        return np.fromiter((is_valid_uuid(value) for value in values), dtype=bool, count=len(values))
+    return pd.Series(values, dtype=STRING_DTYPE).str.fullmatch(CANONICAL_UUID).to_numpy(dtype=bool)
+
+
+def _is_string(values: np.ndarray) -> np.ndarray:
+    return np.fromiter((isinstance(value, str) for value in values), dtype=bool, count=len(values))
+
+
+def to_records(columns: dict[str, np.ndarray | list]) -> list[dict]:
+    keys = list(columns)
+    lists = [values.tolist() if isinstance(values, np.ndarray) else values for values in columns.values()]
+    return [dict(zip(keys, row)) for row in zip(*lists)]
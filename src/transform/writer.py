@@ -0,0 +1,214 @@
+import os
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+from compression import add_suffix, open_output
+from jsoncodec import get_codec
+from partitioning import PARTITION_KEY, partition_folder, validate_partitioning
+from transform.manifest import temporary_path
+from util import ETLConfig
+
+
+@dataclass
+class WriteResult:
+    records: int = 0
+    outputs: list[Path] = field(default_factory=list)
+
+
+class OutputWriter:
+    """Writes transformed records for a single source file to the transformation folder.
+
+    Outputs are written to a temporary file first and renamed into place once complete.
+    """
+
+    def __init__(self, config: ETLConfig, schema: dict[str, str] | None = None):
+        validate_partitioning(config.partitioning)
+        self.config = config
+        self.schema = schema
+
+    def write(self, records: Iterable[dict], filename: str) -> WriteResult:
+        raise NotImplementedError
+
+
+class JsonLinesWriter(OutputWriter):
+    """Writes one JSON record per line, compressed with `config.output_compression` when set.
+
+    With `config.partitioning` the records are split over a file per partition of their date,
+    for example `year=2024/month=01/day=31/<name>.json`. Records without a date end up in the
+    default Hive partition.
+    """
+
+    def write(self, records: Iterable[dict], filename: str) -> WriteResult:
+        if self.config.partitioning is not None:
+            return self._write_partitioned(records, filename)
+
+        output_path = self.config.transformation_folder / add_suffix(filename, self.config.output_compression)
+        tmp_path = temporary_path(output_path)
+        count = 0
+        codec = get_codec(self.config.json_codec)
+        with open_output(tmp_path, self.config.output_compression, self.config.compression_level) as f:
+            with codec.line_writer(f) as writer:
+                for record in records:
+                    writer.write(record)
+                    count += 1
+        os.replace(tmp_path, output_path)
+        return WriteResult(count, [output_path])
+
+    def _write_partitioned(self, records: Iterable[dict], filename: str) -> WriteResult:
+        name = add_suffix(filename, self.config.output_compression)
+        codec = get_codec(self.config.json_codec)
+        writers = {}
+        count = 0
+        completed = False
+
+        with ExitStack() as stack:
+            try:
+                for record in records:
+                    if record is None:
+                        continue
+                    partition = partition_folder(record.get(PARTITION_KEY), self.config.partitioning)
+                    if partition not in writers:
+                        folder = self.config.transformation_folder / partition
+                        folder.mkdir(parents=True, exist_ok=True)
+                        tmp_path = temporary_path(folder / name)
+                        f = stack.enter_context(
+                            open_output(tmp_path, self.config.output_compression, self.config.compression_level)
+                        )
+                        writers[partition] = (tmp_path, stack.enter_context(codec.line_writer(f)))
+                    writers[partition][1].write(record)
+                    count += 1
+                completed = True
+            finally:
+                if not completed:
+                    stack.close()
+                    for tmp_path, _ in writers.values():
+                        tmp_path.unlink(missing_ok=True)
+
+        outputs = []
+        for tmp_path, _ in writers.values():
+            output_path = tmp_path.with_name(name)
+            os.replace(tmp_path, output_path)
+            outputs.append(output_path)
+        return WriteResult(count, outputs)
+
+
+class ParquetWriter(OutputWriter):
+    """Writes Parquet files partitioned Hive-style on the record date, `date=YYYY-MM-DD/<name>.parquet`
+    or `year=YYYY/month=MM/day=DD/<name>.parquet` with the "ymd" partitioning.
+
+    Records are buffered per partition. Once `config.row_group_size` records are buffered in
+    total, the largest buffer is flushed as a row group, so memory stays bounded for large inputs
+    however many dates they span. Records without a date end up in the default Hive partition.
+    A date partition column itself is not stored in the files.
+    """
+
+    TYPES = {
+        "string": "string",
+        "double": "float64",
+        "bigint": "int64",
+        "int": "int32",
+        "boolean": "bool_",
+    }
+
+    def write(self, records: Iterable[dict], filename: str) -> WriteResult:
+        import pyarrow.parquet as pq
+
+        stem = Path(filename).stem
+        buffers: dict[str, list[dict]] = {}
+        writers: dict[str, pq.ParquetWriter] = {}
+        count = 0
+        buffered = 0
+        completed = False
+
+        try:
+            for record in records:
+                if record is None:
+                    continue
+                partition = partition_folder(record.get(PARTITION_KEY), self.config.partition_layout)
+                buffers.setdefault(partition, []).append(record)
+                count += 1
+                buffered += 1
+                if buffered >= self.config.row_group_size:
+                    largest = max(buffers, key=lambda p: len(buffers[p]))
+                    buffered -= len(buffers[largest])
+                    self._flush(largest, buffers[largest], writers, stem)
+
+            for partition, buffer in buffers.items():
+                if buffer:
+                    self._flush(partition, buffer, writers, stem)
+            completed = True
+        finally:
+            for writer in writers.values():
+                writer.close()
+                if not completed:
+                    os.remove(writer.where)
+
+        outputs = []
+        for writer in writers.values():
+            output_path = self._output_path(Path(writer.where))
+            os.replace(writer.where, output_path)
+            outputs.append(output_path)
+        return WriteResult(count, outputs)
+
+    def _flush(self, partition: str, buffer: list[dict], writers: dict, stem: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = self._arrow_schema()
+        if schema is None:
+            table = pa.Table.from_pylist(buffer)
+            if self._drops_partition_key:
+                table = table.drop_columns([PARTITION_KEY])
+        else:
+            table = pa.Table.from_pylist(buffer, schema=schema)
+
+        if partition not in writers:
+            folder = self.config.transformation_folder / partition
+            folder.mkdir(parents=True, exist_ok=True)
+            writers[partition] = pq.ParquetWriter(
+                str(temporary_path(folder / f"{stem}.parquet")),
+                table.schema,
+                compression=self.config.parquet_compression,
+            )
+        writers[partition].write_table(table, row_group_size=self.config.row_group_size)
+        buffer.clear()
+
+    @staticmethod
+    def _output_path(tmp_path: Path) -> Path:
+        return tmp_path.with_name(tmp_path.name[1:-len('.tmp')])
+
+    @property
+    def _drops_partition_key(self) -> bool:
+        return self.config.partition_layout == "date"
+
+    def _arrow_schema(self):
+        if self.schema is None:
+            return None
+        import pyarrow as pa
+        return pa.schema([
+            (name, self._arrow_type(type_))
+            for name, type_ in self.schema.items()
+            if name != PARTITION_KEY or not self._drops_partition_key
+        ])
+
+    @classmethod
+    def _arrow_type(cls, type_: str):
+        import pyarrow as pa
+
+        if type_.startswith("array<"):
+            return pa.list_(cls._arrow_type(type_[len("array<"):-1]))
+        return getattr(pa, cls.TYPES[type_])()
+
+
+WRITERS = {
+    "jsonl": JsonLinesWriter,
+    "parquet": ParquetWriter,
+}
+
+
+def get_writer(config: ETLConfig, schema: dict[str, str] | None = None) -> OutputWriter:
+    if config.output_format not in WRITERS:
+        raise ValueError(f"Unknown output format {config.output_format}, choose from {', '.join(WRITERS)}")
+    return WRITERS[config.output_format](config, schema)
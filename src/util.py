@@ -8,6 +8,7 @@ from typing import Any
 class DataType(Enum):
     DAILY_USAGE = "daily_usage"
     P4_HOUR_2025 = "p4_hour_2025"
+    P4_HOUR_CONSUMPTION_2025 = "p4_hour_consumption_2025"
     P4_QUARTER_2025 = "p4_quarter_2025"
     P4_QUARTER_2024 = "p4_quarter_2024"
     HOUSEHOLD_EXCEPTIONS = "household_exceptions"
@@ -18,9 +19,24 @@ class ETLConfig:
     type: DataType
     filename_prefix: str | None
     transformer: Any | None = None
+    fields: list | None = None  # field mappings for a MappedTransformer
     root_extraction_folder: PosixPath = Path("extracted")
     root_transformation_folder: PosixPath = Path("transformed")
     eligible_steps: str = "ETL"
+    source_type: DataType | None = None  # read the extracted files of another data type
+    streaming: bool = False
+    workers: int = 1
+    upload_workers: int = 1  # concurrent S3 uploads of the loader
+    batch_size: int = 10_000
+    output_format: str = "jsonl"
+    parquet_compression: str = "snappy"
+    row_group_size: int = 1_000_000
+    output_compression: str | None = None
+    compression_level: int | None = None
+    json_codec: str | None = None  # None picks the fastest installed backend
+    resume: bool = True
+    compaction_target_mb: int | None = None  # compact the outputs into objects of this size before loading
+    partitioning: str | None = None  # "date" for date=YYYY-MM-DD or "ymd" for year=/month=/day= folders on the record date
 
     @property
     def s3_folder(self) -> str:
@@ -28,13 +44,53 @@ class ETLConfig:
 
     @property
     def s3_prefix(self) -> str:
+        if self.partition_layout is not None:
+            # partitioned outputs are in subfolders named after the partition, not the source file
+            return self.s3_folder
         return os.path.join(self.s3_folder, self.filename_prefix)
+
+    @property
+    def partition_layout(self) -> str | None:
+        """Partitioning of the outputs, Parquet outputs are always partitioned by date"""
+        if self.partitioning is None and self.output_format == "parquet":
+            return "date"
+        return self.partitioning
     
     @property
     def extraction_folder(self) -> PosixPath:
-        return self.root_extraction_folder / self.type.value
+        return self.root_extraction_folder / (self.source_type or self.type).value
   
     @property
     def transformation_folder(self) -> PosixPath:
         return self.root_transformation_folder / self.type.value
+
+    @property
+    def manifest_file(self) -> PosixPath:
+        return self.root_transformation_folder / f"{self.type.value}.manifest.jsonl"
+
+    @property
+    def compacted_folder(self) -> PosixPath:
+        return self.root_transformation_folder / f"{self.type.value}.compacted"
+
+    @property
+    def compaction_manifest_file(self) -> PosixPath:
+        return self.root_transformation_folder / f"{self.type.value}.compaction.json"
+
+    @property
+    def compacted_s3_folder(self) -> str:
+        """Compacted objects get their own prefix (and Athena table), apart from the per-file objects"""
+        return os.path.join('gcs', f"{self.type.value}_compacted", '')
+
+    @property
+    def load_s3_folder(self) -> str:
+        if self.compaction_target_mb is None:
+            return self.s3_folder
+        return self.compacted_s3_folder
+
+    @property
+    def load_folder(self) -> PosixPath:
+        """Folder of the files to load, the compacted outputs when compaction is enabled"""
+        if self.compaction_target_mb is None:
+            return self.transformation_folder
+        return self.compacted_folder
   
\ No newline at end of file
@@ -1,40 +1,62 @@
+from dataclasses import dataclass
+
+import numpy as np
 import pandas as pd
 
 
-def categorise_build_years(row: pd.Series) -> pd.Series:
-    bouwjaar = None
-    if row["build_year"] < 1950:
-        bouwjaar = "tot 1950"
-    elif 1950 <= row["build_year"] < 1975:
-        bouwjaar = "1950-1975"
-    elif 1975 <= row["build_year"] < 1992:
-        bouwjaar = "1975-1992"
-    elif 1992 <= row["build_year"] < 2006:
-        bouwjaar = "1992-2006"
-    elif 2006 <= row["build_year"] <= 2015:
-        bouwjaar = "2006-2015"
-    elif 2015 < row["build_year"]:
-        bouwjaar = "na 2015"
-
-    row["build_year_cat"] = bouwjaar
-    return row
-
-
-square_meters_categories = {
-    "< 100m2": lambda x: x < 100,
-    "100-120 m2": lambda x: 100 <= x < 120,
-    "120-150 m2": lambda x: 120 <= x < 150,
-    "150-200 m2": lambda x: 150 <= x < 200,
-    "> 200m2": lambda x: x >= 200,
+@dataclass(frozen=True)
+class Bins:
+    """Consecutive bins [edges[i], edges[i + 1]) with a label each, values outside all bins are missing.
+    An infinite last edge is included in the last bin.
+    """
+    edges: tuple[float, ...]
+    labels: tuple[str, ...]
+
+    def __post_init__(self):
+        assert len(self.edges) == len(self.labels) + 1, "every bin needs a label"
+        assert all(a < b for a, b in zip(self.edges, self.edges[1:])), "edges must be increasing"
+
+
+BUILD_YEAR_BINS = Bins(
+    # 2015 itself still belongs to 2006-2015, so that bin ends just after it
+    edges=(-np.inf, 1950, 1975, 1992, 2006, np.nextafter(2015, np.inf), np.inf),
+    labels=("tot 1950", "1950-1975", "1975-1992", "1992-2006", "2006-2015", "na 2015"),
+)
+
+SQUARE_METER_BINS = Bins(
+    edges=(-np.inf, 100, 120, 150, 200, np.inf),
+    labels=("< 100m2", "100-120 m2", "120-150 m2", "150-200 m2", "> 200m2"),
+)
+
+RESIDENT_COUNT_BINS = Bins(
+    edges=(1, 2, 3, 4, 5, np.inf),
+    labels=("1 persoon", "2 personen", "3 personen", "4 personen", "5+ personen"),
+)
+
+ENERGY_LABEL_GROUPS = {
+    "A en beter": ("A++++", "A+++", "A++", "A+", "A"),
+    "B-C": ("B", "C"),
+    "D-E": ("D", "E"),
+    "F-G": ("F", "G"),
 }
 
 
-def categorise_square_meters(row: pd.Series) -> pd.Series:
-    if pd.isna(row["square_meters"]):
-        row["square_meters_cat"] = None
-        return row
-    opp = int(row["square_meters"])
-    for o, f in square_meters_categories.items():
-        if f(opp):
-            row["square_meters_cat"] = o
-            return row
+def categorise(values: pd.Series, bins: Bins) -> pd.Series:
+    """Assign every value the label of its bin in one pass, missing values stay missing"""
+    numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    codes = np.searchsorted(bins.edges, numbers, side="right") - 1
+    if np.isposinf(bins.edges[-1]):
+        codes[np.isposinf(numbers)] = len(bins.labels) - 1
+    codes[np.isnan(numbers) | (codes >= len(bins.labels))] = -1
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=list(bins.labels), ordered=True),
+        index=values.index,
+        name=values.name,
+    )
+
+
+def categorise_groups(values: pd.Series, groups: dict[str, tuple[str, ...]]) -> pd.Series:
+    """Assign every value the name of the group it is listed in, other values become missing"""
+    lookup = {value: group for group, members in groups.items() for value in members}
+    categories = pd.CategoricalDtype(list(groups), ordered=True)
+    return values.map(lookup).astype(categories)
@@ -0,0 +1,58 @@
+import os
+
+import pandas as pd
+import pytest
+
+from extract.addresses import AddressIndex
+
+
+def _write_csvs(tmp_path):
+    pd.DataFrame({
+        "Postcode": ["9401AB", "9401AB", "9401AB", "1234CD"],
+        "Huisnummer": [1, 1, 2, 10],
+        "lon": [6.1, 9.9, 6.2, 4.9],
+        "lat": [52.1, 9.9, 52.2, 52.3],
+        "Straat": ["a", "a", "b", "c"],
+    }).to_csv(tmp_path / "adressen.csv", sep=";", index=False)
+    pd.DataFrame({
+        "Postcode": ["9401AB", "9401AB", "9401AB", "9402XY"],
+        "Huisnummer": [1, 1, 2, 5],
+        "Huisletter": [None, "a", None, None],
+        "Pand energielabel": ["A", "C", None, "G"],
+        "Buurtnaam": ["Centrum", "Elders", "Centrum", "Noord"],
+        "Wijknaam": ["Assen", "Assen", "Assen", "Assen-Noord"],
+    }).to_csv(tmp_path / "drenthe.csv", index=False)
+
+
+def test_lookups_match_in_memory_merge(tmp_path):
+    _write_csvs(tmp_path)
+    index = AddressIndex(str(tmp_path / "addresses.sqlite"), str(tmp_path / "adressen.csv"), str(tmp_path / "drenthe.csv"))
+
+    addresses = pd.Series(["9401AB#1", "9401AB#2", "9999ZZ#1", "9401AB#1"])
+    coordinates = index.coordinates(addresses).set_index("address")
+    assert coordinates.to_dict("index") == {"9401AB#1": {"lon": 6.1, "lat": 52.1}, "9401AB#2": {"lon": 6.2, "lat": 52.2}}
+
+    labels = index.energy_labels(["9401AB#1", "9401AB#1a", "9401AB#2"]).set_index("address")["Pand energielabel"]
+    assert labels.to_dict() == {"9401AB#1": "A", "9401AB#1a": "C", "9401AB#2": None}
+
+    neighbourhoods = index.neighbourhoods(["9401AB", "9402XY", None]).set_index("Postcode")["Buurtnaam"]
+    assert neighbourhoods.to_dict() == {"9401AB": "Centrum", "9402XY": "Noord"}
+    assert list(index.coordinates([]).columns) == ["address", "lon", "lat"]
+
+
+def test_index_without_csvs_is_used(tmp_path):
+    _write_csvs(tmp_path)
+    paths = str(tmp_path / "addresses.sqlite"), str(tmp_path / "adressen.csv"), str(tmp_path / "drenthe.csv")
+    AddressIndex(*paths)
+    os.remove(paths[1])
+    os.remove(paths[2])
+
+    index = AddressIndex(*paths)
+    assert index.coordinates(["9401AB#2"]).to_dict("records") == [{"address": "9401AB#2", "lon": 6.2, "lat": 52.2}]
+
+    # only a CSV that exists and is newer triggers a rebuild
+    _write_csvs(tmp_path)
+    os.remove(paths[2])
+    os.utime(paths[1], (os.path.getmtime(paths[0]) + 10,) * 2)
+    with pytest.raises(FileNotFoundError):  # the rebuild reads both files
+        AddressIndex(*paths)
@@ -0,0 +1,103 @@
+import gzip
+import os
+
+import pytest
+
+from load.athena import table_ddl
+from load.local import LocalS3Client
+from load.s3 import S3Loader
+from transform.compaction import Compactor
+from util import DataType, ETLConfig
+
+BUCKET = "bucket"
+DAYS = ["2024-01-30", "2024-01-31", "2024-02-01", "2024-02-02", "2024-02-03"]
+
+
+def _write(config, day: str, records: int = 3):
+    lines = "".join(f'{{"date": "{day}", "i": {i}}}\n' for i in range(records))
+    (config.transformation_folder / f"daily_usage_data_{day}.json.gz").write_bytes(gzip.compress(lines.encode()))
+    return lines
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = ETLConfig(DataType.DAILY_USAGE, "daily_usage_data", root_transformation_folder=tmp_path / "transformed",
+                       compaction_target_mb=1)
+    config.transformation_folder.mkdir(parents=True)
+    for day in DAYS:
+        _write(config, day)
+    return config
+
+
+def test_compacts_by_month(config):
+    Compactor(config).compact_all()
+
+    january = gzip.decompress((config.compacted_folder / "daily_usage_2024-01_0000.json.gz").read_bytes())
+    february = gzip.decompress((config.compacted_folder / "daily_usage_2024-02_0000.json.gz").read_bytes())
+    assert january.decode() == "".join(
+        gzip.decompress((config.transformation_folder / f"daily_usage_data_{day}.json.gz").read_bytes()).decode()
+        for day in DAYS[:2]
+    )
+    assert february.decode().count("\n") == 9
+    assert Compactor(config).compacted_sources() == {f"daily_usage_data_{day}.json.gz" for day in DAYS}
+
+
+def test_splits_at_target_size(config):
+    compactor = Compactor(config)
+    compactor.target_bytes = 2 * (config.transformation_folder / f"daily_usage_data_{DAYS[0]}.json.gz").stat().st_size
+    compactor.compact_all()
+
+    assert sorted(os.listdir(config.compacted_folder)) == [
+        "daily_usage_2024-01_0000.json.gz", "daily_usage_2024-02_0000.json.gz", "daily_usage_2024-02_0001.json.gz",
+    ]
+
+
+def test_rerun_only_rewrites_changed_months(config):
+    assert len(Compactor(config).compact_all()) == 2
+    assert Compactor(config).compact_all() == []
+
+    _write(config, "2024-02-04")
+    written = Compactor(config).compact_all()
+    assert written == [config.compacted_folder / "daily_usage_2024-02_0000.json.gz"]
+
+
+def test_loader_keeps_compacted_objects_apart(config, tmp_path):
+    client = LocalS3Client(tmp_path / "s3")
+    config.compaction_target_mb = None
+    S3Loader(None, BUCKET, config, s3_client=client).load_all()  # an earlier per-file load
+
+    config.compaction_target_mb = 1
+    Compactor(config).compact_all()
+    S3Loader(None, BUCKET, config, s3_client=client).load_all()
+
+    keys = [obj["Key"] for obj in client.list_objects_v2(Bucket=BUCKET, Prefix="gcs/daily_usage_compacted/")["Contents"]]
+    assert keys == [
+        "gcs/daily_usage_compacted/daily_usage_2024-01_0000.json.gz",
+        "gcs/daily_usage_compacted/daily_usage_2024-02_0000.json.gz",
+    ]
+    per_file = client.list_objects_v2(Bucket=BUCKET, Prefix="gcs/daily_usage/")["Contents"]
+    assert len(per_file) == len(DAYS)
+    assert "LOCATION 's3://bucket/gcs/daily_usage_compacted/'" in table_ddl(config, {"date": "string"}, BUCKET)
+    assert "EXISTS gcs_daily_usage_compacted (" in table_ddl(config, {"date": "string"}, BUCKET)
+
+
+def test_loader_deletes_objects_no_longer_planned(config, tmp_path):
+    compactor = Compactor(config)
+    compactor.target_bytes = 2 * (config.transformation_folder / f"daily_usage_data_{DAYS[0]}.json.gz").stat().st_size
+    compactor.compact_all()
+    client = LocalS3Client(tmp_path / "s3")
+    loader = S3Loader(None, BUCKET, config, s3_client=client)
+    loader.load_all()
+    assert len(client.list_objects_v2(Bucket=BUCKET)["Contents"]) == 3
+
+    Compactor(config).compact_all()  # the larger target fits February into one object
+    assert loader.load_all(dry_run=True).deletes == ["gcs/daily_usage_compacted/daily_usage_2024-02_0001.json.gz"]
+    loader.load_all()
+
+    keys = [obj["Key"] for obj in client.list_objects_v2(Bucket=BUCKET)["Contents"]]
+    assert keys == [
+        "gcs/daily_usage_compacted/daily_usage_2024-01_0000.json.gz",
+        "gcs/daily_usage_compacted/daily_usage_2024-02_0000.json.gz",
+    ]
+    february = gzip.decompress(client.get_object(Bucket=BUCKET, Key=keys[1])["Body"].read())
+    assert february.count(b"\n") == 9
@@ -0,0 +1,72 @@
+import os
+import shutil
+
+import pytest
+
+from extract.delta import DeltaPlanner
+from extract.s3 import S3Extractor
+from util import DataType, ETLConfig
+
+
+def _entry(size: int, modtime: str = "2024-06-01T10:00:00Z") -> dict:
+    return {"Size": size, "ModTime": modtime}
+
+
+def test_diff_plans_missing_and_changed_files():
+    planner = DeltaPlanner("source", "dest", "p4_hour_data", loaded=["p4_hour_data_3.json.gz"])
+    source = {
+        "p4_hour_data_1.json": _entry(10),
+        "2024/p4_hour_data_2.json": _entry(20),
+        "p4_hour_data_3.json": _entry(30),
+        "p4_hour_data_4.json": _entry(40, "2024-06-02T10:00:00Z"),
+        "p4_hour_data_5.json": _entry(50),
+        "daily_usage_data_1.json": _entry(60),
+    }
+    dest = {
+        "p4_hour_data_1.json": _entry(10, "2024-06-01T12:00:00+02:00"),
+        "p4_hour_data_4.json": _entry(40),
+        "p4_hour_data_5.json": _entry(49),
+    }
+
+    plan = planner.diff(source, dest)
+
+    assert plan.files == ["2024/p4_hour_data_2.json", "p4_hour_data_4.json", "p4_hour_data_5.json"]
+    assert plan.bytes == 110
+    assert (plan.up_to_date, plan.already_loaded) == (1, 1)
+
+
+def test_parquet_outputs_mark_their_sources_as_loaded(tmp_path, monkeypatch):
+    loaded = ["p4_hour_data_1.parquet", "p4_hour_data_2.parquet", "p4_hour_data_3.json.gz"]
+    planner = DeltaPlanner("source", "dest", "p4_hour_data", loaded=loaded)
+    source = {name: _entry(10) for name in ["p4_hour_data_1.json.gz", "p4_hour_data_2.json", "p4_hour_data_3.json",
+                                            "p4_hour_data_4.json"]}
+    assert planner.diff(source, {}).files == ["p4_hour_data_4.json"]
+
+    monkeypatch.chdir(tmp_path)
+    config = ETLConfig(DataType.P4_HOUR_2025, "p4_hour_data", output_format="parquet")
+    extractor = S3Extractor(None, "bucket", config, s3_client=object())
+    # partitioned parquet outputs appear once per date
+    extractor.filenames = ["p4_hour_data_1.parquet", "p4_hour_data_1.parquet", "p4_hour_data_3.json.gz"]
+    assert open(extractor.generate_rclone_filter_list()).read().splitlines() == [
+        "- p4_hour_data_1.json{,.gz,.zst}",
+        "- p4_hour_data_3.json{,.gz,.zst}",
+        "+ p4_hour_data*",
+        "- *",
+    ]
+
+
+@pytest.mark.skipif(shutil.which("rclone") is None, reason="rclone is not installed")
+def test_plan_with_rclone_local_backend(tmp_path):
+    source, dest = tmp_path / "source", tmp_path / "dest"
+    source.mkdir()
+    dest.mkdir()
+    for i in range(3):
+        (source / f"p4_hour_data_{i}.json").write_text("[]" * (i + 1))
+    shutil.copy2(source / "p4_hour_data_0.json", dest / "p4_hour_data_0.json")
+    (dest / "p4_hour_data_1.json").write_text("[]")
+    os.utime(dest / "p4_hour_data_1.json", (0, 0))
+
+    plan = DeltaPlanner(str(source), dest, "p4_hour_data", loaded=["p4_hour_data_2.json"]).plan()
+
+    assert plan.files == ["p4_hour_data_1.json"]
+    assert (plan.up_to_date, plan.already_loaded) == (1, 1)
@@ -0,0 +1,113 @@
+import gzip
+import io
+import json
+import os
+from contextlib import contextmanager
+
+import pytest
+
+from fused import FusedPipeline, LocalSource, RcloneSource, S3MultipartSink, SourceObject
+from load.local import LocalS3Client
+from transform.google import DailyUsageDataTransformer
+from util import DataType, ETLConfig
+
+BUCKET = "bucket"
+
+
+def _records(day: int) -> list[dict]:
+    return [
+        {"household_id": f"h{i}", "household_activation_code": "A", "date": f"2024-01-{day:02d}", "type": "gas", "usage": i / 10}
+        for i in range(500)
+    ]
+
+
+@pytest.fixture
+def setup(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "daily_usage_data_1.json").write_text(json.dumps(_records(1)))
+    with gzip.open(source / "daily_usage_data_2.json.gz", "wt") as f:
+        json.dump(_records(2), f)
+    (source / "other_file.json").write_text("[]")
+
+    config = ETLConfig(
+        DataType.DAILY_USAGE, "daily_usage_data", DailyUsageDataTransformer,
+        root_transformation_folder=tmp_path / "transformed", output_compression="gzip", batch_size=100,
+    )
+    client = LocalS3Client(tmp_path / "s3")
+    sink = S3MultipartSink(client, BUCKET, part_size=1024, max_in_flight=2, max_concurrency=2)
+    yield config, LocalSource(source), sink, client
+    sink.shutdown()
+
+
+def test_streams_sources_to_multipart_objects(setup):
+    config, source, sink, client = setup
+    results = FusedPipeline(config, source, sink, concurrency=2).run()
+
+    assert sorted(result.filename for result in results) == ["daily_usage_data_1.json", "daily_usage_data_2.json.gz"]
+    assert all(result.error is None and result.records == 500 for result in results)
+
+    transformer = DailyUsageDataTransformer(config)
+    for day in (1, 2):
+        key = f"gcs/daily_usage/daily_usage_data_{day}.json.gz"
+        obj = client.get_object(Bucket=BUCKET, Key=key)
+        lines = gzip.decompress(obj["Body"].read()).decode().splitlines()
+        assert [json.loads(line) for line in lines] == transformer._transform_batch(_records(day))
+        assert obj["ContentEncoding"] == "gzip"
+        assert int(obj["ETag"].split("-")[1][:-1]) > 1
+
+    client.requests.clear()
+    assert FusedPipeline(config, source, sink).run() == []
+    assert "UploadPart" not in client.requests
+
+
+def test_failed_stream_aborts_the_upload(setup, tmp_path):
+    config, source, sink, client = setup
+    (tmp_path / "source" / "daily_usage_data_3.json").write_text(json.dumps(_records(3))[:-20])
+
+    results = {result.filename: result for result in FusedPipeline(config, source, sink).run()}
+
+    assert results["daily_usage_data_3.json"].error is not None
+    assert client.requests["AbortMultipartUpload"] == 1
+    with pytest.raises(Exception):
+        client.head_object(Bucket=BUCKET, Key="gcs/daily_usage/daily_usage_data_3.json.gz")
+
+
+def _lines(day: int) -> bytes:
+    return "".join(json.dumps(record) + "\n" for record in _records(day)).encode()
+
+
+class CutOffSource(LocalSource):
+    """Ends every object after its first complete lines, like a download that died mid-stream"""
+
+    @contextmanager
+    def open(self, name):
+        with super().open(name) as f:
+            data = f.read()
+        yield io.BytesIO(data[:data.index(b"\n", len(data) // 2) + 1])
+
+
+@pytest.mark.parametrize("failing_source", ["cut_off", "rclone"])
+def test_failed_source_is_not_committed(setup, tmp_path, monkeypatch, failing_source):
+    config, _, sink, client = setup
+    folder = tmp_path / "jsonl"
+    folder.mkdir()
+    (folder / "daily_usage_data_3.json").write_bytes(_lines(3))
+    if failing_source == "cut_off":
+        source = CutOffSource(folder)
+    else:
+        # a fake rclone that dies after writing half of the lines
+        bin_folder = tmp_path / "bin"
+        bin_folder.mkdir()
+        (bin_folder / "rclone").write_text(f"#!/bin/sh\nhead -n 250 {folder}/daily_usage_data_3.json\nexit 1\n")
+        (bin_folder / "rclone").chmod(0o755)
+        monkeypatch.setenv("PATH", f"{bin_folder}{os.pathsep}{os.environ['PATH']}")
+        source = RcloneSource("remote:")
+        monkeypatch.setattr(source, "list", lambda: [SourceObject("daily_usage_data_3.json", len(_lines(3)))])
+
+    [result] = FusedPipeline(config, source, sink).run()
+
+    assert result.error is not None
+    assert not {"CompleteMultipartUpload", "PutObject"} & set(client.requests)
+    with pytest.raises(Exception):
+        client.head_object(Bucket=BUCKET, Key="gcs/daily_usage/daily_usage_data_3.json.gz")
@@ -0,0 +1,49 @@
+import numpy as np
+
+from tests.fixture import p4_hour_example_june_25
+from transform.google import P4HourConsumption2025Transformer
+from transform.hourly import MISSING, NEGATIVE, RESET, hourly_consumption, readings_from_records
+from util import DataType, ETLConfig
+
+
+def test_hourly_consumption_from_cumulative_readings():
+    readings = readings_from_records([p4_hour_example_june_25])
+    consumption = hourly_consumption(readings)
+
+    assert consumption.deltas.shape == (1, 24)
+    assert np.isclose(consumption.deltas.sum(), 3881.623 - 3881.251)
+    assert np.isclose(consumption.deltas[0, 4], 3881.269 - 3881.251)
+    assert not consumption.negative.any()
+    assert not consumption.reset.any()
+    assert not consumption.missing.any()
+
+
+def test_hourly_consumption_flags():
+    readings = np.arange(25, dtype=float) + 100
+    readings[3] = 101.5   # lower than the reading before it
+    readings[10] = np.nan  # missing reading affects the hour before and after it
+    readings[20] = 0.2     # meter reset
+
+    consumption = hourly_consumption(readings[np.newaxis, :])
+    flags = consumption.flags[0]
+
+    assert flags[2] == NEGATIVE
+    assert flags[9] == MISSING and flags[10] == MISSING
+    assert flags[19] == RESET
+    assert flags[0] is None
+    assert np.isnan(consumption.deltas[0, 19])  # the drop of a reset is not consumption
+    assert not consumption.missing[0, 19]
+    assert np.isclose(consumption.deltas[0, 2], -0.5)
+
+
+def test_reset_hours_are_written_as_null(tmp_path):
+    config = ETLConfig(DataType.P4_HOUR_CONSUMPTION_2025, "p4_hour_data_2025", P4HourConsumption2025Transformer,
+                       root_transformation_folder=tmp_path)
+    record = dict(p4_hour_example_june_25, measurement_h_20=0.25, measurement_h_21=0.5)
+
+    [transformed] = P4HourConsumption2025Transformer(config)._transform_batch([record])
+
+    assert transformed["reset_hours"] == [19]
+    assert transformed["consumption_h_19"] is None
+    assert transformed["consumption_h_20"] == 0.25
+    assert transformed["missing_hours"] == []
@@ -0,0 +1,70 @@
+from extract.inventory import S3Inventory
+from load.local import LocalS3Client
+
+BUCKET = "bucket"
+PREFIX = "gcs/p4_quarter_2024/p4_hour_data_2024"
+
+
+def _put(client: LocalS3Client, days: range):
+    for day in days:
+        client.put_object(Bucket=BUCKET, Key=f"{PREFIX}_2024-01-{day:02d}.json", Body=b"[]")
+
+
+def test_refresh_lists_only_new_keys(tmp_path):
+    client = LocalS3Client(tmp_path / "s3")
+    _put(client, range(1, 11))
+    inventory = S3Inventory(client, tmp_path / "inventory.sqlite")
+
+    assert inventory.refresh(BUCKET, PREFIX) == 10
+    _put(client, range(11, 14))
+    client.requests.clear()
+
+    assert inventory.refresh(BUCKET, PREFIX) == 3
+    assert client.requests == {"ListObjectsV2": 1}
+    assert len(inventory.keys(BUCKET, PREFIX)) == 13
+    assert inventory.last_key(BUCKET, PREFIX).endswith("2024-01-13.json")
+
+
+def test_sharded_rebuild_matches_full_listing(tmp_path):
+    client = LocalS3Client(tmp_path / "s3")
+    _put(client, range(1, 29))
+    client.put_object(Bucket=BUCKET, Key="gcs/other/file.json", Body=b"[]")
+    inventory = S3Inventory(client, tmp_path / "inventory.sqlite")
+
+    boundaries = [f"{PREFIX}_2024-01-05.json", f"{PREFIX}_2024-01-17.json", f"{PREFIX}_2024-01-17.jsoo"]
+    assert inventory.rebuild(BUCKET, PREFIX, boundaries, workers=4) == 28
+
+    listed = [obj["Key"] for obj in client.list_objects_v2(Bucket=BUCKET, Prefix=PREFIX)["Contents"]]
+    assert inventory.keys(BUCKET, PREFIX) == listed
+    assert inventory.objects(BUCKET, PREFIX)[0]["ETag"] == client.head_object(Bucket=BUCKET, Key=listed[0])["ETag"]
+
+
+def test_cold_rebuild_is_sharded_by_key_structure(tmp_path, monkeypatch):
+    client = LocalS3Client(tmp_path / "s3")
+    for month in range(1, 13):
+        for day in (1, 15, 28):
+            client.put_object(Bucket=BUCKET, Key=f"{PREFIX}_2024-{month:02d}-{day:02d}.json", Body=b"[]")
+    inventory = S3Inventory(client, tmp_path / "inventory.sqlite")
+    ranges = []
+    list_range = inventory._list_range
+    monkeypatch.setattr(inventory, "_list_range", lambda *args: ranges.append(args[2:]) or list_range(*args))
+
+    assert inventory.rebuild(BUCKET, PREFIX, workers=4) == 36
+
+    listed = [obj["Key"] for obj in client.list_objects_v2(Bucket=BUCKET, Prefix=PREFIX)["Contents"]]
+    assert inventory.keys(BUCKET, PREFIX) == listed
+    assert (f"{PREFIX}_2024-02", f"{PREFIX}_2024-03") in ranges
+    assert len(ranges) > 12
+
+
+def test_cold_rebuild_of_undated_keys_is_sharded_by_first_character(tmp_path):
+    client = LocalS3Client(tmp_path / "s3")
+    keys = [f"exports/{i * 7919 % 4096:03x}.json.gz" for i in range(100)]
+    for key in keys:
+        client.put_object(Bucket=BUCKET, Key=key, Body=b"")
+    inventory = S3Inventory(client, tmp_path / "inventory.sqlite")
+
+    boundaries = inventory._boundaries(BUCKET, "exports/", 8)
+    assert "exports/a" in boundaries and "exports/5" in boundaries
+    assert inventory.rebuild(BUCKET, "exports/", workers=8) == 100
+    assert inventory.keys(BUCKET, "exports/") == sorted(keys)
@@ -0,0 +1,83 @@
+import io
+import json
+import math
+
+import pytest
+
+import jsoncodec
+from jsoncodec import CODECS, JsonCodec, get_codec
+
+records = [
+    {"household_id": "h1", "usage": 1.5, "measurements": [1, 2.25, None], "label": "é"},
+    {"big": 2 ** 70, "nested": {"ok": True}},
+]
+
+
+def test_standard_library_codec_is_byte_identical():
+    f = io.BytesIO()
+    with JsonCodec().line_writer(f, buffer_size=16) as writer:
+        for record in records:
+            writer.write(record)
+
+    assert f.getvalue() == "".join(json.dumps(record) + "\n" for record in records).encode()
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_codecs_are_semantically_identical(name):
+    try:
+        codec = get_codec(name)
+    except ImportError:
+        pytest.skip(f"{name} is not installed")
+
+    for record in records:
+        assert json.loads(codec.dumps_line(record)) == record
+        assert codec.loads(json.dumps(record)) == record
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_codecs_read_what_the_standard_library_reads(name):
+    try:
+        codec = get_codec(name)
+    except ImportError:
+        pytest.skip(f"{name} is not installed")
+
+    values = codec.loads('{"nan": NaN, "inf": -Infinity, "big": 123456789012345678901234567890, '
+                         '"negative": -9223372036854775809, "ean": 871688540006514357, "float": 1.5}')
+    assert math.isnan(values["nan"]) and values["inf"] == -math.inf
+    assert values["big"] == 123456789012345678901234567890 and type(values["big"]) is int
+    assert values["negative"] == -9223372036854775809 and type(values["negative"]) is int
+    assert values["ean"] == 871688540006514357 and type(values["ean"]) is int
+    assert values["float"] == 1.5 and type(values["float"]) is float
+    assert codec.loads(b'[123456789012345678901234567890]') == [123456789012345678901234567890]
+    with pytest.raises(ValueError):
+        codec.loads(b'{"a": }')
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_codecs_write_non_finite_floats_like_the_standard_library(name):
+    try:
+        codec = get_codec(name)
+    except ImportError:
+        pytest.skip(f"{name} is not installed")
+
+    record = {"nan": math.nan, "nested": [None, {"inf": math.inf}], "none": None}
+    assert codec.dumps_line(record) == (json.dumps(record) + "\n").encode()
+    assert codec.dumps(record) == json.dumps(record).encode()
+    assert codec.dumps({"none": None}) in (b'{"none":null}', b'{"none": null}')
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_load_reads_files_as_bytes(name, monkeypatch):
+    try:
+        codec = get_codec(name)
+    except ImportError:
+        pytest.skip(f"{name} is not installed")
+
+    monkeypatch.setattr(jsoncodec, "_SCAN_WINDOW", 16)  # the big integer straddles two scan windows
+    document = [{"household_id": "h1", "label": "é", "big": 2 ** 70}]
+    raw = io.BytesIO(json.dumps(document, ensure_ascii=False).encode())
+
+    # the UTF-8 bytes are never decoded by the text wrapper, which would fail on "é" as ASCII
+    loaded = codec.load(io.TextIOWrapper(raw, encoding="ascii"))
+    assert loaded == document and type(loaded[0]["big"]) is int
+    assert codec.load(io.StringIO(json.dumps(document))) == document
@@ -0,0 +1,128 @@
+import json
+import os
+
+import pytest
+
+from transform.google import DailyUsageDataTransformer
+from transform.manifest import Manifest
+from util import DataType, ETLConfig
+
+
+def _records(day: str, households: int = 3) -> list[dict]:
+    return [
+        {"household_id": f"h{i}", "household_activation_code": "ABC", "date": day, "type": "gas", "usage": i / 2}
+        for i in range(households)
+    ]
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = ETLConfig(DataType.DAILY_USAGE, "daily_usage_data", transformer=DailyUsageDataTransformer,
+                       root_extraction_folder=tmp_path / "extracted", root_transformation_folder=tmp_path / "transformed")
+    config.extraction_folder.mkdir(parents=True)
+    for day in ("2024-01-01", "2024-01-02"):
+        (config.extraction_folder / f"daily_usage_data_{day}.json").write_text(json.dumps(_records(day)))
+    return config
+
+
+def _transformed(results) -> list[str]:
+    return sorted(result.filename for result in results)
+
+
+def test_skips_completed_files(config):
+    assert _transformed(DailyUsageDataTransformer(config).transform_all()) == [
+        "daily_usage_data_2024-01-01.json", "daily_usage_data_2024-01-02.json",
+    ]
+    assert DailyUsageDataTransformer(config).transform_all() == []
+
+    manifest = Manifest(config.manifest_file)
+    entry = manifest.entries["daily_usage_data_2024-01-01.json"]
+    assert entry["format"] == "jsonl" and list(entry["outputs"]) == ["daily_usage_data_2024-01-01.json"]
+
+
+def test_redoes_changed_and_partial_files(config):
+    DailyUsageDataTransformer(config).transform_all()
+
+    changed = config.extraction_folder / "daily_usage_data_2024-01-01.json"
+    changed.write_text(json.dumps(_records("2024-01-01", households=4)))
+    assert _transformed(DailyUsageDataTransformer(config).transform_all()) == ["daily_usage_data_2024-01-01.json"]
+    output = config.transformation_folder / "daily_usage_data_2024-01-01.json"
+    assert len(output.read_text().splitlines()) == 4
+
+    # an output cut off after the manifest was written is detected by its size
+    output.write_text(output.read_text()[:10])
+    assert _transformed(DailyUsageDataTransformer(config).transform_all()) == ["daily_usage_data_2024-01-01.json"]
+
+    # a source touched without changing its content is recognised by its checksum
+    os.utime(changed, (0, 0))
+    assert DailyUsageDataTransformer(config).transform_all() == []
+
+    # a different output format is not reused
+    config.output_compression = "gzip"
+    assert len(DailyUsageDataTransformer(config).transform_all()) == 2
+
+
+def test_removes_stale_temporary_outputs(config):
+    stale = config.transformation_folder / ".daily_usage_data_2024-01-01.json.tmp"
+    stale.parent.mkdir(parents=True)
+    stale.write_text("cut off")
+
+    DailyUsageDataTransformer(config).transform_all()
+    assert not stale.exists()
+    assert sorted(os.listdir(config.transformation_folder)) == [
+        "daily_usage_data_2024-01-01.json", "daily_usage_data_2024-01-02.json",
+    ]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_manifest_is_correct_after_a_failed_file(config, streaming):
+    config.streaming = streaming
+    broken = config.extraction_folder / "daily_usage_data_2024-01-03.json"
+    # the second record misses required fields, so a streaming run fails halfway through the output
+    broken.write_text(json.dumps(_records("2024-01-03")[:1] + [{"household_id": "h1"}]))
+
+    with pytest.raises(KeyError):
+        DailyUsageDataTransformer(config).transform_all()
+    manifest = Manifest(config.manifest_file)
+    assert broken.name not in manifest.entries
+    assert all(
+        (config.transformation_folder / output).is_file()
+        for entry in manifest.entries.values() for output in entry["outputs"]
+    )
+
+    broken.write_text(json.dumps(_records("2024-01-03")))
+    assert broken.name in _transformed(DailyUsageDataTransformer(config).transform_all())
+    assert not list(config.transformation_folder.glob(".*.tmp"))
+    assert DailyUsageDataTransformer(config).transform_all() == []
+    assert set(Manifest(config.manifest_file).entries) == {
+        "daily_usage_data_2024-01-01.json", "daily_usage_data_2024-01-02.json", broken.name,
+    }
+
+
+def test_interrupted_manifest_line_is_ignored(config):
+    DailyUsageDataTransformer(config).transform_all()
+    with open(config.manifest_file, "a") as f:
+        f.write('{"source": "daily_usage_data_2024-01-0')
+
+    manifest = Manifest(config.manifest_file)
+    assert set(manifest.entries) == {"daily_usage_data_2024-01-01.json", "daily_usage_data_2024-01-02.json"}
+
+
+def test_parallel_transformation_reports_failed_files(config):
+    config.workers = 2
+    broken = config.extraction_folder / "daily_usage_data_2024-01-03.json"
+    broken.write_text('[{"household_id": "h1", "date": ')  # cut off
+
+    results = {result.filename: result for result in DailyUsageDataTransformer(config).transform_all()}
+
+    assert results[broken.name].error is not None
+    assert sorted(name for name, result in results.items() if result.error is None) == [
+        "daily_usage_data_2024-01-01.json", "daily_usage_data_2024-01-02.json",
+    ]
+    for day in ("2024-01-01", "2024-01-02"):
+        assert len((config.transformation_folder / f"daily_usage_data_{day}.json").read_text().splitlines()) == 3
+    assert not (config.transformation_folder / broken.name).exists()
+    assert set(Manifest(config.manifest_file).entries) == {
+        "daily_usage_data_2024-01-01.json", "daily_usage_data_2024-01-02.json",
+    }
+    assert os.getpid() not in {result.worker for result in results.values()}
@@ -0,0 +1,47 @@
+import pickle
+
+import pytest
+
+from tests.fixture import p4_hour_example_june_25
+from transform.google import P4HourData2025Transformer
+from transform.mapping import Field, MappedTransformer, compile_fields
+from util import DataType, ETLConfig
+
+
+def test_compiled_fields():
+    extract = compile_fields([
+        Field("id", type="string", required=True),
+        Field("meter", source="electricityMeasurement.meter", type="double", cast=True),
+        Field("unit", source="electricityMeasurement.unit", fallback="WH"),
+        Field("gas", source="gasMeasurement.meter"),
+    ])
+
+    record = {"id": "a", "electricityMeasurement": {"meter": 12}, "gasMeasurement": None}
+
+    assert extract(record) == {"id": "a", "meter": 12.0, "unit": "WH", "gas": None}
+    with pytest.raises(KeyError):
+        extract({})
+
+
+def test_p4_hour_2025_mapping(tmp_path):
+    config = ETLConfig(DataType.P4_HOUR_2025, "p4_hour_data_2025", root_transformation_folder=tmp_path)
+    transformer = P4HourData2025Transformer(config)
+    transformed = transformer._transform(p4_hour_example_june_25)
+
+    assert list(transformed) == ["date", "type", "meter_ean"] + [f"measurement_h_{i}" for i in range(25)]
+    assert transformed["date"] == "2025-06-01"
+    assert transformed["measurement_h_24"] == 3881.623
+    assert transformer.output_schema["measurement_h_0"] == "double"
+
+
+def test_mapped_transformer_from_config(tmp_path):
+    config = ETLConfig(
+        DataType.HOUSEHOLD_EXCEPTIONS,
+        "household_exceptions",
+        MappedTransformer,
+        fields=[Field("household_id", source="houseID"), Field("reason")],
+        root_transformation_folder=tmp_path,
+    )
+    transformer = pickle.loads(pickle.dumps(MappedTransformer(config)))
+
+    assert transformer._transform({"houseID": "h", "reason": "vacant"}) == {"household_id": "h", "reason": "vacant"}
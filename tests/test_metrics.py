@@ -0,0 +1,17 @@
+import pytest
+
+from metrics import Metrics, current_rss_mb
+
+
+@pytest.mark.skipif(current_rss_mb() is None, reason="needs /proc to sample memory")
+def test_stages_report_their_own_peak_memory():
+    metrics = Metrics()
+    with metrics.stage("large"):
+        data = b"x" * (200 * 2 ** 20)
+    del data
+    with metrics.stage("small"):
+        pass
+
+    large, small = metrics.stages["large"], metrics.stages["small"]
+    assert large.peak_rss_mb - large.rss_start_mb > 150
+    assert small.peak_rss_mb < large.peak_rss_mb - 150
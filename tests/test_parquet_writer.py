@@ -0,0 +1,101 @@
+import pytest
+
+from transform.writer import ParquetWriter, get_writer
+from util import DataType, ETLConfig
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+SCHEMA = {
+    "date": "string",
+    "meter_ean": "string",
+    "usage": "double",
+    "hour": "int",
+    "count": "bigint",
+    "valid": "boolean",
+    "missing_hours": "array<int>",
+}
+
+
+def _records(days: list[str | None], per_day: int) -> list[dict]:
+    return [
+        {"date": day, "meter_ean": f"8716{i:014d}", "usage": i / 4, "hour": i, "count": 2 ** 40 + i, "valid": i % 2 == 0,
+         "missing_hours": [i] if i % 3 else []}
+        for i in range(per_day) for day in days
+    ]
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = ETLConfig(DataType.P4_HOUR_2025, "p4", root_transformation_folder=tmp_path, output_format="parquet")
+    config.transformation_folder.mkdir(parents=True)
+    return config
+
+
+def test_typed_round_trip(config):
+    result = get_writer(config, SCHEMA).write(_records(["2025-01-01", "2025-01-02", None], per_day=5), "p4_1.json")
+
+    assert result.records == 15
+    assert sorted(str(path.relative_to(config.transformation_folder)) for path in result.outputs) == [
+        "date=2025-01-01/p4_1.parquet", "date=2025-01-02/p4_1.parquet", "date=__HIVE_DEFAULT_PARTITION__/p4_1.parquet",
+    ]
+    table = pq.ParquetFile(config.transformation_folder / "date=2025-01-02" / "p4_1.parquet").read()
+    assert table.schema == pa.schema([
+        ("meter_ean", pa.string()),
+        ("usage", pa.float64()),
+        ("hour", pa.int32()),
+        ("count", pa.int64()),
+        ("valid", pa.bool_()),
+        ("missing_hours", pa.list_(pa.int32())),
+    ])
+    assert table.to_pylist() == [
+        {key: value for key, value in record.items() if key != "date"}
+        for record in _records(["2025-01-02"], per_day=5)
+    ]
+    assert not list(config.transformation_folder.rglob("*.tmp"))
+
+
+def test_ymd_partitioning_keeps_the_date(config):
+    config.partitioning = "ymd"
+    result = get_writer(config, SCHEMA).write(_records(["2025-01-31"], per_day=2), "p4_1.json")
+
+    [output] = result.outputs
+    assert output == config.transformation_folder / "year=2025" / "month=01" / "day=31" / "p4_1.parquet"
+    assert pq.ParquetFile(output).read().column("date").to_pylist() == ["2025-01-31"] * 2
+
+
+def test_buffered_rows_are_bounded_across_partitions(config, monkeypatch):
+    config.row_group_size = 4
+    days = [f"2025-01-{day:02d}" for day in range(1, 11)]
+    records = _records(days, per_day=6)
+    flushed = [0]
+    flush = ParquetWriter._flush
+
+    def counting_flush(self, partition, buffer, writers, stem):
+        flushed[0] += len(buffer)
+        flush(self, partition, buffer, writers, stem)
+
+    def checked(records):
+        for i, record in enumerate(records):
+            assert i - flushed[0] <= config.row_group_size
+            yield record
+
+    monkeypatch.setattr(ParquetWriter, "_flush", counting_flush)
+    result = get_writer(config, SCHEMA).write(checked(records), "p4_1.json")
+
+    assert len(result.outputs) == 10
+    for output in result.outputs:
+        parquet_file = pq.ParquetFile(output)
+        assert parquet_file.metadata.num_rows == 6
+        assert all(parquet_file.metadata.row_group(i).num_rows <= 4 for i in range(parquet_file.num_row_groups))
+
+
+def test_failed_write_leaves_no_outputs(config):
+    def failing():
+        yield from _records(["2025-01-01", "2025-01-02"], per_day=3)
+        raise RuntimeError("source cut off")
+
+    config.row_group_size = 2
+    with pytest.raises(RuntimeError):
+        get_writer(config, SCHEMA).write(failing(), "p4_1.json")
+    assert not [path for path in config.transformation_folder.rglob("*") if path.is_file()]
@@ -0,0 +1,61 @@
+import gzip
+import json
+
+import pytest
+
+from load.athena import table_ddl
+from load.local import LocalS3Client
+from load.s3 import S3Loader
+from partitioning import partition_folder
+from transform.google import DailyUsageDataTransformer
+from util import DataType, ETLConfig
+
+BUCKET = "bucket"
+RECORDS = [
+    {"household_id": "h1", "household_activation_code": "a1", "date": day, "type": "gas", "usage": 1.5}
+    for day in ["2024-01-31", "2024-02-01", "2024-02-01"]
+]
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = ETLConfig(DataType.DAILY_USAGE, "daily_usage_data", transformer=DailyUsageDataTransformer,
+                       root_extraction_folder=tmp_path / "extracted", root_transformation_folder=tmp_path / "transformed",
+                       partitioning="ymd", output_compression="gzip")
+    config.extraction_folder.mkdir(parents=True)
+    (config.extraction_folder / "daily_usage_data_1.json").write_text(json.dumps(RECORDS))
+    return config
+
+
+def test_partition_folder():
+    assert partition_folder("2024-02-01", "ymd") == "year=2024/month=02/day=01"
+    assert partition_folder("2024-02-01", "date") == "date=2024-02-01"
+    assert partition_folder(None, "ymd") == "year=__HIVE_DEFAULT_PARTITION__/month=__HIVE_DEFAULT_PARTITION__/day=__HIVE_DEFAULT_PARTITION__"
+
+
+def test_writes_and_loads_partitions(config, tmp_path):
+    DailyUsageDataTransformer(config).transform_all()
+
+    january = config.transformation_folder / "year=2024/month=01/day=31/daily_usage_data_1.json.gz"
+    february = config.transformation_folder / "year=2024/month=02/day=01/daily_usage_data_1.json.gz"
+    assert [json.loads(line)["date"] for line in gzip.decompress(january.read_bytes()).splitlines()] == ["2024-01-31"]
+    assert len(gzip.decompress(february.read_bytes()).splitlines()) == 2
+
+    client = LocalS3Client(tmp_path / "s3")
+    S3Loader(None, BUCKET, config, s3_client=client).load_all()
+    keys = [obj["Key"] for obj in client.list_objects_v2(Bucket=BUCKET, Prefix=config.s3_prefix)["Contents"]]
+    assert keys == [
+        "gcs/daily_usage/year=2024/month=01/day=31/daily_usage_data_1.json.gz",
+        "gcs/daily_usage/year=2024/month=02/day=01/daily_usage_data_1.json.gz",
+    ]
+
+
+def test_ddl_projects_partitions(config):
+    ddl = table_ddl(config, DailyUsageDataTransformer(config).output_schema, BUCKET, last_year=2026)
+
+    assert "PARTITIONED BY (`year` int, `month` int, `day` int)" in ddl
+    assert "`date` string" in ddl  # the record date stays queryable
+    assert "'projection.year.range'='2020,2026'" in ddl
+    assert "'projection.month.digits'='2'" in ddl
+    assert ("'storage.location.template'='s3://bucket/gcs/daily_usage/year=${year}/month=${month}/day=${day}/'"
+            in ddl)
@@ -0,0 +1,51 @@
+import io
+import json
+
+import pytest
+
+from tests.fixture import p4_hour_example_june_25
+from transform.reader import iter_records
+
+
+def test_iter_records_json_array():
+    records = [p4_hour_example_june_25, {"value": 12345}, {"nested": [1, 2, {"a": None}]}]
+    text = json.dumps(records, indent=2)
+
+    assert list(iter_records(io.StringIO(text), chunk_size=7)) == records
+
+
+def test_iter_records_json_lines():
+    records = [{"value": 1}, {"value": 2.5}, p4_hour_example_june_25]
+    text = "\n".join(json.dumps(record) for record in records) + "\n"
+
+    assert list(iter_records(io.StringIO(text), chunk_size=5)) == records
+
+
+def test_iter_records_empty():
+    assert list(iter_records(io.StringIO("[]"))) == []
+    assert list(iter_records(io.StringIO(""))) == []
+
+
+@pytest.mark.parametrize("text", ["[1,,2]", "[1 2]", "[1,]", "[,1]", '[{"a": 1}] {"b": 2}', "[1, 2"])
+def test_iter_records_rejects_malformed_arrays(text):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_records(io.StringIO(text), chunk_size=3))
+
+
+class _CountingReader(io.StringIO):
+    def __init__(self, text: str):
+        super().__init__(text)
+        self.chunks = 0
+
+    def read(self, size=-1):
+        self.chunks += 1
+        return super().read(size)
+
+
+def test_iter_records_raises_on_malformed_record_without_reading_on():
+    records = ",\n".join(json.dumps({"value": i}) for i in range(1000))
+    source = _CountingReader(f'[{{"value": -1}}, {{"value": tru}}, {records}]')
+
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_records(source, chunk_size=64))
+    assert source.chunks <= 3
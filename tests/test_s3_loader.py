@@ -0,0 +1,99 @@
+from dataclasses import replace
+
+import pytest
+from boto3.s3.transfer import TransferConfig
+
+from load.local import LocalS3Client
+from load import s3
+from load.s3 import S3Loader
+from util import DataType, ETLConfig
+
+BUCKET = "bucket"
+
+
+class FlakyClient(LocalS3Client):
+    """Fails the first upload attempts of every key"""
+
+    def __init__(self, root, failures: int):
+        super().__init__(root)
+        self.failures = failures
+        self.attempts = {}
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        self.attempts[Key] = self.attempts.get(Key, 0) + 1
+        if self.attempts[Key] <= self.failures:
+            raise ConnectionError("connection reset")
+        return super().upload_file(Filename, Bucket, Key, **kwargs)
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = ETLConfig(DataType.DAILY_USAGE, "daily_usage_data", root_transformation_folder=tmp_path / "transformed",
+                       upload_workers=4)
+    config.transformation_folder.mkdir(parents=True)
+    for i in range(20):
+        (config.transformation_folder / f"daily_usage_data_{i}.json").write_text(f'{{"i": {i}}}\n')
+    return config
+
+
+def _loader(config, client) -> S3Loader:
+    loader = S3Loader(None, BUCKET, config, s3_client=client)
+    loader.retry_base_delay = 0
+    return loader
+
+
+def test_concurrent_upload_with_retries(config, tmp_path):
+    client = FlakyClient(tmp_path / "s3", failures=1)
+    _loader(config, client).load_all()
+
+    keys = [obj["Key"] for obj in client.list_objects_v2(Bucket=BUCKET)["Contents"]]
+    assert keys == sorted(f"gcs/daily_usage/daily_usage_data_{i}.json" for i in range(20))
+    assert set(client.attempts.values()) == {2}
+
+
+def test_stops_after_too_many_failures(config, tmp_path, capsys):
+    client = FlakyClient(tmp_path / "s3", failures=10)
+    _loader(replace(config, upload_workers=1), client).load_all()
+
+    assert "Stopping after 10 failed uploads" in capsys.readouterr().out
+    assert len(client.attempts) < 20  # the remaining uploads were cancelled
+
+
+def test_plan_uploads_new_and_changed_files_only(config, tmp_path):
+    client = LocalS3Client(tmp_path / "s3")
+    loader = _loader(config, client)
+    loader.transfer_config = TransferConfig(multipart_threshold=1024, multipart_chunksize=1024)
+    (config.transformation_folder / "large.json").write_bytes(b"x" * 5000)  # uploaded in 5 parts
+    loader.load_all()
+
+    (config.transformation_folder / "daily_usage_data_3.json").write_text('{"i": 4}\n')  # same size
+    (config.transformation_folder / "daily_usage_data_20.json").write_text("{}\n")
+    client.requests.clear()
+
+    plan = loader.load_all(dry_run=True)
+    reasons = {upload.path.name: upload.reason for upload in plan.uploads}
+    assert reasons == {"daily_usage_data_3.json": "changed", "daily_usage_data_20.json": "new"}
+    assert plan.unchanged == 20
+    assert client.requests == {"ListObjectsV2": 1}
+
+    loader.load_all()
+    assert loader.load_all(dry_run=True).uploads == []
+
+
+
+def test_rerun_only_hashes_files_written_since_the_upload(config, tmp_path, monkeypatch):
+    client = LocalS3Client(tmp_path / "s3")
+    loader = _loader(config, client)
+    loader.load_all()
+
+    hashed = []
+    md5_etag = s3.md5_etag
+    monkeypatch.setattr(s3, "md5_etag", lambda path, *args: hashed.append(path.name) or md5_etag(path, *args))
+    assert loader.load_all(dry_run=True).unchanged == 20
+    assert hashed == []
+
+    (config.transformation_folder / "daily_usage_data_3.json").write_text('{"i": 3}\n')  # rewritten, same content
+    (config.transformation_folder / "daily_usage_data_4.json").write_text('{"i": 5}\n')
+    plan = loader.load_all(dry_run=True)
+    assert [upload.path.name for upload in plan.uploads] == ["daily_usage_data_4.json"]
+    assert sorted(hashed) == ["daily_usage_data_3.json", "daily_usage_data_4.json"]
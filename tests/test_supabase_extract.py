@@ -0,0 +1,208 @@
+import io
+import json
+import threading
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql
+
+from extract.supabase import DailyUsageDataExtractor, HouseholdDataExtractor
+from src.supabase import HOUSEHOLD_DTYPES, SupabaseClient, copy_sql
+
+
+@pytest.fixture
+def client(tmp_path):
+    """SupabaseClient on a SQLite stand-in, with the tables in an attached `public` schema"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+    @event.listens_for(engine, "connect")
+    def attach(connection, _):
+        connection.execute(f"ATTACH DATABASE '{tmp_path / 'public.db'}' AS public")
+
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE public.daily_usage_data "
+            "(household_id TEXT, household_activation_code TEXT, date TEXT, type TEXT, usage REAL)"
+        )
+        for day in (1, 2, 3, 5, 9, 10):
+            for household in range(7):
+                connection.exec_driver_sql(
+                    "INSERT INTO public.daily_usage_data VALUES (?, ?, ?, ?, ?)",
+                    (f"h{household}", "ABC", f"2024-01-{day:02d}", "gas", household / 2),
+                )
+    return SupabaseClient(None, engine=engine)
+
+
+def test_ranged_extraction_writes_day_files(client, tmp_path):
+    extractor = DailyUsageDataExtractor(client, path=str(tmp_path / "extracted"))
+    extractor.extract_ranged(date(2024, 1, 1), date(2024, 1, 10), shard_days=3, workers=2, chunk_size=5)
+
+    folder = tmp_path / "extracted" / "daily_usage_data"
+    assert sorted(path.name for path in folder.iterdir()) == [f"supabase_2024-01-{day:02d}.json" for day in range(1, 10)]
+    records = [json.loads(line) for line in (folder / "supabase_2024-01-02.json").read_text().splitlines()]
+    assert sorted(record["household_id"] for record in records) == [f"h{i}" for i in range(7)]
+    assert {"household_id": "h3", "activation_code": "ABC", "date": "2024-01-02", "type": "gas", "usage": 1.5} in records
+    assert (folder / "supabase_2024-01-04.json").read_text() == ""
+
+
+def test_copy_sql_renders_parameters_as_literals():
+    sql = copy_sql("SELECT * FROM t WHERE date = :date AND code = :code", {"date": "2024-01-02", "code": "o'x"},
+                   postgresql.dialect())
+    assert sql == "SELECT * FROM t WHERE date = '2024-01-02' AND code = 'o''x'"
+
+
+def test_export_falls_back_to_read_sql(client, tmp_path):
+    df = client.get_daily_usage_data_for_date("2024-01-03")
+    assert len(df) == 7
+    assert str(df["usage"].dtype) == "float64" and str(df["household_id"].dtype) == "string"
+
+    with open(tmp_path / "export.csv", "wb") as f:
+        client.export("SELECT date, usage FROM public.daily_usage_data WHERE usage > :usage", f, params={"usage": 2.5})
+    assert (tmp_path / "export.csv").read_text().splitlines()[:2] == ["date,usage", "2024-01-01,3.0"]
+    with pytest.raises(ValueError):
+        client.export("SELECT 1", io.BytesIO(), format="binary")
+
+
+class _CopyClient(SupabaseClient):
+    """Returns canned CSV COPY output, to test parsing it without a Postgres server"""
+
+    supports_copy = True
+
+    def __init__(self, csv: bytes):
+        super().__init__(None, engine=create_engine("sqlite://"))
+        self.csv = csv
+
+    def export(self, query, f, format="csv", params=None):
+        f.write(self.csv)
+
+
+def test_copy_export_keeps_identifiers_as_text():
+    client = _CopyClient(
+        b"id,activation_code,gas_ean,electricity_ean,house_number,house_number_addition,build_year,gas_connection,"
+        b"date_of_activation\n"
+        b"h1,012345,871688540006514357,871688540006514358,12,1,1990,t,2024-01-01 10:00:00+00\n"
+        b"h2,NA,,871688540006514359,,,,f,\n"
+    )
+    df = client.export_dataframe("SELECT", HOUSEHOLD_DTYPES, parse_dates=["date_of_activation"])
+
+    first, second = df.to_dict("records")
+    assert first["activation_code"] == "012345"
+    assert first["gas_ean"] == "871688540006514357" and first["electricity_ean"] == "871688540006514358"
+    assert first["house_number_addition"] == "1"
+    assert first["house_number"] == 12.0 and first["build_year"] == 1990.0
+    assert first["gas_connection"] is True and second["gas_connection"] is False
+    assert second["activation_code"] == "NA"
+    assert pd.isna(second["gas_ean"]) and pd.isna(second["house_number"]) and pd.isna(second["date_of_activation"])
+    assert str(df["gas_ean"].dtype) == "string" and str(df["date_of_activation"].dtype).startswith("datetime64")
+
+
+class _SlowCopyClient(_CopyClient):
+    """Exports a first part of the rows, and the rest only once the first chunk has been read"""
+
+    def __init__(self, rows: int):
+        super().__init__(b"")
+        self.rows = rows
+        self.first_chunk_read = threading.Event()
+        self.streamed = None
+
+    def export(self, query, f, format="csv", params=None):
+        f.write(b"household_id,activation_code,date,type,usage\n")
+        f.writelines(f"h{i},ABC,2024-01-01,gas,{i}\n".encode() for i in range(self.rows))
+        f.flush()
+        self.streamed = self.first_chunk_read.wait(timeout=10)
+        f.write(b"last,ABC,2024-01-02,gas,0\n")
+
+
+def test_copy_rows_are_parsed_while_exporting():
+    client = _SlowCopyClient(rows=50_000)
+    chunks = []
+    for chunk in client.iter_daily_usage_data(date(2024, 1, 1), date(2024, 1, 3), chunk_size=1000):
+        client.first_chunk_read.set()
+        chunks.append(chunk)
+
+    assert client.streamed
+    assert sum(len(chunk) for chunk in chunks) == 50_001
+    assert chunks[-1]["household_id"].iloc[-1] == "last"
+
+
+def test_copy_stream_keeps_na_strings():
+    client = _CopyClient(
+        b"household_id,activation_code,date,type,usage\n"
+        b"h1,NA,2024-01-01,gas,1.5\n"
+        b"null,ABC,2024-01-01,electricity,\n"
+        b"h3,,2024-01-02,gas,2\n"
+    )
+    chunks = list(client.iter_daily_usage_data(date(2024, 1, 1), date(2024, 1, 3), chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    first, second = chunks[0].to_dict("records")
+    assert first["activation_code"] == "NA" and second["household_id"] == "null"
+    assert pd.isna(second["usage"]) and pd.isna(chunks[1]["activation_code"].iloc[0])
+    assert str(chunks[1]["household_id"].dtype) == "string"
+
+
+class _PlainHouseholdExtractor(HouseholdDataExtractor):
+    """Skips the enrichment, which needs the address files in data/"""
+
+    def _enrich(self, households):
+        households["date_of_activation"] = households["date_of_activation"].dt.date.astype(str)
+        return households
+
+
+def _create_households(engine):
+    tables = {
+        "households": "id TEXT, activation_code TEXT, account_status TEXT, client_id INTEGER, client_group_id INTEGER, "
+                      "date_of_activation TEXT, gas_ean TEXT, electricity_ean TEXT",
+        "clients": "id INTEGER, title TEXT",
+        "client_groups": "id INTEGER, name TEXT",
+        "household_house_details": "household_id TEXT, build_year INTEGER, square_meters INTEGER, house_type TEXT, "
+                                   "heating_type TEXT, gas_connection INTEGER, gas_or_induction TEXT, "
+                                   "water_heating_type TEXT, resident_count INTEGER",
+        "household_details": "household_id TEXT, zipcode TEXT, house_number INTEGER, house_number_addition TEXT, "
+                             "housing_corporation TEXT",
+    }
+    with engine.begin() as connection:
+        for table, columns in tables.items():
+            connection.exec_driver_sql(f"CREATE TABLE public.{table} ({columns}, updated_at TEXT)")
+        connection.exec_driver_sql("INSERT INTO public.clients VALUES (1, 'Client', '2024-01-01 00:00:00')")
+        for i in range(3):
+            connection.exec_driver_sql(
+                "INSERT INTO public.households VALUES (?, ?, 'active', 1, NULL, '2024-01-01 10:00:00', NULL, NULL, ?)",
+                (f"h{i}", f"A{i}", "2024-01-01 00:00:00"),
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO public.household_house_details VALUES (?, 1990, 100, NULL, NULL, 1, NULL, NULL, 2, ?)",
+                (f"h{i}", "2024-01-01 00:00:00"),
+            )
+
+
+def test_incremental_household_extraction(client, tmp_path):
+    _create_households(client.engine)
+    extractor = _PlainHouseholdExtractor(client, path=str(tmp_path / "extracted"))
+    extractor.extract(incremental=True)  # no previous extraction, so a full one
+
+    with client.engine.begin() as connection:
+        connection.exec_driver_sql(
+            "UPDATE public.household_house_details SET build_year = 2010, updated_at = '2024-02-01 00:00:00' "
+            "WHERE household_id = 'h1'"
+        )
+        connection.exec_driver_sql("DELETE FROM public.households WHERE id = 'h2'")
+        connection.exec_driver_sql(
+            "INSERT INTO public.households VALUES ('h3', 'A3', 'active', 1, NULL, '2024-02-01 10:00:00', NULL, NULL, "
+            "'2024-02-01 00:00:00')"
+        )
+
+    fetched = []
+    original = client.get_household_data
+    client.get_household_data = lambda **kwargs: fetched.append(kwargs) or original(**kwargs)
+    extractor.extract(incremental=True)
+
+    output = tmp_path / "extracted" / "supabase_households" / "households_for_analysis.json"
+    households = {record["id"]: record for record in map(json.loads, output.read_text().splitlines())}
+    assert fetched == [{"changed_since": "2024-01-01 00:00:00"}]
+    assert sorted(households) == ["h0", "h1", "h3"]
+    assert households["h1"]["build_year"] == 2010
+    assert households["h0"]["build_year"] == 1990
+    assert households["h3"]["date_of_activation"] == "2024-02-01"
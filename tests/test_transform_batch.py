@@ -0,0 +1,52 @@
+import json
+
+import transform.base
+from util import DataType, ETLConfig
+from transform.google import P4QuarterData2024Transformer, P4QuarterData2025Transformer
+
+HOUSEHOLD_ID = "9123ea62-c875-45c4-b414-6e73e09123dc"
+
+p4_quarter_2024_records = [
+    {"datetime": "2024-03-31T01:45:00+01:00", "houseID": HOUSEHOLD_ID, "electricityMeasurement": {"meter": 1234.5}},
+    {"datetime": "2024-03-31T03:00:00+02:00", "houseID": "house-17", "gasMeasurement": {"meter": 1001}},
+    {"datetime": "2024-06-01T12:15:00.250000Z", "houseID": HOUSEHOLD_ID.upper(), "backfeedMeasurement": {"meter": 0.5}},
+    {"datetime": "20240601T121500", "houseID": HOUSEHOLD_ID},
+]
+
+p4_quarter_2025_records = [
+    {"datetime": "2025-01-01T00:00:00+01:00", "houseID": HOUSEHOLD_ID, "electricityMeasurement": {"unit": "WH", "meter": 10}},
+    {"datetime": "2025-01-01T00:15:00+01:00", "houseID": HOUSEHOLD_ID, "electricityMeasurement": {"unit": "MTQ", "meter": 2.5},
+     "backfeedMeasurement": {"meter": 3}},
+    {"datetime": "2025-01-01 00:30:00", "houseID": HOUSEHOLD_ID, "backfeedMeasurement": {"meter": 4.25}},
+    {"datetime": "2025-01-01T00:45:00+01:00", "houseID": HOUSEHOLD_ID, "electricityMeasurement": None},
+]
+
+
+def _transformer(cls, data_type, tmp_path):
+    config = ETLConfig(data_type, "p4", cls, root_transformation_folder=tmp_path)
+    return cls(config)
+
+
+def test_p4_quarter_2024_batch_matches_records(tmp_path):
+    transformer = _transformer(P4QuarterData2024Transformer, DataType.P4_QUARTER_2024, tmp_path)
+    expected = [transformer._transform(dict(record)) for record in p4_quarter_2024_records]
+
+    assert transformer._transform_batch(p4_quarter_2024_records) == expected
+
+
+def test_p4_quarter_2025_batch_matches_records(tmp_path):
+    transformer = _transformer(P4QuarterData2025Transformer, DataType.P4_QUARTER_2025, tmp_path)
+    expected = [transformer._transform(record) for record in p4_quarter_2025_records]
+
+    assert transformer._transform_batch(p4_quarter_2025_records) == expected
+
+
+def test_transform_closes_the_file(tmp_path, monkeypatch):
+    transformer = _transformer(P4QuarterData2025Transformer, DataType.P4_QUARTER_2025, tmp_path)
+    source = tmp_path / "p4_1.json"
+    source.write_text(json.dumps(p4_quarter_2025_records))
+    opened = []
+    monkeypatch.setattr(transform.base, "open", lambda *args: opened.append(open(*args)) or opened[-1], raising=False)
+
+    assert transformer.transform(source) == transformer._transform_batch(p4_quarter_2025_records)
+    assert len(opened) == 1 and opened[0].closed
@@ -0,0 +1,60 @@
+import gzip
+import json
+
+import pytest
+
+from scripts.unpack_dynamodb_backup import unpack
+
+ITEMS = [
+    {"id": {"S": "a"}, "count": {"N": "3"}, "value": {"N": "1.5"}, "active": {"BOOL": True}, "note": {"NULL": True},
+     "details": {"M": {"unit": {"S": "WH"}, "tags": {"L": [{"S": "p4"}]}}}},
+    {"id": {"S": "b"}, "count": {"N": "4"}},
+]
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "aws"
+    for table in ["Woning", "P4Day"]:
+        export = root / f"01739284656378-{table.lower()}"
+        (export / "data").mkdir(parents=True)
+        arn = f"arn:aws:dynamodb:eu-west-1:000000000000:table/{table}-abc/export/01739284656378"
+        (export / "manifest-summary.json").write_text(json.dumps({"tableArn": arn}))
+        for i in range(2):
+            lines = "".join(json.dumps({"Item": item}) + "\n" for item in ITEMS)
+            (export / "data" / f"{table}{i}.json.gz").write_bytes(gzip.compress(lines.encode()))
+    return root
+
+
+def test_streaming_matches_unpacked(root, tmp_path):
+    unpack(str(root))
+    parsed = {path.relative_to(root / "parsed"): path.read_bytes() for path in (root / "parsed").rglob("*.json")}
+    assert len(parsed) == 4
+
+    (root / "parsed").rename(tmp_path / "parsed")
+    (root / "unpacked").rename(tmp_path / "unpacked")
+    unpack(str(root), streaming=True, compression="gzip")
+
+    assert not (root / "unpacked").exists()
+    for relative, content in parsed.items():
+        assert gzip.decompress((root / "parsed" / f"{relative}.gz").read_bytes()) == content
+
+
+def test_streaming_skips_done_files(root, capsys):
+    unpack(str(root), streaming=True)
+    unpack(str(root), streaming=True)
+
+    assert capsys.readouterr().out.count("exists, skipping") == 4
+
+
+def test_parallel_matches_sequential(root, tmp_path):
+    unpack(str(root), streaming=True)
+    sequential = {path.relative_to(root): path.read_bytes() for path in (root / "parsed").rglob("*.json")}
+    (root / "parsed").rename(tmp_path / "parsed")
+
+    summaries = unpack(str(root), streaming=True, workers=2)
+    assert {path.relative_to(root): path.read_bytes() for path in (root / "parsed").rglob("*.json")} == sequential
+    assert {table: (s.files, s.done) for table, s in summaries.items()} == {"P4Day": (2, 2), "Woning": (2, 2)}
+
+    summaries = unpack(str(root), streaming=True, workers=2)
+    assert all(s.skipped == 2 and s.done == 0 for s in summaries.values())
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from src.utils import BUILD_YEAR_BINS, ENERGY_LABEL_GROUPS, SQUARE_METER_BINS, categorise, categorise_groups
+
+
+def _build_year_reference(build_year):
+    """The former row-wise categorisation"""
+    if build_year < 1950:
+        return "tot 1950"
+    elif 1950 <= build_year < 1975:
+        return "1950-1975"
+    elif 1975 <= build_year < 1992:
+        return "1975-1992"
+    elif 1992 <= build_year < 2006:
+        return "1992-2006"
+    elif 2006 <= build_year <= 2015:
+        return "2006-2015"
+    elif 2015 < build_year:
+        return "na 2015"
+    return None
+
+
+def _square_meters_reference(square_meters):
+    if pd.isna(square_meters):
+        return None
+    opp = int(square_meters)
+    for label, upper in [("< 100m2", 100), ("100-120 m2", 120), ("120-150 m2", 150), ("150-200 m2", 200)]:
+        if opp < upper:
+            return label
+    return "> 200m2"
+
+
+def _labels(categories: pd.Series) -> list:
+    return [None if pd.isna(value) else value for value in categories]
+
+
+def test_build_years_match_row_wise_categorisation():
+    years = pd.Series([1800, 1949, 1949.5, 1950, 1974, 1975, 1991, 1992, 2005, 2006, 2014.5, 2015, 2015.01, 2016,
+                       2030, np.nan, -np.inf, np.inf])
+    categories = categorise(years, BUILD_YEAR_BINS)
+
+    assert isinstance(categories.dtype, pd.CategoricalDtype)
+    assert _labels(categories) == [_build_year_reference(year) for year in years]
+
+
+def test_square_meters_match_row_wise_categorisation():
+    square_meters = pd.Series([0, 50, 99, 99.9, 100, 119.99, 120, 149, 150, 199.5, 200, 350, None], dtype="object")
+    assert _labels(categorise(square_meters, SQUARE_METER_BINS)) == [_square_meters_reference(x) for x in square_meters]
+
+
+def test_energy_label_groups():
+    labels = pd.Series(["A+++", "A", "C", "E", "G", None, "onbekend"])
+    assert _labels(categorise_groups(labels, ENERGY_LABEL_GROUPS)) == ["A en beter", "A en beter", "B-C", "D-E", "F-G", None, None]